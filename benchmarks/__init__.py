@@ -0,0 +1,4 @@
+"""
+Performance benchmarks for the shopping agent.  Each module can be run
+with ``python -m benchmarks.<name>``.
+"""
@@ -0,0 +1,84 @@
+"""
+Order import throughput: the original connection-per-call, row-at-a-time
+insert path against the pooled, batched `database.insert_orders`.
+
+Run with ``python -m benchmarks.bench_database [rows]``.  Prints rows/sec
+for both strategies.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+import shopping_agent.database as db
+
+
+def _orders(n: int):
+    return [{"name": f"Item {i}", "price": 10.0 + i % 500, "date": "2025-01-01"} for i in range(n)]
+
+
+def legacy_insert_orders(path: str, orders) -> None:
+    """The pre-connection-manager implementation, kept for comparison."""
+    with closing(sqlite3.connect(path)) as conn:
+        cur = conn.cursor()
+        for order in orders:
+            cur.execute(
+                "INSERT INTO orders (name, price, date) VALUES (?, ?, ?)",
+                (order["name"], float(order["price"]), order.get("date", "")),
+            )
+        conn.commit()
+
+
+def legacy_insert_metric(path: str) -> None:
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute(
+            "INSERT INTO metrics (timestamp, count, avg_margin) VALUES (?, ?, ?)",
+            ("2025-01-01T00:00:00", 1, 0.1),
+        )
+        conn.commit()
+
+
+def run(rows: int = 200_000, small_calls: int = 2_000) -> dict:
+    results = {}
+    orders = _orders(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        pooled_path = os.path.join(tmp, "pooled.db")
+        for path in (legacy_path, pooled_path):
+            db.DB_PATH = path
+            db.initialize_db()
+        db.close_all()
+        # The legacy schema ran in the default rollback-journal mode.
+        with closing(sqlite3.connect(legacy_path)) as conn:
+            conn.execute("PRAGMA journal_mode = DELETE")
+
+        start = time.perf_counter()
+        legacy_insert_orders(legacy_path, orders)
+        results["legacy_orders_rows_per_sec"] = rows / (time.perf_counter() - start)
+
+        db.DB_PATH = pooled_path
+        start = time.perf_counter()
+        db.insert_orders(orders)
+        results["bulk_orders_rows_per_sec"] = rows / (time.perf_counter() - start)
+
+        # Many small writes: dominated by connection setup in the old layer.
+        start = time.perf_counter()
+        for _ in range(small_calls):
+            legacy_insert_metric(legacy_path)
+        results["legacy_metrics_rows_per_sec"] = small_calls / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(small_calls):
+            db.insert_metrics(1, 0.1)
+        results["pooled_metrics_rows_per_sec"] = small_calls / (time.perf_counter() - start)
+        db.close_all()
+    return results
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    for name, value in run(n).items():
+        print(f"{name}: {value:,.0f}")
@@ -0,0 +1,84 @@
+"""
+CLI startup cost: ``-X importtime`` profile of the entry modules and the
+wall time of short ``ui.py`` invocations, each in a fresh interpreter.
+tests/test_startup.py checks `import_profile` against a fixed budget.
+
+Run with ``python -m benchmarks.bench_startup [repeat]`` (default 10).
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+
+def import_profile(module: str) -> Dict[str, int]:
+    """
+    Import ``module`` in a fresh interpreter and return the cumulative
+    import time in microseconds of every module it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def loaded_modules(code: str) -> List[str]:
+    """Run ``code`` in a fresh interpreter and list the modules it loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def cli_wall_time(args: List[str], repeat: int) -> float:
+    """Median wall time in seconds of ``python -m shopping_agent.ui *args``."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "shopping_agent.ui", *args],
+            capture_output=True,
+            check=True,
+        )
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def run(repeat: int = 10) -> dict:
+    results = {}
+    for module in ("shopping_agent.ui", "shopping_agent.orchestrator", "main"):
+        samples = [import_profile(module).get(module, 0) for _ in range(repeat)]
+        results[f"import_{module}_ms"] = statistics.median(samples) / 1000
+    results["python_bare_sec"] = statistics.median(
+        _timed([sys.executable, "-c", "pass"]) for _ in range(repeat)
+    )
+    results["ui_usage_sec"] = cli_wall_time([], repeat)
+    results["ui_stats_sec"] = cli_wall_time(["stats"], repeat)
+    return results
+
+
+def _timed(cmd: List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(cmd, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, value in run(repeat).items():
+        print(f"{name}: {value:,.3f}")
@@ -0,0 +1,487 @@
+"""
+Scaling benchmarks over synthetic catalogs: `Orchestrator.run`, the
+database bulk paths, `Memory` persistence, the incremental run statistics, the
+`analytics` queries, the product catalog, the decision memory, the price
+history, bulk listing against the active-listing index, the cached LLM
+client, replay of a recorded run and the columnar deal log, each measured at several catalog
+sizes.
+
+Results are written as JSON and, when a baseline file is given, compared
+against it; any metric that is worse than the baseline by more than the
+tolerance is a regression and makes the command exit with status 1.
+
+    python -m benchmarks.suite --sizes 1000,10000 --output results.json \\
+        --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --sizes 1000 --update-baseline
+
+Latency can be injected into the tool stubs with ``--latency-ms`` and
+``--jitter-ms`` to see how concurrency hides slow services.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import shopping_agent.database as db
+from shopping_agent import analytics
+from shopping_agent import eval as agent_eval
+from shopping_agent.catalog import ProductIndex
+from shopping_agent.deal_log import DECISIONS, DealLog, DealRow
+from shopping_agent.listings import ListingIndex
+from shopping_agent.llm import CompletionCache, LLMClient, LocalBackend
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import CATALOG_BATCH_SIZE, DECIDE_BATCH_SIZE, Orchestrator
+from shopping_agent.price_history import DAILY, PriceHistory
+from shopping_agent.tools.trace import Recorder, Replayer
+from shopping_agent.vector_memory import Decision, DecisionMemory
+
+from .synthetic import LatencyProfile, generate_catalog, stubbed_tools
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Caps that keep per-record scenarios tractable at the 1M-item sizes.
+MAX_EPISODES = 20_000
+MAX_METRIC_ROWS = 1_000_000
+MAX_DECISIONS = 10_000
+MAX_PROMPTS = 10_000
+MAX_TRACE_ITEMS = 100_000
+MAX_DEALS = 1_000_000
+
+
+def _metric(value: float, unit: str, higher_is_better: bool = True) -> Dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _rate(count: int, fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return count / max(time.perf_counter() - start, 1e-9)
+
+
+def bench_orchestrator(
+    n: int, tmp: str, latency: LatencyProfile, concurrency: int
+) -> Dict[str, Dict]:
+    catalog = generate_catalog(n)
+    db.DB_PATH = os.path.join(tmp, f"orchestrator-{n}.db")
+    mem = Memory(os.path.join(tmp, f"orchestrator-{n}.jsonl"))
+    orchestrator = Orchestrator(mem, max_concurrency=concurrency)
+    with stubbed_tools(catalog, latency) as calls:
+        rate = _rate(n, orchestrator.run)
+    mem.close()
+    assert calls["idealo"] == n, calls
+    return {f"orchestrator_run_{n}": _metric(rate, "items/s")}
+
+
+def bench_listings(
+    n: int, tmp: str, latency: LatencyProfile, concurrency: int
+) -> Dict[str, Dict]:
+    """A first run lists every deal in bulk; a repeat run makes no eBay calls."""
+    catalog = generate_catalog(n)
+    db.DB_PATH = os.path.join(tmp, f"listings-{n}.db")
+    mem = Memory(os.path.join(tmp, f"listings-{n}.jsonl"))
+    orchestrator = Orchestrator(
+        mem,
+        max_concurrency=concurrency,
+        stage_concurrency={"list": concurrency},
+        listings=ListingIndex(db.DB_PATH),
+    )
+    results = {}
+    with stubbed_tools(catalog, latency) as calls:
+        results[f"listings_bulk_run_{n}"] = _metric(_rate(n, orchestrator.run), "items/s")
+        created = calls["ebay"]
+        results[f"listings_rerun_{n}"] = _metric(_rate(n, orchestrator.run), "items/s")
+    mem.close()
+    assert calls["ebay"] == created, calls
+    return results
+
+
+def bench_database(n: int, tmp: str) -> Dict[str, Dict]:
+    catalog = generate_catalog(n)
+    db.DB_PATH = os.path.join(tmp, f"database-{n}.db")
+    db.initialize_db()
+    orders = [
+        {"name": item.name, "price": item.purchase_cents / 100, "date": "2025-01-01"}
+        for item in catalog
+    ]
+    fingerprints = [
+        db.Fingerprint(item.name, item.purchase_cents, item.competitor_cents, "listed", None, None, 0.0)
+        for item in catalog
+    ]
+    names = [item.name for item in catalog]
+    results = {
+        f"database_insert_orders_{n}": _metric(_rate(n, lambda: db.insert_orders(orders)), "rows/s"),
+        f"database_upsert_fingerprints_{n}": _metric(
+            _rate(n, lambda: db.upsert_fingerprints(fingerprints)), "rows/s"
+        ),
+        f"database_fetch_fingerprints_{n}": _metric(
+            _rate(n, lambda: db.fetch_fingerprints(names)), "rows/s"
+        ),
+    }
+    db.close_all()
+    return results
+
+
+def bench_memory(n: int, tmp: str) -> Dict[str, Dict]:
+    episodes = min(n, MAX_EPISODES)
+    path = os.path.join(tmp, f"memory-{n}.jsonl")
+    mem = Memory(path, fsync=False)
+
+    def save() -> None:
+        for i in range(episodes):
+            episode = mem.start_episode(f"2025-01-01T00:00:{i % 60:02d}")
+            episode.offers_evaluated = i
+            mem.end_episode(episode)
+
+    results = {f"memory_save_{episodes}": _metric(_rate(episodes, save), "episodes/s")}
+    mem.close()
+    results[f"memory_load_{episodes}"] = _metric(
+        _rate(episodes, lambda: Memory(path).episodes), "episodes/s"
+    )
+    results[f"memory_recent_{episodes}"] = _metric(
+        _rate(100, lambda: [Memory(path).recent_episodes(10) for _ in range(100)]),
+        "calls/s",
+    )
+    return results
+
+
+def _misspell(name: str, rng: random.Random) -> str:
+    """Drop one letter from the longest word of ``name``."""
+    words = name.split()
+    i = max(range(len(words)), key=lambda k: len(words[k]))
+    j = rng.randrange(1, len(words[i]) - 1)
+    words[i] = words[i][:j] + words[i][j + 1:]
+    return " ".join(words)
+
+
+def bench_catalog(n: int, tmp: str) -> Dict[str, Dict]:
+    names = [item.name for item in generate_catalog(n)]
+    path = os.path.join(tmp, f"catalog-{n}.db")
+
+    def build() -> None:
+        index = ProductIndex(path)
+        for i in range(0, n, CATALOG_BATCH_SIZE):
+            index.resolve_many(names[i:i + CATALOG_BATCH_SIZE])
+
+    results = {f"catalog_build_{n}": _metric(_rate(n, build), "names/s")}
+    index = ProductIndex(path)
+    results[f"catalog_resolve_exact_{n}"] = _metric(
+        _rate(n, lambda: index.resolve_many(names)), "names/s"
+    )
+    rng = random.Random(3)
+    sample = rng.sample(names, min(n, 1000))
+    typos = [_misspell(name, rng) for name in sample]
+    results[f"catalog_resolve_fuzzy_{n}"] = _metric(
+        _rate(len(typos), lambda: index.resolve_many(typos)), "names/s"
+    )
+    db.close(path)
+    return results
+
+
+def bench_recall(n: int, tmp: str) -> Dict[str, Dict]:
+    count = min(n, MAX_DECISIONS)
+    names = [item.name for item in generate_catalog(count)]
+    decisions = [Decision(name, name, i % 2 == 0) for i, name in enumerate(names)]
+    mem = DecisionMemory(os.path.join(tmp, f"decisions-{n}"))
+    results = {
+        f"decisions_add_{count}": _metric(_rate(count, lambda: mem.add_many(decisions)), "items/s")
+    }
+    queries = random.Random(5).sample(names, min(count, 20))
+    results[f"decisions_nearest_exact_{count}"] = _metric(
+        _rate(len(queries), lambda: mem.nearest_many(queries, 5)), "queries/s"
+    )
+    mem.mode = "lsh"
+    mem.nearest(queries[0])  # builds the buckets
+    results[f"decisions_nearest_lsh_{count}"] = _metric(
+        _rate(len(queries), lambda: mem.nearest_many(queries, 5)), "queries/s"
+    )
+    mem.close()
+    return results
+
+
+def bench_history(n: int, tmp: str) -> Dict[str, Dict]:
+    catalog = generate_catalog(n)
+    keys = [item.name for item in catalog]
+    path = os.path.join(tmp, f"history-{n}.db")
+    now = time.time()
+    history = PriceHistory(path, clock=lambda: now)
+    # Three days of one sample per product every 12 hours.
+    rounds = 6
+    samples = [
+        (item.name, item.competitor_cents, now - 12 * 3600 * r)
+        for r in range(rounds)
+        for item in catalog
+    ]
+    results = {
+        f"history_record_{n}": _metric(
+            _rate(len(samples), lambda: history.record_many(samples)), "rows/s"
+        ),
+        f"history_downsample_{n}": _metric(
+            _rate(len(samples), lambda: history.downsample(now + DAILY)), "rows/s"
+        ),
+    }
+
+    def trends() -> None:
+        for i in range(0, n, DECIDE_BATCH_SIZE):
+            history.trends(keys[i:i + DECIDE_BATCH_SIZE])
+
+    results[f"history_trends_{n}"] = _metric(_rate(n, trends), "products/s")
+    db.close(path)
+    return results
+
+
+def bench_eval(n: int, tmp: str) -> Dict[str, Dict]:
+    rows = min(n, MAX_METRIC_ROWS)
+    path = os.path.join(tmp, f"metrics-{n}.db")
+    db.DB_PATH = path
+    db.initialize_db()
+    rng = random.Random(7)
+    now = datetime.datetime(2025, 1, 1)
+    runs = []
+    for i in range(rows):
+        evaluated = rng.randint(0, 5000)
+        stamp = (now + datetime.timedelta(minutes=i)).isoformat()
+        runs.append((stamp, evaluated, rng.randint(0, evaluated)))
+    db.insert_runs(runs)
+    results = {
+        f"eval_statistics_cold_{rows}": _metric(
+            _rate(rows, lambda: analytics.run_statistics(path)), "rows/s"
+        )
+    }
+    # Warm path: one new run recorded, then statistics recomputed.
+    cycles = 20
+    start = time.perf_counter()
+    for _ in range(cycles):
+        db.insert_runs([(datetime.datetime.now().isoformat(), 10, 1)])
+        analytics.run_statistics(path)
+    results[f"eval_log_and_statistics_warm_{rows}"] = _metric(
+        (time.perf_counter() - start) / cycles, "s", higher_is_better=False
+    )
+    db.close(path)
+    return results
+
+
+def bench_analytics(n: int, tmp: str) -> Dict[str, Dict]:
+    rows = min(n, MAX_METRIC_ROWS)
+    path = os.path.join(tmp, f"analytics-{n}.db")
+    db.DB_PATH = path
+    db.initialize_db()
+    rng = random.Random(7)
+    now = datetime.datetime(2025, 1, 1)
+    runs = []
+    for i in range(rows):
+        evaluated = rng.randint(0, 5000)
+        stamp = (now + datetime.timedelta(minutes=i)).isoformat()
+        runs.append((stamp, evaluated, rng.randint(0, evaluated)))
+    db.insert_runs(runs)
+    results = {
+        f"analytics_statistics_{rows}": _metric(
+            _rate(rows, lambda: analytics.run_statistics(path)), "rows/s"
+        ),
+        f"analytics_buckets_day_{rows}": _metric(
+            _rate(rows, lambda: analytics.time_buckets("day", db_path=path)), "rows/s"
+        ),
+        f"analytics_stream_{rows}": _metric(
+            _rate(rows, lambda: sum(1 for _ in analytics.iter_runs(db_path=path))), "rows/s"
+        ),
+    }
+    db.close(path)
+    return results
+
+
+def bench_llm(n: int, tmp: str) -> Dict[str, Dict]:
+    """Per-item prompts, half of them repeats, through the cached client."""
+    prompts = min(n, MAX_PROMPTS)
+    names = [item.name for item in generate_catalog(prompts // 2 or 1)]
+    messages = [f"Is {names[i % len(names)]} worth reselling?" for i in range(prompts)]
+    path = os.path.join(tmp, f"llm-{n}.db")
+    llm = LLMClient("system", LocalBackend(), CompletionCache(db_path=path))
+    results = {
+        f"llm_complete_many_{prompts}": _metric(
+            _rate(prompts, lambda: llm.complete_many(messages)), "prompts/s"
+        ),
+        f"llm_cached_{prompts}": _metric(
+            _rate(prompts, lambda: [llm.complete(m) for m in messages]), "prompts/s"
+        ),
+    }
+    llm.close()
+    db.close(path)
+    return results
+
+
+def bench_replay(n: int, tmp: str, latency: LatencyProfile) -> Dict[str, Dict]:
+    """A run recorded against the latency profile, replayed without it."""
+    items = min(n, MAX_TRACE_ITEMS)
+    catalog = generate_catalog(items)
+    trace = os.path.join(tmp, f"replay-{n}.trace")
+    results = {}
+    with stubbed_tools(catalog, latency):
+        db.DB_PATH = os.path.join(tmp, f"record-{n}.db")
+        mem = Memory(os.path.join(tmp, f"record-{n}.jsonl"))
+        with Recorder(trace):
+            results[f"trace_record_{items}"] = _metric(
+                _rate(items, Orchestrator(mem).run), "items/s"
+            )
+        mem.close()
+    db.DB_PATH = os.path.join(tmp, f"replay-{n}.db")
+    mem = Memory(os.path.join(tmp, f"replay-{n}.jsonl"))
+    with Replayer(trace) as replayer:
+        results[f"trace_replay_{items}"] = _metric(
+            _rate(items, Orchestrator(mem).run), "items/s"
+        )
+    mem.close()
+    assert replayer.replayed >= items, replayer.replayed
+    return results
+
+
+def bench_deal_log(n: int, tmp: str) -> Dict[str, Dict]:
+    """Appends to the deal log, then the eval aggregates over its columns."""
+    deals = min(n, MAX_DEALS)
+    names = [item.name for item in generate_catalog(max(deals // 10, 1))]
+    rng = random.Random(7)
+    rows = []
+    for i in range(deals):
+        purchase = rng.randint(500, 50_000)
+        resale = purchase + rng.randint(-5_000, 10_000)
+        rows.append(DealRow(
+            1_700_000_000.0 + i, names[i % len(names)], purchase,
+            rng.randint(400, 60_000), resale, DECISIONS[i % len(DECISIONS)],
+        ))
+    path = os.path.join(tmp, f"deals-{n}")
+    log = DealLog(path)
+    results = {
+        f"deal_log_append_{deals}": _metric(
+            _rate(deals, lambda: log.append_many(rows)), "rows/s"
+        ),
+        f"deal_log_statistics_{deals}": _metric(
+            _rate(deals, lambda: agent_eval.deal_statistics(path)), "rows/s"
+        ),
+        f"deal_log_products_{deals}": _metric(
+            _rate(deals, lambda: agent_eval.product_statistics(path)), "rows/s"
+        ),
+    }
+    log.close()
+    return results
+
+
+def _best(a: Dict, b: Dict) -> Dict:
+    if a["higher_is_better"]:
+        return a if a["value"] >= b["value"] else b
+    return a if a["value"] <= b["value"] else b
+
+
+def run(
+    sizes: List[int],
+    latency: Optional[LatencyProfile] = None,
+    concurrency: int = 1,
+    repeat: int = 3,
+) -> Dict:
+    """
+    Run every scenario at every size ``repeat`` times, each pass in a
+    fresh directory, and return the JSON document with the best value
+    seen for each metric.
+    """
+    latency = latency or LatencyProfile.uniform()
+    saved = db.DB_PATH
+    results: Dict[str, Dict] = {}
+    try:
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                for n in sizes:
+                    for scenario in (
+                        bench_orchestrator(n, tmp, latency, concurrency),
+                        bench_database(n, tmp),
+                        bench_memory(n, tmp),
+                        bench_eval(n, tmp),
+                        bench_analytics(n, tmp),
+                        bench_catalog(n, tmp),
+                        bench_recall(n, tmp),
+                        bench_history(n, tmp),
+                        bench_listings(n, tmp, latency, concurrency),
+                        bench_llm(n, tmp),
+                        bench_replay(n, tmp, latency),
+                        bench_deal_log(n, tmp),
+                    ):
+                        for name, metric in scenario.items():
+                            results[name] = _best(results.get(name, metric), metric)
+                db.close_all()
+    finally:
+        db.DB_PATH = saved
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "concurrency": concurrency,
+            "repeat": repeat,
+            "latency_s": latency.idealo.mean,
+        },
+        "results": results,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Return one message per metric that is worse than ``baseline`` by more
+    than ``tolerance`` (a fraction).  Metrics missing from either side are
+    ignored.
+    """
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get("results", {}).get(name)
+        if current is None or not base["value"]:
+            continue
+        change = current["value"] / base["value"] - 1
+        worse = -change if base.get("higher_is_better", True) else change
+        if worse > tolerance:
+            regressions.append(
+                f"{name}: {current['value']:,.3f} {current['unit']} vs baseline "
+                f"{base['value']:,.3f} ({worse:.0%} worse)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean injected tool latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="+/- jitter on the latency")
+    parser.add_argument("--concurrency", type=int, default=1, help="Idealo lookups in flight")
+    parser.add_argument("--repeat", type=int, default=3, help="passes; the best value is kept")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    latency = LatencyProfile.uniform(args.latency_ms / 1000, args.jitter_ms / 1000)
+    results = run(sizes, latency, args.concurrency, args.repeat)
+    for name, metric in results["results"].items():
+        print(f"{name}: {metric['value']:,.3f} {metric['unit']}")
+
+    target = args.baseline if args.update_baseline else args.output
+    with open(target, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
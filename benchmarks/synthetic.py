@@ -0,0 +1,174 @@
+"""
+Synthetic load for the benchmarks: deterministic product catalogs of any
+size and latency-injecting stand-ins for the Amazon, Idealo and eBay
+stubs.
+
+Product names combine a brand, a product type, a model number and a
+variant, and each type has its own log-normal price distribution, so
+names repeat words the way a real catalog does and prices span cents to
+thousands of euros.  Competitor prices sit around the purchase price.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from shopping_agent.money import format_eur
+from shopping_agent.tools import amazon_api, ebay_api, email, idealo_api
+
+
+BRANDS = (
+    "Sony", "Samsung", "Philips", "Bosch", "Logitech", "Anker", "Lego",
+    "Nintendo", "Braun", "Tefal", "Siemens", "Garmin", "JBL", "Dyson",
+    "Canon", "Xiaomi", "Lenovo", "Asus", "DeLonghi", "Ravensburger",
+)
+
+# Product type -> (category, median price in euros, log-normal sigma)
+PRODUCT_TYPES = {
+    "Headphones": ("electronics", 89.0, 0.7),
+    "Smartwatch": ("electronics", 199.0, 0.5),
+    "Gaming Console": ("electronics", 449.0, 0.3),
+    "Wireless Mouse": ("electronics", 29.0, 0.5),
+    "USB-C Cable": ("electronics", 9.0, 0.4),
+    "Coffee Grinder": ("home", 79.0, 0.6),
+    "Espresso Machine": ("home", 399.0, 0.6),
+    "Vacuum Cleaner": ("home", 249.0, 0.5),
+    "Kettlebell Set": ("sports", 110.0, 0.4),
+    "Yoga Mat": ("sports", 25.0, 0.4),
+    "Building Set": ("toys", 59.0, 0.9),
+    "Board Game": ("toys", 35.0, 0.4),
+}
+
+VARIANTS = ("", "Pro", "Mini", "Max", "Lite", "2nd Gen", "Black", "White", "XL")
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    name: str
+    category: str
+    purchase_cents: int
+    competitor_cents: int
+
+
+def generate_catalog(n: int, seed: int = 42) -> List[CatalogItem]:
+    """Return ``n`` distinct synthetic products; the same seed gives the same catalog."""
+    rng = random.Random(seed)
+    types = list(PRODUCT_TYPES)
+    items = []
+    for i in range(n):
+        kind = types[rng.randrange(len(types))]
+        category, median, sigma = PRODUCT_TYPES[kind]
+        variant = VARIANTS[rng.randrange(len(VARIANTS))]
+        # The running index keeps names unique at any catalog size.
+        name = f"{BRANDS[rng.randrange(len(BRANDS))]} {kind} {rng.randint(100, 999)}-{i}"
+        if variant:
+            name += f" {variant}"
+        purchase = max(1, round(rng.lognormvariate(0.0, sigma) * median * 100))
+        competitor = max(1, round(purchase * rng.uniform(0.6, 1.25)))
+        items.append(CatalogItem(name, category, purchase, competitor))
+    return items
+
+
+@dataclass
+class Latency:
+    """Injected delay per call: ``mean`` seconds, uniformly +/- ``jitter``."""
+    mean: float = 0.0
+    jitter: float = 0.0
+
+    def sleep(self, rng: random.Random) -> None:
+        if self.mean <= 0 and self.jitter <= 0:
+            return
+        time.sleep(max(0.0, self.mean + rng.uniform(-self.jitter, self.jitter)))
+
+
+@dataclass
+class LatencyProfile:
+    amazon: Latency
+    idealo: Latency
+    ebay: Latency
+
+    @classmethod
+    def uniform(cls, mean: float = 0.0, jitter: float = 0.0) -> "LatencyProfile":
+        return cls(Latency(mean, jitter), Latency(mean, jitter), Latency(mean, jitter))
+
+
+@contextmanager
+def stubbed_tools(
+    catalog: List[CatalogItem],
+    latency: Optional[LatencyProfile] = None,
+    seed: int = 0,
+) -> Iterator[Dict[str, int]]:
+    """
+    Point the tool modules at ``catalog`` for the duration of the block.
+    Orders come from ``get_recent_orders``; the cart and wishlist are
+    empty.  Yields a dict counting the calls made to each service.
+    """
+    latency = latency or LatencyProfile.uniform()
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    calls = {"amazon": 0, "idealo": 0, "ebay": 0, "email": 0}
+    competitor = {item.name: format_eur(item.competitor_cents) for item in catalog}
+
+    def count(service: str) -> None:
+        with lock:
+            calls[service] += 1
+
+    def get_recent_orders(account: Optional[str] = None) -> List[Dict]:
+        count("amazon")
+        latency.amazon.sleep(rng)
+        return [
+            {"name": item.name, "price": format_eur(item.purchase_cents), "category": item.category}
+            for item in catalog
+        ]
+
+    def get_lowest_price(name: str) -> Optional[Dict[str, str]]:
+        count("idealo")
+        latency.idealo.sleep(rng)
+        price = competitor.get(name)
+        return None if price is None else {"vendor": "Synthetic", "price": price}
+
+    def create_listing(item_name: str, purchase_price: str, resale_price: str) -> Dict[str, str]:
+        count("ebay")
+        latency.ebay.sleep(rng)
+        return {"listing_id": f"bench-{item_name}", "status": "created"}
+
+    def create_listings(listings: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        # One round trip per bulk call, however many listings it carries.
+        count("ebay")
+        latency.ebay.sleep(rng)
+        return [
+            {"sku": listing["sku"], "listing_id": f"bench-{listing['sku']}", "status": "created"}
+            for listing in listings
+        ]
+
+    def update_prices(updates: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        count("ebay")
+        latency.ebay.sleep(rng)
+        return [dict(update, status="updated") for update in updates]
+
+    def send_email(subject: str, body: str, recipients=None) -> None:
+        count("email")
+
+    patches = [
+        (amazon_api, "get_recent_orders", get_recent_orders),
+        (amazon_api, "get_cart_items", lambda account=None: []),
+        (amazon_api, "get_wishlist_items", lambda account=None: []),
+        (idealo_api, "get_lowest_price", get_lowest_price),
+        (ebay_api, "create_listing", create_listing),
+        (ebay_api, "create_listings", create_listings),
+        (ebay_api, "update_prices", update_prices),
+        (email, "send_email", send_email),
+    ]
+    saved = [(module, attr, getattr(module, attr)) for module, attr, _ in patches]
+    for module, attr, value in patches:
+        setattr(module, attr, value)
+    try:
+        yield calls
+    finally:
+        for module, attr, value in saved:
+            setattr(module, attr, value)
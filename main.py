@@ -7,44 +7,64 @@ instead (e.g. python3 -m shopping_agent.ui run).
 
 from __future__ import annotations
 
-from .memory import Memory
-from .orchestrator import Orchestrator
+from functools import lru_cache
+from typing import Any, Iterator, List, Optional
 
 
 class LLM:
     """
-    Placeholder language model class. Replace the `call` method with
-    integration code for a real LLM API or local model. This class
-    accepts a prompt and returns a dummy completion.
+    Placeholder language model class.  Calls go through a
+    `shopping_agent.llm.LLMClient`, which caches, batches and streams
+    completions; plug a real LLM API or local model in as its backend.
+    By default the offline `LocalBackend` returns a dummy completion.
+    With ``cache_path`` completions are also cached in that SQLite
+    database across runs.
     """
 
-    def __init__(self, system_prompt: str) -> None:
+    def __init__(
+        self,
+        system_prompt: str,
+        backend: Any = None,
+        cache_path: Optional[str] = None,
+    ) -> None:
+        from shopping_agent.llm import CompletionCache, LLMClient
+
         self.system_prompt = system_prompt
+        self.client = LLMClient(system_prompt, backend, CompletionCache(db_path=cache_path))
+
+    def call(self, user_message: str, **params: Any) -> str:
+        return self.client.complete(user_message, **params)
+
+    def call_many(self, user_messages: List[str], **params: Any) -> List[str]:
+        return self.client.complete_many(user_messages, **params)
 
-    def call(self, user_message: str) -> str:
-        # In a real implementation you would combine the system prompt and
-        # user message, send them to the model and return the response.
-        return f"[LLM Stub] You said: {user_message}"
+    def stream(self, user_message: str, **params: Any) -> Iterator[str]:
+        return self.client.stream(user_message, **params)
 
 
+@lru_cache(maxsize=None)
 def load_system_prompt() -> str:
-    import pkg_resources
-    prompt_path = pkg_resources.resource_filename(
-        "shopping_agent", "prompts/system_prompt.txt"
-    )
-    with open(prompt_path, "r") as f:
-        return f.read().strip()
+    """Read the packaged system prompt once per process."""
+    from importlib import resources
+
+    prompt = resources.files("shopping_agent").joinpath("prompts/system_prompt.txt")
+    return prompt.read_text(encoding="utf-8").strip()
 
 
 def run_agent() -> None:
+    from shopping_agent import database
+    from shopping_agent.memory import Memory
+    from shopping_agent.orchestrator import Orchestrator
+
     system_prompt = load_system_prompt()
-    llm = LLM(system_prompt)
+    llm = LLM(system_prompt, cache_path=database.DB_PATH)
     mem = Memory()
     orchestrator = Orchestrator(mem)
     # Example usage of the LLM stub
     response = llm.call("What should I do today?")
     print(response)
     orchestrator.run()
+    llm.client.close()
 
 
 if __name__ == "__main__":
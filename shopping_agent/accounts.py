@@ -0,0 +1,199 @@
+"""
+Multi-account runs for the shopping agent.
+
+`run_accounts` shards Amazon accounts across a process pool.  Every
+account gets its own directory under ``data_dir/accounts/`` holding its
+episode log, SQLite database (with its run metrics and active eBay
+listings), deal log and, with ``recall_k``, its decision memory, so
+workers never write to the same files.  Competitor prices are shared through one SQLite-backed
+`PriceCache` (``data_dir/price_cache.db``, WAL mode): a price looked up
+for one account is read from disk by every other worker.  The product catalog
+whose IDs key that cache, and the competitor price history, live in the
+same database.  When all accounts have finished, their episodes and
+timing spans are merged into one report.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import database
+from . import eval as agent_eval
+from .cache import PriceCache
+from .catalog import ProductIndex
+from .deal_log import DealLog
+from .listings import ListingIndex
+from .memory import Memory
+from .orchestrator import Orchestrator
+from .price_history import PriceHistory
+from .telemetry import format_breakdown, merge_rows
+from .vector_memory import DecisionMemory
+
+
+# Episode counters summed across accounts in the merged report.
+TOTALED_FIELDS = (
+    "offers_evaluated",
+    "listings_created",
+    "offers_skipped",
+    "offers_unchanged",
+    "listings_updated",
+)
+
+
+@dataclass
+class AccountResult:
+    """Outcome of one account's run, as returned by a worker process."""
+    account: str
+    episode: Optional[Dict[str, Any]] = None
+    spans: List[Tuple] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def account_dir(data_dir: str, account: str) -> str:
+    """The private directory of ``account`` below ``data_dir``."""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", account) or "_"
+    return os.path.join(data_dir, "accounts", safe)
+
+
+def run_account(
+    account: str,
+    data_dir: str,
+    cache_path: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+) -> AccountResult:
+    """
+    Run the workflow once for ``account`` inside its own directory.
+    ``options`` are passed to `Orchestrator`; ``cache_path`` names the
+    shared price cache database (None disables caching).  Never raises:
+    failures are reported in `AccountResult.error`.
+    """
+    options = dict(options or {})
+    directory = account_dir(data_dir, account)
+    os.makedirs(directory, exist_ok=True)
+    db_path = os.path.join(directory, "shopping_agent.db")
+    saved = database.DB_PATH
+    database.DB_PATH = db_path
+    mem = Memory(os.path.join(directory, "memory.jsonl"))
+    cache = decisions = None
+    deal_log = DealLog(os.path.join(directory, "deals"))
+    started = time.perf_counter()
+    try:
+        if cache_path is not None:
+            cache = PriceCache(ttl=options.get("price_ttl", 3600.0), db_path=cache_path)
+        # Product IDs key the shared cache, so the catalog is shared too.
+        catalog = ProductIndex(cache_path or db_path)
+        history = PriceHistory(cache_path or db_path)
+        if options.get("recall_k"):
+            decisions = DecisionMemory(os.path.join(directory, "decisions"))
+        orchestrator = Orchestrator(
+            mem,
+            price_cache=cache,
+            account=account,
+            catalog=catalog,
+            decisions=decisions,
+            history=history,
+            listings=ListingIndex(db_path),
+            deal_log=deal_log,
+            **options,
+        )
+        orchestrator.run()
+        episode = mem.recent_episodes(1)[0]
+        spans = orchestrator.telemetry.rows()
+        agent_eval.record_run(episode, spans)
+        return AccountResult(account, asdict(episode), spans, time.perf_counter() - started)
+    except Exception as exc:
+        return AccountResult(account, seconds=time.perf_counter() - started, error=repr(exc))
+    finally:
+        if cache is not None:
+            cache.close()
+            database.close(cache_path)
+        if decisions is not None:
+            decisions.close()
+        deal_log.close()
+        mem.close()
+        database.close(db_path)
+        database.DB_PATH = saved
+
+
+def run_accounts(
+    accounts: Sequence[str],
+    data_dir: str,
+    workers: Optional[int] = None,
+    shared_cache: bool = True,
+    options: Optional[Dict[str, Any]] = None,
+    mp_context: Any = None,
+) -> List[AccountResult]:
+    """
+    Run every account in ``accounts`` on a pool of ``workers`` processes
+    (default: one per CPU) and return their results in input order.
+    With ``workers=1`` the accounts run one after another in this
+    process.  The merged report is also written to
+    ``data_dir/report.json``.
+    """
+    accounts = list(dict.fromkeys(accounts))
+    os.makedirs(data_dir, exist_ok=True)
+    cache_path = os.path.join(data_dir, "price_cache.db") if shared_cache else None
+    if cache_path is not None:
+        # Create the shared tables once, before workers race to do it.
+        PriceCache(db_path=cache_path).close()
+        database.close(cache_path)
+    args = [(account, data_dir, cache_path, options) for account in accounts]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(accounts) <= 1:
+        results = [run_account(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(accounts)), mp_context=mp_context
+        ) as pool:
+            results = list(pool.map(run_account, *zip(*args)))
+    with open(os.path.join(data_dir, "report.json"), "w") as f:
+        json.dump(merge_results(results), f, indent=2)
+    return results
+
+
+def merge_results(results: Sequence[AccountResult]) -> Dict[str, Any]:
+    """Totals across accounts plus the per-account episodes."""
+    totals = dict.fromkeys(TOTALED_FIELDS, 0)
+    for result in results:
+        if result.episode is not None:
+            for name in TOTALED_FIELDS:
+                totals[name] += result.episode.get(name, 0)
+    return {
+        "accounts": len(results),
+        "failed": [r.account for r in results if r.error is not None],
+        "totals": totals,
+        "runs": [asdict(r) | {"spans": len(r.spans)} for r in results],
+    }
+
+
+def format_report(results: Sequence[AccountResult]) -> str:
+    """Human-readable merged report: one line per account, totals, spans."""
+    merged = merge_results(results)
+    lines = [f"Runs for {merged['accounts']} accounts:"]
+    for result in results:
+        if result.error is not None:
+            lines.append(f"- {result.account}: FAILED after {result.seconds:.2f}s: {result.error}")
+            continue
+        ep = result.episode
+        lines.append(
+            f"- {result.account}: {ep['offers_evaluated']} evaluated, "
+            f"{ep['listings_created']} listed, {ep['offers_skipped']} skipped, "
+            f"{ep['offers_unchanged']} unchanged in {result.seconds:.2f}s"
+        )
+    totals = merged["totals"]
+    lines.append(
+        f"Total: {totals['offers_evaluated']} evaluated, {totals['listings_created']} listed, "
+        f"{totals['offers_skipped']} skipped, {totals['offers_unchanged']} unchanged"
+    )
+    spans = merge_rows(span for result in results for span in result.spans)
+    if spans:
+        lines.append("")
+        lines.extend(format_breakdown(spans))
+    return "\n".join(lines)
@@ -0,0 +1,219 @@
+"""
+Analytics over the per-run metrics stored in the ``metrics`` table.
+
+Every query pushes its filters, aggregates and time-bucketed group-bys
+down into SQLite, so a dashboard over a long history transfers one row
+per result instead of one per run.  Time ranges use the index on
+``metrics.timestamp``.  Raw rows are read through keyset pagination
+(`fetch_runs` returns a page and the cursor of the next one,
+`iter_runs` streams every page), never with one ``fetchall``.
+
+`run_statistics` is served by the incremental `eval.MetricsAggregator`,
+which only reads the runs recorded since its checkpoint; `export_csv`
+writes the runs as CSV.
+
+Timestamps are the ISO 8601 strings the runs were recorded with; ``since``
+and ``until`` bound them as ``since <= timestamp < until``.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import database
+from .eval import TRACKED_FIELDS, MetricsAggregator
+
+
+# Rows per page when streaming raw runs.
+PAGE_SIZE = 500
+
+# Width in seconds of the named time buckets.
+BUCKETS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Only rows written by `database.insert_runs` describe runs.
+_RUNS = "offers_evaluated IS NOT NULL"
+
+
+class RunRow(NamedTuple):
+    """Metrics of one run."""
+    id: int
+    timestamp: str
+    offers_evaluated: int
+    listings_created: int
+
+
+# Position after which the next page starts: (timestamp, id) of the last row.
+Cursor = Tuple[str, int]
+
+
+class Page(NamedTuple):
+    rows: List[RunRow]
+    next_cursor: Optional[Cursor]
+
+
+class Bucket(NamedTuple):
+    """Aggregate of the runs in one time bucket, which starts at ``start``."""
+    start: str
+    runs: int
+    offers_evaluated: int
+    listings_created: int
+    avg_offers_evaluated: float
+    avg_listings_created: float
+
+
+def fetch_runs(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    after: Optional[Cursor] = None,
+    limit: int = PAGE_SIZE,
+    db_path: Optional[str] = None,
+) -> Page:
+    """
+    One page of runs in timestamp order, starting after the ``after``
+    cursor.  ``next_cursor`` is None on the last page.
+    """
+    where, params = _range(since, until)
+    if after is not None:
+        # Row-value comparison walks the (timestamp, rowid) index.
+        where += " AND (timestamp, id) > (?, ?)"
+        params += list(after)
+    with database.get_manager(db_path).connection() as conn:
+        rows = [
+            RunRow(*row)
+            for row in conn.execute(
+                "SELECT id, timestamp, offers_evaluated, listings_created FROM metrics"
+                f" WHERE {where} ORDER BY timestamp, id LIMIT ?",
+                (*params, limit + 1),
+            )
+        ]
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows.pop()
+    return Page(rows, (rows[-1].timestamp, rows[-1].id))
+
+
+def iter_runs(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    page_size: int = PAGE_SIZE,
+    db_path: Optional[str] = None,
+) -> Iterator[RunRow]:
+    """Stream every run in timestamp order, one page in memory at a time."""
+    cursor: Optional[Cursor] = None
+    while True:
+        page = fetch_runs(since, until, cursor, page_size, db_path)
+        yield from page.rows
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
+
+
+def summary(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    db_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Run count and the sum, average, minimum and maximum of each field."""
+    where, params = _range(since, until)
+    columns = ", ".join(
+        f"SUM({f}), AVG({f}), MIN({f}), MAX({f})" for f in TRACKED_FIELDS
+    )
+    with database.get_manager(db_path).connection() as conn:
+        row = conn.execute(f"SELECT COUNT(*), {columns} FROM metrics WHERE {where}", params).fetchone()
+    result: Dict[str, Any] = {"runs": row[0]}
+    for i, name in enumerate(TRACKED_FIELDS):
+        total, avg, low, high = row[1 + 4 * i: 5 + 4 * i]
+        result.update({
+            f"sum_{name}": total or 0,
+            f"avg_{name}": avg or 0.0,
+            f"min_{name}": low,
+            f"max_{name}": high,
+        })
+    return result
+
+
+def time_buckets(
+    bucket: str = "hour",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    db_path: Optional[str] = None,
+) -> List[Bucket]:
+    """
+    Runs grouped into ``bucket`` ("minute", "hour", "day" or a number of
+    seconds) of the recorded wall-clock time, oldest first.
+    """
+    width = int(BUCKETS.get(bucket, 0) or bucket)
+    where, params = _range(since, until)
+    start = f"CAST(strftime('%s', timestamp) AS INTEGER) / {width} * {width}"
+    with database.get_manager(db_path).connection() as conn:
+        return [
+            Bucket(*row)
+            for row in conn.execute(
+                f"""
+                SELECT strftime('%Y-%m-%dT%H:%M:%S', {start}, 'unixepoch') AS bucket,
+                       COUNT(*), SUM(offers_evaluated), SUM(listings_created),
+                       AVG(offers_evaluated), AVG(listings_created)
+                FROM metrics WHERE {where}
+                GROUP BY bucket ORDER BY bucket
+                """,
+                params,
+            )
+        ]
+
+
+def run_statistics(
+    db_path: Optional[str] = None,
+    window_runs: int = 100,
+    window_seconds: int = 24 * 3600,
+    now: Optional[datetime.datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Lifetime averages, averages over the last ``window_runs`` runs and the
+    last ``window_seconds``, and approximate percentiles per tracked
+    field, from the checkpointed `eval.MetricsAggregator`.  Returns an
+    empty dict if the database holds no runs.
+    """
+    path = database.DB_PATH if db_path is None else db_path
+    if path != ":memory:" and not os.path.exists(path):
+        return {}
+    aggregator = MetricsAggregator(path, window_runs, window_seconds)
+    try:
+        aggregator.refresh()
+    except sqlite3.OperationalError:
+        return {}
+    return aggregator.summary(now=None if now is None else now.timestamp())
+
+
+def export_csv(
+    path: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    db_path: Optional[str] = None,
+) -> int:
+    """
+    Write the runs to ``path`` as CSV, one row of timestamp and tracked
+    fields per run; returns the number of rows written.
+    """
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", *TRACKED_FIELDS])
+        for row in iter_runs(since, until, db_path=db_path):
+            writer.writerow([row.timestamp, row.offers_evaluated, row.listings_created])
+            count += 1
+    return count
+
+
+def _range(since: Optional[str], until: Optional[str]) -> Tuple[str, List[Any]]:
+    where, params = [_RUNS], []
+    if since is not None:
+        where.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("timestamp < ?")
+        params.append(until)
+    return " AND ".join(where), params
@@ -0,0 +1,245 @@
+"""
+Caching layer placed in front of the Idealo price lookups.
+
+`PriceCache` is an in‑process LRU with a time‑to‑live per entry.  When
+given a SQLite path it also writes every entry through to a
+``price_cache`` table so prices survive restarts, and keeps cumulative
+hit/miss/eviction counters in ``price_cache_stats`` so they can be
+reported by ``ui.py stats`` from a separate process.  Concurrent
+requests for the same key share a single upstream call.  The lock
+guards only the in-memory state; SQLite reads and writes happen outside
+it, so one lookup's disk I/O does not hold up the others.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import database
+
+
+COUNTERS = ("hits", "disk_hits", "misses", "evictions", "expirations", "coalesced")
+
+
+class PriceCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and single-flight loading.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        # Counter increments not yet added to the persisted totals.
+        self._unflushed = dict.fromkeys(COUNTERS, 0)
+        self._db: Optional[database.ConnectionManager] = None
+        if db_path is not None:
+            self._db = database.get_manager(db_path)
+            with self._db.transaction() as conn:
+                _create_tables(conn)
+
+    @staticmethod
+    def key_for(item_name: str) -> str:
+        """Normalise an item name into a cache key."""
+        return " ".join(item_name.split()).casefold()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key`` or None if absent/expired."""
+        with self._lock:
+            value = self._lookup_locked(key)
+        if value is None:
+            value = self._load_stored(key)
+        return value
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store_locked(key, value, expires_at)
+        db = self._db
+        if db is not None:
+            with db.transaction() as conn:
+                # Of two racing writes, the one that expires later wins.
+                conn.execute(
+                    "INSERT INTO price_cache (key, value, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                    "expires_at = excluded.expires_at "
+                    "WHERE excluded.expires_at >= price_cache.expires_at",
+                    (key, json.dumps(value), expires_at),
+                )
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for ``key``, calling ``loader`` on a miss.
+        If another thread is already loading the same key, wait for its
+        result instead of issuing a second upstream call.  Exceptions from
+        ``loader`` propagate to every waiter and nothing is cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            # Another thread may have stored it while this one read the disk.
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self._clock():
+                return entry[0]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._count("coalesced")
+        if not leader:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for this process plus the current number of entries."""
+        with self._lock:
+            result = dict(self._counters)
+            result["size"] = len(self._entries)
+        return result
+
+    def flush(self) -> None:
+        """
+        Add this process's counter increments to the persisted totals and
+        drop expired rows from the backing table.
+        """
+        db = self._db
+        if db is None:
+            return
+        with self._lock:
+            pending, self._unflushed = self._unflushed, dict.fromkeys(COUNTERS, 0)
+        with db.transaction() as conn:
+            conn.execute(
+                "DELETE FROM price_cache WHERE expires_at <= ?", (self._clock(),)
+            )
+            conn.executemany(
+                "INSERT INTO price_cache_stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                list(pending.items()),
+            )
+
+    def close(self) -> None:
+        """
+        Flush counters and detach from the backing database, if any.  The
+        shared connection itself stays open for other users.
+        """
+        if self._db is not None:
+            self.flush()
+            self._db = None
+
+    def _lookup_locked(self, key: str) -> Optional[Any]:
+        """The in-memory entry for ``key``, if it has not expired."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self._count("hits")
+                return value
+            del self._entries[key]
+            self._count("expirations")
+        return None
+
+    def _load_stored(self, key: str) -> Optional[Any]:
+        """Read ``key`` from the backing table without holding the lock."""
+        db = self._db
+        row = None
+        if db is not None:
+            with db.connection() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM price_cache WHERE key = ?", (key,)
+                ).fetchone()
+        with self._lock:
+            if row is None or row[1] <= self._clock():
+                self._count("misses")
+                return None
+            value = json.loads(row[0])
+            # Keep an entry stored while the disk was read: it is newer.
+            if key not in self._entries:
+                self._store_locked(key, value, row[1])
+            self._count("disk_hits")
+            return value
+
+    def _store_locked(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._count("evictions")
+
+    def _count(self, name: str) -> None:
+        self._counters[name] += 1
+        self._unflushed[name] += 1
+
+
+def persisted_stats(db_path: str) -> Dict[str, int]:
+    """
+    Read the cumulative cache counters stored in ``db_path``.  Returns an
+    empty dict if the database or table does not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            rows = conn.execute("SELECT name, value FROM price_cache_stats").fetchall()
+            stored = conn.execute(
+                "SELECT COUNT(*) FROM price_cache WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+    except sqlite3.OperationalError:
+        return {}
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats.update(rows)
+    stats["stored_entries"] = stored
+    return stats
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+    conn.commit()
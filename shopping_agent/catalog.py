@@ -0,0 +1,316 @@
+"""
+Canonical product index.
+
+Orders, cart and wishlist items name the same product in different ways
+("PS5", "PlayStation 5 Console", "Playstation-5").  `ProductIndex` maps
+every incoming name to a canonical product ID so that price lookups,
+change detection and listings key on the product rather than on the
+spelling.
+
+A name is first normalised (`normalize`): case and accents are folded,
+punctuation becomes whitespace, letters and digits are split apart,
+known acronyms are expanded and filler words such as "console" are
+dropped.  A normalised name seen before resolves through a dictionary.
+Anything else is matched fuzzily against the known products.  A match
+must have the same number of words and the same numbers as the query
+("PlayStation 4" never merges with "PlayStation 5") and a trigram Dice
+similarity of at least ``threshold``.  Products are therefore bucketed
+by that shape; small buckets are scanned, large ones get a trigram
+inverted index whose candidates come from the query's rarest trigrams
+only (prefix filtering), so a lookup stays cheap with 100k+ products.
+Names without a match become new products.
+
+With a ``db_path`` products and every spelling resolved to them are
+stored in the ``products`` and ``product_aliases`` tables.  Only the
+tables are read at start-up; buckets and trigram postings are built
+when the first name needs fuzzy matching.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import database
+
+
+# Acronyms expanded after letters and digits have been split apart.
+ALIASES: Dict[str, str] = {
+    "ps 3": "playstation 3",
+    "ps 4": "playstation 4",
+    "ps 5": "playstation 5",
+    "xsx": "xbox series x",
+    "xss": "xbox series s",
+    "nsw": "nintendo switch",
+}
+
+# Words that do not distinguish one product from another.
+FILLER = frozenset({"the", "new", "neu", "original", "console", "konsole"})
+
+# Minimum trigram Dice similarity for a fuzzy match.
+DEFAULT_THRESHOLD = 0.8
+
+# Shape buckets up to this size are scanned instead of indexed.
+SCAN_LIMIT = 64
+
+# Runs of digits or of letters: "ps5" -> "ps", "5".
+_WORD = re.compile(r"\d+|[^\W\d_]+")
+_ALIAS_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(a) for a in sorted(ALIASES, key=len, reverse=True)) + r")\b"
+)
+
+
+@lru_cache(maxsize=65536)
+def normalize(name: str) -> str:
+    """The normalised form of a product name used for matching."""
+    text = name.casefold()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _ALIAS_RE.sub(lambda m: ALIASES[m.group(0)], " ".join(_WORD.findall(text)))
+    words = [word for word in text.split() if word not in FILLER]
+    if not words:
+        # Nothing but filler or punctuation: fall back to the plain name.
+        return " ".join(name.split()).casefold()
+    return " ".join(words)
+
+
+def trigrams(text: str) -> frozenset:
+    """Character trigrams of ``text``, padded so word edges count."""
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _shape(text: str) -> Tuple[int, Tuple[str, ...]]:
+    """Word count and numbers: both must agree for a fuzzy match."""
+    words = text.split()
+    return len(words), tuple(sorted(word for word in words if word.isdigit()))
+
+
+class _Bucket(list):
+    """IDs of the products of one shape plus their trigram postings."""
+
+    postings: Optional[Dict[str, array]] = None
+
+
+def _post(postings: Dict[str, array], pid: int, norm: str) -> None:
+    for gram in trigrams(norm):
+        posting = postings.get(gram)
+        if posting is None:
+            posting = postings[gram] = array("q")
+        posting.append(pid)
+
+
+class ProductIndex:
+    """
+    Thread-safe mapping from product names to canonical product IDs,
+    optionally persisted in SQLite.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, threshold: float = DEFAULT_THRESHOLD) -> None:
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # Normalised spelling -> product ID, for every spelling seen.
+        self._ids: Dict[str, int] = {}
+        # Product ID -> (display name, normalised name).
+        self._products: Dict[int, Tuple[str, str]] = {}
+        # Products grouped by `_shape`; built on the first fuzzy match.
+        self._buckets: Optional[Dict[Tuple, _Bucket]] = None
+        self._max_id = 0
+        self.exact_hits = 0
+        self.fuzzy_matches = 0
+        self.created = 0
+        self._db: Optional[database.ConnectionManager] = None
+        if db_path is not None:
+            self._db = database.get_manager(db_path)
+            with self._db.transaction() as conn:
+                _create_tables(conn)
+                self._products = {
+                    pid: (name, norm)
+                    for pid, name, norm in conn.execute(
+                        "SELECT id, name, normalized FROM products"
+                    )
+                }
+                self._ids = dict(conn.execute("SELECT alias, product_id FROM product_aliases"))
+        self._max_id = max(self._products, default=0)
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def resolve(self, name: str) -> int:
+        """The canonical product ID for ``name``, creating one if needed."""
+        return self.resolve_many([name])[0]
+
+    def resolve_many(self, names: Iterable[str]) -> List[int]:
+        """`resolve` for several names, storing new ones in one transaction."""
+        with self._lock:
+            result: List[Optional[int]] = []
+            unknown: List[Tuple[int, str, str]] = []
+            for name in names:
+                norm = normalize(name)
+                pid = self._ids.get(norm)
+                if pid is None:
+                    unknown.append((len(result), name, norm))
+                else:
+                    self.exact_hits += 1
+                result.append(pid)
+            if unknown:
+                if self._db is None:
+                    self._resolve_unknown(None, unknown, result)
+                else:
+                    with self._db.transaction() as conn:
+                        self._resolve_unknown(conn, unknown, result)
+            return result  # type: ignore[return-value]
+
+    def name(self, product_id: int) -> str:
+        """The display name of a product: the first spelling seen."""
+        return self._products[product_id][0]
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes of the index and how names were resolved in this process."""
+        with self._lock:
+            return {
+                "products": len(self._products),
+                "aliases": len(self._ids),
+                "exact_hits": self.exact_hits,
+                "fuzzy_matches": self.fuzzy_matches,
+                "created": self.created,
+            }
+
+    def _match(self, norm: str) -> Optional[int]:
+        """The best fuzzy match for a normalised name, if any."""
+        members = self._ensure_buckets().get(_shape(norm))
+        if not members:
+            return None
+        grams = trigrams(norm)
+        if len(members) <= SCAN_LIMIT:
+            candidates: Iterable[int] = members
+        else:
+            postings = self._bucket_postings(members)
+            # A match shares at least ``needed`` trigrams with the query,
+            # so it contains one of the len - needed + 1 rarest ones.
+            needed = math.ceil(self.threshold * len(grams) / (2 - self.threshold))
+            ordered = sorted(grams, key=lambda g: len(postings.get(g, ())))
+            candidates = set()
+            for gram in ordered[: len(grams) - needed + 1]:
+                candidates.update(postings.get(gram, ()))
+        best, best_score = None, self.threshold
+        for pid in candidates:
+            other = trigrams(self._products[pid][1])
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score > best_score or (score == best_score and (best is None or pid < best)):
+                best, best_score = pid, score
+        return best
+
+    def _ensure_buckets(self) -> Dict[Tuple, "_Bucket"]:
+        if self._buckets is None:
+            self._buckets = {}
+            for pid, (_, norm) in self._products.items():
+                self._add_to_bucket(pid, norm)
+        return self._buckets
+
+    def _add_to_bucket(self, pid: int, norm: str) -> None:
+        shape = _shape(norm)
+        bucket = self._buckets.get(shape)
+        if bucket is None:
+            bucket = self._buckets[shape] = _Bucket()
+        bucket.append(pid)
+        if bucket.postings is not None:
+            _post(bucket.postings, pid, norm)
+
+    def _bucket_postings(self, bucket: "_Bucket") -> Dict[str, array]:
+        if bucket.postings is None:
+            bucket.postings = {}
+            for pid in bucket:
+                _post(bucket.postings, pid, self._products[pid][1])
+        return bucket.postings
+
+    def _resolve_unknown(
+        self,
+        conn: Optional[sqlite3.Connection],
+        unknown: List[Tuple[int, str, str]],
+        result: List[Optional[int]],
+    ) -> None:
+        for position, name, norm in unknown:
+            pid = self._ids.get(norm)  # an earlier name of the same batch
+            if pid is not None:
+                self.exact_hits += 1
+            else:
+                pid = self._match(norm)
+                if pid is not None:
+                    self.fuzzy_matches += 1
+                else:
+                    pid = self._create(conn, name, norm)
+                    self.created += 1
+                self._ids[norm] = pid
+                if conn is not None:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO product_aliases (alias, product_id) VALUES (?, ?)",
+                        (norm, pid),
+                    )
+            result[position] = pid
+
+    def _create(self, conn: Optional[sqlite3.Connection], name: str, norm: str) -> int:
+        if conn is None:
+            pid = self._max_id + 1
+        else:
+            cursor = conn.execute(
+                "INSERT INTO products (name, normalized) VALUES (?, ?)"
+                " ON CONFLICT (normalized) DO NOTHING",
+                (name, norm),
+            )
+            if cursor.rowcount:
+                pid = cursor.lastrowid
+            else:
+                # Another process created the product since we loaded.
+                pid, name = conn.execute(
+                    "SELECT id, name FROM products WHERE normalized = ?", (norm,)
+                ).fetchone()
+        self._products[pid] = (name, norm)
+        self._max_id = max(self._max_id, pid)
+        if self._buckets is not None:
+            self._add_to_bucket(pid, norm)
+        return pid
+
+
+def catalog_stats(db_path: str) -> Dict[str, int]:
+    """
+    Product and alias counts stored in ``db_path``.  Returns an empty dict
+    if the database or tables do not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            products = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            aliases = conn.execute("SELECT COUNT(*) FROM product_aliases").fetchone()[0]
+    except sqlite3.OperationalError:
+        return {}
+    return {"products": products, "aliases": aliases}
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            normalized TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS product_aliases (
+            alias TEXT PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
@@ -1,19 +1,141 @@
 """
 Database layer for the shopping agent.
 
-This module uses SQLite to persist orders and metrics.
+This module uses SQLite to persist orders and metrics; `analytics` reads
+run metrics back with aggregates pushed down into SQL.  Connections are
+long-lived: one `ConnectionManager` per database file owns a single
+connection opened in WAL mode, shared between threads and serialised by a
+lock.  Bulk writes go through ``executemany`` inside one transaction.
 """
+import atexit
+import os
 import sqlite3
-from contextlib import closing
-from typing import List, Dict, Tuple
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from datetime import datetime
 
+from .money import Cents, to_cents
+
 # Path to the SQLite database file. This will create the file in the working directory.
 DB_PATH = "shopping_agent.db"
 
+# Pragmas applied to every new connection.  WAL lets readers proceed while a
+# writer commits and, together with synchronous=NORMAL, avoids an fsync per
+# transaction.  Adjust with `configure` before the first query.
+PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+}
+
+# Rows handed to a single executemany call by the bulk insert helpers.
+BATCH_SIZE = 1000
+
+# Keys per "IN (...)" lookup; stays below SQLite's bound-parameter limit.
+LOOKUP_CHUNK = 500
+
+_managers: Dict[str, "ConnectionManager"] = {}
+_managers_lock = threading.Lock()
+# Managers inherited from the parent of a forked process.  They are kept
+# referenced but never used or closed: closing would release SQLite
+# locks that belong to the parent.
+_inherited: List["ConnectionManager"] = []
+
+
+class ConnectionManager:
+    """
+    Owns one SQLite connection for ``path`` and hands it out under a
+    re-entrant lock, so it can be shared by every thread in the process.
+    """
+
+    def __init__(self, path: str, pragmas: Optional[Dict[str, Any]] = None) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self.apply_pragmas(PRAGMAS if pragmas is None else pragmas)
+
+    def apply_pragmas(self, pragmas: Dict[str, Any]) -> None:
+        """Set each ``PRAGMA name = value`` on the managed connection."""
+        with self._lock:
+            for name, value in pragmas.items():
+                self._conn.execute(f"PRAGMA {name} = {value}")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the connection for reads or self-managed writes."""
+        with self._lock:
+            yield self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the connection; commit on success, roll back on error."""
+        with self._lock:
+            with self._conn:
+                yield self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def get_manager(path: Optional[str] = None) -> ConnectionManager:
+    """Return the shared manager for ``path`` (default: ``DB_PATH``)."""
+    path = DB_PATH if path is None else path
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = ConnectionManager(path)
+        return manager
+
+
+def configure(**pragmas: Any) -> None:
+    """
+    Override default pragmas, e.g. ``configure(synchronous="FULL")``.
+    Already open connections are updated as well.
+    """
+    PRAGMAS.update(pragmas)
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.apply_pragmas(pragmas)
+
+
+def close(path: Optional[str] = None) -> None:
+    """Close the connection for ``path`` (default: ``DB_PATH``), if open."""
+    path = DB_PATH if path is None else path
+    with _managers_lock:
+        manager = _managers.pop(path, None)
+    if manager is not None:
+        manager.close()
+
+
+def close_all() -> None:
+    """Close every open connection.  Later calls reopen them on demand."""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+def _forget_after_fork() -> None:
+    global _managers_lock
+    _managers_lock = threading.Lock()
+    _inherited.extend(_managers.values())
+    _managers.clear()
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+    os.register_at_fork(after_in_child=_forget_after_fork)
+
+
 def initialize_db() -> None:
     """Create required tables if they do not exist."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with get_manager().transaction() as conn:
         cur = conn.cursor()
         # create orders table
         cur.execute(
@@ -22,10 +144,12 @@ def initialize_db() -> None:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
                 price REAL NOT NULL,
-                date TEXT NOT NULL
+                date TEXT NOT NULL,
+                price_cents INTEGER
             )
             """
         )
+        _add_missing_columns(cur, "orders", {"price_cents": "INTEGER"})
         # create metrics table
         cur.execute(
             """
@@ -33,41 +157,216 @@ def initialize_db() -> None:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT NOT NULL,
                 count INTEGER,
-                avg_margin REAL
+                avg_margin REAL,
+                offers_evaluated INTEGER,
+                listings_created INTEGER
+            )
+            """
+        )
+        _add_missing_columns(
+            cur, "metrics", {"offers_evaluated": "INTEGER", "listings_created": "INTEGER"}
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS metrics_timestamp ON metrics (timestamp)")
+        # create spans table: per-run timing aggregate per stage/tool
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS spans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run TEXT NOT NULL,
+                name TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                total REAL NOT NULL,
+                max REAL NOT NULL,
+                sketch TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS spans_run ON spans (run)")
+        # create fingerprint index: last inputs and decision per product
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_fingerprints (
+                product TEXT PRIMARY KEY,
+                purchase_cents INTEGER NOT NULL,
+                competitor_cents INTEGER NOT NULL,
+                decision TEXT NOT NULL,
+                resale_cents INTEGER,
+                listing_id TEXT,
+                priced_at REAL NOT NULL
             )
             """
         )
-        conn.commit()
 
 
-def insert_orders(orders: List[Dict]) -> None:
+def _add_missing_columns(
+    cur: sqlite3.Cursor, table: str, columns: Dict[str, str]
+) -> None:
+    """Upgrade tables created by older versions of this module."""
+    existing = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _batched(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    batch: List[Tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_orders(orders: Iterable[Dict], batch_size: int = BATCH_SIZE) -> None:
     """Insert a list of orders into the database.
 
-    Each order should be a dict with keys: name, price, date.
+    Each order should be a dict with keys: name, price, date.  The price
+    may be a price string or a number of euros; it is stored exactly in
+    ``price_cents`` (``price`` keeps the euro value for older readers).
+    All rows are written in a single transaction, ``batch_size`` rows per
+    ``executemany`` call.
     """
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cur = conn.cursor()
+    def rows() -> Iterator[Tuple]:
         for order in orders:
-            cur.execute(
-                "INSERT INTO orders (name, price, date) VALUES (?, ?, ?)",
-                (order["name"], float(order["price"]), order.get("date", "")),
+            cents = _order_cents(order)
+            yield order["name"], cents / 100, order.get("date", ""), cents
+
+    with get_manager().transaction() as conn:
+        for batch in _batched(rows(), batch_size):
+            conn.executemany(
+                "INSERT INTO orders (name, price, date, price_cents) VALUES (?, ?, ?, ?)",
+                batch,
             )
-        conn.commit()
+
+
+def _order_cents(order: Dict) -> Cents:
+    cents = to_cents(order["price"])
+    if cents is None:
+        raise ValueError(f"invalid price for {order['name']!r}: {order['price']!r}")
+    return cents
 
 
 def insert_metrics(count: int, avg_margin: float) -> None:
     """Insert a metrics record into the database."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO metrics (timestamp, count, avg_margin) VALUES (?, ?, ?)",
-            (datetime.utcnow().isoformat(), count, avg_margin),
-        )
-        conn.commit()
+    insert_metrics_many([(count, avg_margin)])
+
+
+def insert_metrics_many(
+    records: Iterable[Sequence], batch_size: int = BATCH_SIZE
+) -> None:
+    """
+    Insert several ``(count, avg_margin)`` or ``(timestamp, count,
+    avg_margin)`` records in one transaction.  Records without a
+    timestamp are stamped with the current UTC time.
+    """
+    def rows() -> Iterator[Tuple]:
+        for record in records:
+            if len(record) == 2:
+                yield (datetime.utcnow().isoformat(), *record)
+            else:
+                yield tuple(record)
+
+    with get_manager().transaction() as conn:
+        for batch in _batched(rows(), batch_size):
+            conn.executemany(
+                "INSERT INTO metrics (timestamp, count, avg_margin) VALUES (?, ?, ?)",
+                batch,
+            )
 
 
 def fetch_metrics() -> List[Tuple]:
-    """Return all metrics records as a list of tuples."""
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        cur = conn.cursor()
-        return cur.execute("SELECT * FROM metrics").fetchall()
+    """
+    Return all ``(id, timestamp, count, avg_margin)`` records as a list of
+    tuples.  Use `analytics` for aggregates and paginated run metrics.
+    """
+    with get_manager().connection() as conn:
+        return conn.execute("SELECT id, timestamp, count, avg_margin FROM metrics").fetchall()
+
+
+def insert_runs(runs: Iterable[Sequence], batch_size: int = BATCH_SIZE) -> None:
+    """
+    Store per-run metrics, each ``(timestamp, offers_evaluated,
+    listings_created)``, in one transaction.
+    """
+    with get_manager().transaction() as conn:
+        for batch in _batched(runs, batch_size):
+            conn.executemany(
+                "INSERT INTO metrics (timestamp, offers_evaluated, listings_created) VALUES (?, ?, ?)",
+                batch,
+            )
+
+
+class Fingerprint(NamedTuple):
+    """Inputs and outcome of the last evaluation of a product."""
+    product: str
+    purchase_cents: int
+    competitor_cents: int
+    decision: str
+    resale_cents: Optional[int]
+    listing_id: Optional[str]
+    priced_at: float
+
+
+def fetch_fingerprints(products: Iterable[str]) -> Dict[str, Fingerprint]:
+    """Return the stored fingerprints for ``products``, keyed by product."""
+    keys = list(dict.fromkeys(products))
+    found: Dict[str, Fingerprint] = {}
+    with get_manager().connection() as conn:
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT * FROM item_fingerprints WHERE product IN ({placeholders})",
+                chunk,
+            ):
+                found[row[0]] = Fingerprint(*row)
+    return found
+
+
+def upsert_fingerprints(
+    fingerprints: Iterable[Fingerprint], batch_size: int = BATCH_SIZE
+) -> None:
+    """Insert or replace fingerprints in one transaction."""
+    with get_manager().transaction() as conn:
+        for batch in _batched(fingerprints, batch_size):
+            conn.executemany(
+                "INSERT OR REPLACE INTO item_fingerprints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+
+
+def insert_spans(run: str, spans: Iterable[Sequence]) -> None:
+    """
+    Store the timing spans of one run, identified by its episode
+    timestamp.  Each span is ``(name, count, total, max, sketch)`` as
+    produced by `telemetry.Telemetry.rows`.
+    """
+    with get_manager().transaction() as conn:
+        conn.executemany(
+            "INSERT INTO spans (run, name, count, total, max, sketch) VALUES (?, ?, ?, ?, ?, ?)",
+            [(run, *span) for span in spans],
+        )
+
+
+def fetch_spans(last_runs: int = 10) -> Tuple[List[str], List[Tuple]]:
+    """
+    Return the identifiers of the last ``last_runs`` runs with spans,
+    oldest first, and their ``(name, count, total, max, sketch)`` rows.
+    """
+    with get_manager().connection() as conn:
+        runs = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT run FROM spans ORDER BY run DESC LIMIT ?", (last_runs,)
+            )
+        ]
+        if not runs:
+            return [], []
+        placeholders = ",".join("?" * len(runs))
+        rows = conn.execute(
+            f"SELECT name, count, total, max, sketch FROM spans WHERE run IN ({placeholders})",
+            runs,
+        ).fetchall()
+    return runs[::-1], rows
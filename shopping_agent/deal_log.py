@@ -0,0 +1,217 @@
+"""
+Columnar log of every evaluated offer.
+
+`DealLog` keeps one row per offer the agent decided on: when, which
+product, the purchase, competitor and resale prices in cents and the
+decision.  Each column is a separate append-only file of fixed-width
+values in native byte order, so a column of tens of millions of rows is
+memory-mapped and read as one array without parsing anything:
+`DealLog.columns` returns NumPy views of the mapped files when NumPy is
+installed and ``memoryview`` casts of them otherwise.  The analytics
+over the log live in `eval` (`eval.deal_statistics`,
+`eval.product_statistics`, `eval.margin_histogram`).
+
+Products are stored as 64-bit hashes of their keys (the catalog or cache
+key the orchestrator priced them under); ``products.jsonl`` maps each
+hash back to its key and gains one line per new product.  A crash
+between the column writes of a batch leaves the columns at different
+lengths: reopening truncates them to the rows all columns hold, and cuts
+off a torn last line of ``products.jsonl``.  Corrupt lines elsewhere in
+it are skipped and counted in `DealLog.corrupt_products`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the stdlib fallback is slower.
+    np = None
+
+
+DEFAULT_DIR = "deals"
+
+# Column name and `array` type code, in file order.
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("timestamp", "d"),
+    ("product", "Q"),
+    ("purchase_cents", "q"),
+    ("competitor_cents", "q"),
+    ("resale_cents", "q"),
+    ("decision", "B"),
+)
+
+# Decision codes: the index in this tuple is what the log stores.  Every
+# decision but the first means the offer was (or stayed) listed.
+DECISIONS = ("unprofitable", "listed", "repriced", "active")
+_CODES = {decision: code for code, decision in enumerate(DECISIONS)}
+
+
+class DealRow(NamedTuple):
+    """One evaluated offer as handed to `DealLog.append_many`."""
+    timestamp: float
+    product: str
+    purchase_cents: int
+    competitor_cents: int
+    resale_cents: int
+    decision: str
+
+
+def product_id(key: str) -> int:
+    """Stable 64-bit ID of a product key."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class DealLog:
+    """The columnar offer log in directory ``path``."""
+
+    def __init__(self, path: str = DEFAULT_DIR) -> None:
+        self.path = path
+        self.products: Dict[int, str] = {}
+        self.corrupt_products = 0
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._files: Dict[str, Any] = {}
+        self._open()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def append_many(self, rows: Iterable[DealRow]) -> int:
+        """Append ``rows`` to every column; returns the number written."""
+        columns = {name: array(code) for name, code in COLUMNS}
+        new_products: List[Tuple[int, str]] = []
+        with self._lock:
+            for row in rows:
+                pid = product_id(row.product)
+                if pid not in self.products:
+                    self.products[pid] = row.product
+                    new_products.append((pid, row.product))
+                columns["timestamp"].append(row.timestamp)
+                columns["product"].append(pid)
+                columns["purchase_cents"].append(row.purchase_cents)
+                columns["competitor_cents"].append(row.competitor_cents)
+                columns["resale_cents"].append(row.resale_cents)
+                columns["decision"].append(_CODES[row.decision])
+            count = len(columns["timestamp"])
+            if not count:
+                return 0
+            # Products first: a row is never stored without its key.
+            if new_products:
+                f = self._files["products"]
+                f.writelines(json.dumps([pid, key]) + "\n" for pid, key in new_products)
+                f.flush()
+            for name, _ in COLUMNS:
+                columns[name].tofile(self._files[name])
+                self._files[name].flush()
+            self._rows += count
+        return count
+
+    def columns(self) -> Dict[str, Any]:
+        """
+        Zero-copy views of every column over the rows written so far:
+        NumPy arrays when NumPy is installed, ``memoryview`` otherwise.
+        """
+        with self._lock:
+            rows = self._rows
+        return _map_columns(self.path, rows)
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+    def _open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        rows, sizes = _row_count(self.path)
+        for name, code in COLUMNS:
+            itemsize = array(code).itemsize
+            if sizes[name] != rows * itemsize:
+                with open(_column_path(self.path, name), "r+b") as f:
+                    f.truncate(rows * itemsize)
+        self._rows = rows
+        products_path = os.path.join(self.path, "products.jsonl")
+        self.corrupt_products, end = _read_products(products_path, self.products)
+        if end is not None:
+            # Drop the torn last record; corrupt lines before it are kept.
+            with open(products_path, "r+b") as f:
+                f.truncate(end)
+        self._files = {name: open(_column_path(self.path, name), "ab") for name, _ in COLUMNS}
+        self._files["products"] = open(products_path, "a")
+
+
+def open_columns(path: str = DEFAULT_DIR) -> Tuple[Dict[str, Any], Dict[int, str]]:
+    """
+    Map the columns and product keys of the log in ``path`` read-only.
+    Returns empty columns if there is no log.
+    """
+    if not os.path.isdir(path):
+        return {}, {}
+    # Read-only: a writer may be appending, so nothing is truncated here.
+    rows, _ = _row_count(path)
+    products: Dict[int, str] = {}
+    _read_products(os.path.join(path, "products.jsonl"), products)
+    return _map_columns(path, rows), products
+
+
+def _column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.col")
+
+
+def _row_count(path: str) -> Tuple[int, Dict[str, int]]:
+    """Rows held by every column, and each column file's size in bytes."""
+    sizes = {}
+    for name, _ in COLUMNS:
+        column = _column_path(path, name)
+        sizes[name] = os.path.getsize(column) if os.path.exists(column) else 0
+    rows = min(sizes[name] // array(code).itemsize for name, code in COLUMNS)
+    return rows, sizes
+
+
+def _read_products(path: str, products: Dict[int, str]) -> Tuple[int, Optional[int]]:
+    """
+    Add the product keys in ``path``.  Returns the number of corrupt
+    lines skipped and, if the last line is torn (a write cut short by a
+    crash), the offset it starts at.
+    """
+    if not os.path.exists(path):
+        return 0, None
+    corrupt = 0
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.endswith(b"\n"):
+                # Its batch's rows were never written, so drop it whole.
+                return corrupt, start
+            try:
+                pid, key = json.loads(line)
+            except ValueError:
+                corrupt += 1
+                continue
+            products[pid] = key
+    return corrupt, None
+
+
+def _map_columns(path: str, rows: int) -> Dict[str, Any]:
+    views: Dict[str, Any] = {}
+    for name, code in COLUMNS:
+        if not rows:
+            views[name] = np.empty(0, dtype=code) if np is not None else memoryview(array(code))
+            continue
+        with open(_column_path(path, name), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), rows * array(code).itemsize, access=mmap.ACCESS_READ)
+        # The view keeps the mapping alive for as long as it is used.
+        if np is not None:
+            views[name] = np.frombuffer(mapped, dtype=code, count=rows)
+        else:
+            views[name] = memoryview(mapped).cast(code)
+    return views
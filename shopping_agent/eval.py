@@ -2,52 +2,424 @@
 Evaluation hooks for the shopping agent.  This module provides simple
 utilities to log performance metrics and could be expanded to include
 automatic evaluation using a language model or analytics framework.
+
+Runs are recorded in the database (`record_run`) and queried through
+`analytics`.  Their statistics are maintained incrementally by
+`MetricsAggregator`: running sums, rolling windows and quantile sketches
+live in a small JSON checkpoint in the same database together with the
+id of the last run folded in, so each refresh only reads runs recorded
+since.
+
+Per-offer outcomes are kept in the columnar `deal_log`; `deal_statistics`,
+`product_statistics` and `margin_histogram` aggregate it over
+memory-mapped columns, vectorised with NumPy when it is installed.
 """
 
-from typing import Dict, Any
-import csv
-import os
+from collections import deque
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import bisect
+import json
+import math
+import sqlite3
 import datetime
 
 
-METRICS_FILE = os.path.join(os.getcwd(), "agent_metrics.csv")
+# Per-run columns that are aggregated.
+TRACKED_FIELDS = ("offers_evaluated", "listings_created")
+
+# Quantiles reported for each tracked field.
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Quantiles of the per-offer margin reported by `deal_statistics`.
+MARGIN_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
 
 
-def log_metrics(metrics: Dict[str, Any]) -> None:
+def record_run(episode: Any, spans: Iterable[Sequence]) -> None:
     """
-    Append a row of metrics to a CSV file.  Each run should call this
-    function after the episode ends.
+    Store a finished episode's metrics and timing spans (see
+    `telemetry.Telemetry.rows`) in the database, both keyed by the
+    episode's timestamp.
     """
-    file_exists = os.path.exists(METRICS_FILE)
-    with open(METRICS_FILE, "a", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp"] + list(metrics.keys()))
-        if not file_exists:
-            writer.writeheader()
-        row = {"timestamp": datetime.datetime.now().isoformat()}
-        row.update(metrics)
-        writer.writerow(row)
+    from . import database
 
+    database.initialize_db()
+    database.insert_runs(
+        [(episode.timestamp, episode.offers_evaluated, episode.listings_created)]
+    )
+    database.insert_spans(episode.timestamp, spans)
 
-def compute_statistics() -> Dict[str, Any]:
+
+class QuantileSketch:
     """
-    Compute simple statistics over the collected metrics.  Returns a
-    dictionary with aggregates such as average offers evaluated per run.
+    Relative-error quantile sketch over non-negative values.  Values are
+    counted in logarithmic buckets whose width bounds the relative error
+    of any reported quantile by ``accuracy``.
     """
-    if not os.path.exists(METRICS_FILE):
-        return {}
-    counts = 0
-    total_offers = 0
-    total_listings = 0
-    with open(METRICS_FILE, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            counts += 1
-            total_offers += int(row.get("offers_evaluated", 0))
-            total_listings += int(row.get("listings_created", 0))
-    if counts == 0:
+
+    def __init__(self, accuracy: float = 0.01) -> None:
+        self.accuracy = accuracy
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.zeros = 0
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Fold ``other`` (built with the same accuracy) into this sketch."""
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "accuracy": self.accuracy,
+            "zeros": self.zeros,
+            "count": self.count,
+            "buckets": {str(k): v for k, v in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["accuracy"])
+        sketch.zeros = data["zeros"]
+        sketch.count = data["count"]
+        sketch.buckets = {int(k): v for k, v in data["buckets"].items()}
+        return sketch
+
+
+class MetricsAggregator:
+    """
+    Incremental aggregate over the runs in the ``metrics`` table, with its
+    checkpoint stored in the same database.  Keeps lifetime sums, the last
+    ``window_runs`` runs, per-minute totals for the last ``window_seconds``
+    and a quantile sketch per tracked field.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        window_runs: int = 100,
+        window_seconds: int = 24 * 3600,
+    ) -> None:
+        self.db_path = db_path
+        self.window_runs = window_runs
+        self.window_seconds = window_seconds
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        self.last_id = 0
+        self.runs = 0
+        self.sums = dict.fromkeys(TRACKED_FIELDS, 0.0)
+        self.recent: deque = deque(maxlen=self.window_runs)
+        # epoch minute -> [runs, sum per tracked field...]
+        self.minutes: Dict[int, List[float]] = {}
+        self.sketches = {name: QuantileSketch() for name in TRACKED_FIELDS}
+
+    def _load(self) -> None:
+        from . import database
+
+        try:
+            with database.get_manager(self.db_path).connection() as conn:
+                row = conn.execute("SELECT data FROM metrics_checkpoint WHERE id = 0").fetchone()
+        except sqlite3.OperationalError:
+            return  # no checkpoint yet
+        try:
+            data = json.loads(row[0]) if row else {}
+            if (data["window_runs"], data["window_seconds"]) != (
+                self.window_runs,
+                self.window_seconds,
+            ):
+                return  # built for other windows: rebuild from the runs
+            self.last_id = data["last_id"]
+            self.runs = data["runs"]
+            self.sums = data["sums"]
+            self.recent.extend(data["recent"])
+            self.minutes = {int(k): v for k, v in data["minutes"].items()}
+            self.sketches = {
+                name: QuantileSketch.from_dict(d) for name, d in data["sketches"].items()
+            }
+        except (ValueError, KeyError):
+            self._reset()
+
+    def save(self) -> None:
+        """Write the checkpoint."""
+        from . import database
+
+        data = {
+            "window_runs": self.window_runs,
+            "window_seconds": self.window_seconds,
+            "last_id": self.last_id,
+            "runs": self.runs,
+            "sums": self.sums,
+            "recent": list(self.recent),
+            "minutes": {str(k): v for k, v in self.minutes.items()},
+            "sketches": {name: s.to_dict() for name, s in self.sketches.items()},
+        }
+        with database.get_manager(self.db_path).transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics_checkpoint"
+                " (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics_checkpoint (id, data) VALUES (0, ?)",
+                (json.dumps(data),),
+            )
+
+    def refresh(self) -> None:
+        """
+        Fold in the runs recorded since the checkpoint.  Raises
+        `sqlite3.OperationalError` if the database has no metrics table.
+        """
+        from . import database
+
+        with database.get_manager(self.db_path).connection() as conn:
+            newest = conn.execute("SELECT MAX(id) FROM metrics").fetchone()[0] or 0
+            if newest < self.last_id:
+                # The runs were deleted or replaced; start over.
+                self._reset()
+            if newest == self.last_id:
+                return
+            rows = conn.execute(
+                f"SELECT timestamp, {', '.join(TRACKED_FIELDS)} FROM metrics"
+                " WHERE id > ? AND id <= ? AND offers_evaluated IS NOT NULL ORDER BY id",
+                (self.last_id, newest),
+            )
+            for row in rows:
+                self.add(dict(zip(("timestamp", *TRACKED_FIELDS), row)))
+        self.last_id = newest
+        self.save()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Fold a single run into the aggregate in O(1)."""
+        values = [float(row.get(name) or 0) for name in TRACKED_FIELDS]
+        self.runs += 1
+        for name, value in zip(TRACKED_FIELDS, values):
+            self.sums[name] += value
+            self.sketches[name].add(value)
+        self.recent.append(values)
+        epoch = _epoch(row.get("timestamp"))
+        if epoch is not None:
+            minute = int(epoch // 60)
+            bucket = self.minutes.setdefault(minute, [0] + [0.0] * len(values))
+            bucket[0] += 1
+            for i, value in enumerate(values, start=1):
+                bucket[i] += value
+            self._expire_minutes(minute * 60)
+
+    def _expire_minutes(self, now: float) -> None:
+        oldest = int((now - self.window_seconds) // 60)
+        for minute in [m for m in self.minutes if m <= oldest]:
+            del self.minutes[minute]
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Lifetime averages, rolling windows and percentiles."""
+        if self.runs == 0:
+            return {}
+        stats: Dict[str, Any] = {"runs": self.runs}
+        for name in TRACKED_FIELDS:
+            stats[f"avg_{name}"] = self.sums[name] / self.runs
+        stats.update(_window_averages(f"last_{len(self.recent)}_runs", self.recent))
+        now = datetime.datetime.now().timestamp() if now is None else now
+        oldest = (now - self.window_seconds) // 60
+        window = [v for m, v in self.minutes.items() if m > oldest]
+        runs = sum(bucket[0] for bucket in window)
+        label = f"last_{self.window_seconds // 3600}h"
+        stats[f"{label}_runs"] = runs
+        for i, name in enumerate(TRACKED_FIELDS, start=1):
+            total = sum(bucket[i] for bucket in window)
+            stats[f"{label}_avg_{name}"] = total / runs if runs else 0.0
+        for name in TRACKED_FIELDS:
+            for q in QUANTILES:
+                stats[f"p{round(q * 100)}_{name}"] = self.sketches[name].quantile(q)
+        return stats
+
+
+class ProductStats(NamedTuple):
+    """Aggregate of the logged offers of one product; prices in cents."""
+    product: str
+    offers: int
+    listed: int
+    hit_rate: float
+    avg_margin_cents: float
+    min_competitor_cents: int
+    last_competitor_cents: int
+
+
+def deal_statistics(path: Optional[str] = None, since: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Statistics over the offers in the deal log at ``path`` (default
+    `deal_log.DEFAULT_DIR`) logged at or after the epoch time ``since``:
+    the number of offers and of each decision, the hit rate (share of
+    offers listed) and the distribution of the margin, the resale minus
+    the purchase price in cents.  Returns an empty dict if there are none.
+    """
+    from . import deal_log
+
+    columns, _ = _deal_columns(path, since)
+    offers = len(columns["decision"]) if columns else 0
+    if not offers:
         return {}
+    if deal_log.np is not None:
+        np = deal_log.np
+        counts = np.bincount(columns["decision"], minlength=len(deal_log.DECISIONS)).tolist()
+        margins = columns["resale_cents"] - columns["purchase_cents"]
+        total, low, high = int(margins.sum()), int(margins.min()), int(margins.max())
+        ranks = [int(q * (offers - 1)) for q in MARGIN_QUANTILES]
+        quantiles = np.partition(margins, ranks)[ranks].tolist()
+    else:
+        counts = [0] * len(deal_log.DECISIONS)
+        for code in columns["decision"]:
+            counts[code] += 1
+        margins = sorted(r - p for r, p in zip(columns["resale_cents"], columns["purchase_cents"]))
+        total, low, high = sum(margins), margins[0], margins[-1]
+        quantiles = [margins[int(q * (offers - 1))] for q in MARGIN_QUANTILES]
+    listed = offers - counts[0]
+    stats: Dict[str, Any] = {"offers": offers, "listed": listed, "hit_rate": listed / offers}
+    for decision, count in zip(deal_log.DECISIONS, counts):
+        stats[f"{decision}_offers"] = count
+    stats.update(avg_margin_cents=total / offers, min_margin_cents=low, max_margin_cents=high)
+    for q, value in zip(MARGIN_QUANTILES, quantiles):
+        stats[f"p{round(q * 100)}_margin_cents"] = value
+    return stats
+
+
+def product_statistics(
+    path: Optional[str] = None,
+    since: Optional[float] = None,
+    top: Optional[int] = None,
+) -> List[ProductStats]:
+    """
+    Per-product aggregates over the deal log, most offered products
+    first (ties by product key); only the first ``top`` if given.
+    """
+    from . import deal_log
+
+    columns, products = _deal_columns(path, since)
+    if not columns or not len(columns["product"]):
+        return []
+    if deal_log.np is not None:
+        np = deal_log.np
+        ids, inverse = np.unique(columns["product"], return_inverse=True)
+        offers = np.bincount(inverse)
+        listed = np.bincount(inverse, weights=columns["decision"] != 0)
+        margins = np.bincount(
+            inverse, weights=columns["resale_cents"] - columns["purchase_cents"]
+        )
+        # A stable sort groups each product's rows in log order.
+        order = np.argsort(inverse, kind="stable")
+        competitor = columns["competitor_cents"][order]
+        starts = np.concatenate(([0], np.cumsum(offers)[:-1]))
+        lowest = np.minimum.reduceat(competitor, starts)
+        last = competitor[starts + offers - 1]
+        rows = zip(
+            ids.tolist(), offers.tolist(), listed.tolist(), margins.tolist(),
+            lowest.tolist(), last.tolist(),
+        )
+    else:
+        grouped: Dict[int, List] = {}
+        for pid, code, resale, purchase, comp in zip(
+            columns["product"], columns["decision"], columns["resale_cents"],
+            columns["purchase_cents"], columns["competitor_cents"],
+        ):
+            entry = grouped.get(pid)
+            if entry is None:
+                entry = grouped[pid] = [pid, 0, 0, 0, comp, comp]
+            entry[1] += 1
+            entry[2] += code != 0
+            entry[3] += resale - purchase
+            entry[4] = min(entry[4], comp)
+            entry[5] = comp
+        rows = grouped.values()
+    result = [
+        ProductStats(
+            products.get(pid, str(pid)), int(n), int(hits), hits / n, margin / n, int(low), int(latest)
+        )
+        for pid, n, hits, margin, low, latest in rows
+    ]
+    result.sort(key=lambda s: (-s.offers, s.product))
+    return result[:top] if top is not None else result
+
+
+def margin_histogram(
+    edges: Sequence[int],
+    path: Optional[str] = None,
+    since: Optional[float] = None,
+) -> List[int]:
+    """
+    Number of logged offers whose margin in cents falls in each bucket
+    ``[edges[i], edges[i + 1])``; margins outside the edges are not
+    counted.
+    """
+    from . import deal_log
+
+    buckets = len(edges) - 1
+    columns, _ = _deal_columns(path, since)
+    if not columns or buckets < 1:
+        return [0] * max(buckets, 0)
+    if deal_log.np is not None:
+        np = deal_log.np
+        margins = columns["resale_cents"] - columns["purchase_cents"]
+        index = np.searchsorted(np.asarray(edges), margins, side="right")
+        return np.bincount(index, minlength=len(edges) + 1)[1:len(edges)].tolist()
+    counts = [0] * buckets
+    for resale, purchase in zip(columns["resale_cents"], columns["purchase_cents"]):
+        i = bisect.bisect_right(edges, resale - purchase) - 1
+        if 0 <= i < buckets:
+            counts[i] += 1
+    return counts
+
+
+def _deal_columns(path: Optional[str], since: Optional[float]) -> Tuple[Dict[str, Any], Dict[int, str]]:
+    """The deal log's columns, restricted to rows logged at or after ``since``."""
+    from . import deal_log
+
+    columns, products = deal_log.open_columns(path or deal_log.DEFAULT_DIR)
+    if not columns or since is None:
+        return columns, products
+    # Rows are appended in time order, so the window is a suffix.
+    timestamps = columns["timestamp"]
+    if deal_log.np is not None:
+        start = int(deal_log.np.searchsorted(timestamps, since, side="left"))
+    else:
+        start = bisect.bisect_left(timestamps, since)
+    return {name: column[start:] for name, column in columns.items()}, products
+
+
+def _window_averages(label: str, rows: Iterable[List[float]]) -> Dict[str, float]:
+    rows = list(rows)
     return {
-        "runs": counts,
-        "avg_offers_evaluated": total_offers / counts,
-        "avg_listings_created": total_listings / counts,
+        f"{label}_avg_{name}": (sum(r[i] for r in rows) / len(rows) if rows else 0.0)
+        for i, name in enumerate(TRACKED_FIELDS)
     }
+
+
+def _epoch(timestamp: Optional[str]) -> Optional[float]:
+    if not timestamp:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return None
@@ -0,0 +1,99 @@
+"""
+Batch deal evaluation.
+
+`BatchEvaluator` takes columnar price data in integer cents (any
+sequence of ints, e.g. ``array('q')``) and computes target resale prices,
+net margins and the list/skip mask for a whole batch at once.  Every
+column operation is a single ``map`` over ``operator`` functions, so the
+per-item work runs in C rather than in a Python loop body.  Margins and
+fees are applied in basis points with integer arithmetic, so results do
+not drift with float rounding.  Only the standard library is used.
+
+A deal is listed when the resale price, after eBay fees and shipping,
+exceeds the purchase price::
+
+    target = competitor * (1 + margin[category])
+    net    = target * (1 - fee_rate) - shipping_cost
+    list   = net > purchase
+"""
+
+from __future__ import annotations
+
+import operator
+from array import array
+from dataclasses import dataclass
+from itertools import compress, repeat
+from typing import Dict, Iterator, Optional, Sequence
+
+from .money import basis_points
+
+
+@dataclass
+class BatchResult:
+    """Column-wise outcome of `BatchEvaluator.evaluate`, in cents."""
+
+    target_prices: array
+    margins: array
+    mask: bytes
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    def selected(self) -> Iterator[int]:
+        """Indices of items that should be listed."""
+        return compress(range(len(self.mask)), self.mask)
+
+
+class BatchEvaluator:
+    def __init__(
+        self,
+        profit_margin: float = 0.15,
+        category_margins: Optional[Dict[str, float]] = None,
+        fee_rate: float = 0.0,
+        shipping_cost: int = 0,
+    ) -> None:
+        """
+        ``category_margins`` overrides ``profit_margin`` for items whose
+        category is listed.  ``fee_rate`` is the fraction of the resale
+        price kept by the marketplace and ``shipping_cost`` a flat amount
+        in cents per item, both deducted before comparing with the
+        purchase price.
+        """
+        self.profit_margin = profit_margin
+        self.category_margins = dict(category_margins or {})
+        self.fee_rate = fee_rate
+        self.shipping_cost = shipping_cost
+        self._factors = {
+            c: 10_000 + basis_points(m) for c, m in self.category_margins.items()
+        }
+
+    def evaluate(
+        self,
+        purchase_prices: Sequence[float],
+        competitor_prices: Sequence[float],
+        categories: Optional[Sequence[Optional[str]]] = None,
+    ) -> BatchResult:
+        """Evaluate a batch given as parallel columns of cents."""
+        if len(purchase_prices) != len(competitor_prices):
+            raise ValueError("price columns must have the same length")
+        default = 10_000 + basis_points(self.profit_margin)
+        if categories is None or not self._factors:
+            factors = repeat(default, len(competitor_prices))
+        else:
+            factors = map(self._factors.get, categories, repeat(default))
+        targets = array("q", _scale(map(operator.mul, competitor_prices, factors)))
+        net = targets
+        if self.fee_rate:
+            kept = repeat(10_000 - basis_points(self.fee_rate))
+            net = _scale(map(operator.mul, net, kept))
+        if self.shipping_cost:
+            net = map(operator.sub, net, repeat(self.shipping_cost))
+        margins = array("q", map(operator.sub, net, purchase_prices))
+        mask = bytes(map(operator.gt, margins, repeat(0)))
+        return BatchResult(targets, margins, mask)
+
+
+def _scale(products: Iterator[int]) -> Iterator[int]:
+    """Divide products of cents and basis points by 10,000, rounding half up."""
+    return map(operator.floordiv, map(operator.add, products, repeat(5_000)), repeat(10_000))
+
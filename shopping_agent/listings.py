@@ -0,0 +1,111 @@
+"""
+Index of the agent's active eBay listings.
+
+`ListingIndex` remembers, per product, the listing created for it and
+the price it is listed at, in the ``active_listings`` table of the
+SQLite database.  The orchestrator's batched listing stage consults it
+before talking to eBay: a product without a listing is created in bulk,
+one whose resale price changed is repriced in bulk, and one whose price
+did not change costs no call at all.  Listings are created with the
+product key as SKU, so even a listing created by a run that crashed
+before recording it is returned by eBay instead of being duplicated.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from . import database
+from .money import Cents
+
+
+class ActiveListing(NamedTuple):
+    """The listing of a product and the price it is listed at."""
+    product: str
+    listing_id: str
+    resale_cents: Cents
+    updated_at: float
+
+
+class ListingIndex:
+    """
+    Active listings keyed by product in the SQLite database at
+    ``db_path`` (default: ``database.DB_PATH``).
+    """
+
+    def __init__(self, db_path: Optional[str] = None) -> None:
+        self._db = database.get_manager(db_path)
+        with self._db.transaction() as conn:
+            _create_tables(conn)
+
+    def fetch(self, products: Iterable[str]) -> Dict[str, ActiveListing]:
+        """Return the active listings of ``products``, keyed by product."""
+        keys = list(dict.fromkeys(products))
+        found: Dict[str, ActiveListing] = {}
+        with self._db.connection() as conn:
+            for start in range(0, len(keys), database.LOOKUP_CHUNK):
+                chunk = keys[start:start + database.LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    "SELECT product, listing_id, resale_cents, updated_at FROM active_listings"
+                    f" WHERE product IN ({placeholders})",
+                    chunk,
+                ):
+                    found[row[0]] = ActiveListing(*row)
+        return found
+
+    def record(self, listings: Iterable[ActiveListing]) -> None:
+        """Insert or replace listings in one transaction."""
+        with self._db.transaction() as conn:
+            for batch in database._batched(listings, database.BATCH_SIZE):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO active_listings"
+                    " (product, listing_id, resale_cents, updated_at) VALUES (?, ?, ?, ?)",
+                    batch,
+                )
+
+    def remove(self, products: Iterable[str]) -> None:
+        """Forget the listings of ``products``, e.g. once they sold."""
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "DELETE FROM active_listings WHERE product = ?",
+                [(product,) for product in dict.fromkeys(products)],
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._db.connection() as conn:
+            return _count_rows(conn)
+
+
+def listing_stats(db_path: str) -> Dict[str, int]:
+    """
+    Number of active listings in ``db_path``.  Returns an empty dict if
+    the database or table does not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            return _count_rows(conn)
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _count_rows(conn: sqlite3.Connection) -> Dict[str, int]:
+    (count,) = conn.execute("SELECT COUNT(*) FROM active_listings").fetchone()
+    return {"active_listings": count}
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS active_listings (
+            product TEXT PRIMARY KEY,
+            listing_id TEXT NOT NULL,
+            resale_cents INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
@@ -0,0 +1,406 @@
+"""
+Client layer between the agent and its language model.
+
+`LLMClient` sends completions to a backend and adds what every call
+needs around it:
+
+* a `CompletionCache` keyed by a hash of the system prompt, the message
+  and the sampling parameters: an LRU in memory, optionally written
+  through to an ``llm_cache`` table so completions survive restarts and
+  repeat across runs for free.  The table is bounded as well; the least
+  recently used rows are evicted first.
+* micro-batching: concurrent `LLMClient.complete` calls with the same
+  parameters that arrive within ``batch_window`` seconds are sent as one
+  backend request of up to ``max_batch`` prompts, and identical prompts
+  in flight share one completion.  `LLMClient.complete_many` batches a
+  list of prompts directly.
+* streaming: `LLMClient.stream` yields the completion chunk by chunk as
+  the backend produces it and caches it once complete.
+* a "llm.call" timing span per call and "llm.backend" per backend
+  request in ``telemetry``, and hit, miss and batch counters in `stats`.
+
+A backend is any object with ``complete(system, messages, params)``,
+returning one completion per message, and ``stream(system, message,
+params)``, yielding chunks of one completion; `close` is optional.
+`LocalBackend`, the default, answers offline and deterministically.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import database
+from .telemetry import Telemetry
+
+
+COUNTERS = (
+    "calls",
+    "hits",
+    "disk_hits",
+    "misses",
+    "coalesced",
+    "batches",
+    "batched_prompts",
+)
+
+# Prompts per backend request.
+MAX_BATCH = 16
+
+# Seconds a micro-batch stays open for further prompts.
+BATCH_WINDOW = 0.005
+
+# Rows kept in the ``llm_cache`` table.
+MAX_STORED = 100_000
+
+
+class LocalBackend:
+    """
+    Offline backend that echoes the message, as the original stub did.
+    ``latency`` seconds are spent per request, not per prompt, like a
+    batched model server; ``chunk_size`` characters are streamed at a time.
+    """
+
+    def __init__(self, latency: float = 0.0, chunk_size: int = 8) -> None:
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.requests: List[int] = []  # prompts per request served
+
+    def complete(self, system: str, messages: List[str], params: Dict[str, Any]) -> List[str]:
+        self.requests.append(len(messages))
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._answer(message) for message in messages]
+
+    def stream(self, system: str, message: str, params: Dict[str, Any]) -> Iterator[str]:
+        self.requests.append(1)
+        text = self._answer(message)
+        for start in range(0, len(text), self.chunk_size):
+            if self.latency:
+                time.sleep(self.latency / max(1, len(text) // self.chunk_size))
+            yield text[start:start + self.chunk_size]
+
+    @staticmethod
+    def _answer(message: str) -> str:
+        return f"[LLM Stub] You said: {message}"
+
+
+class CompletionCache:
+    """
+    Thread-safe LRU of completions, written through to SQLite when
+    ``db_path`` is given.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        db_path: Optional[str] = None,
+        max_stored: int = MAX_STORED,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_stored = max_stored
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[database.ConnectionManager] = None
+        self._stored = 0
+        self.evictions = 0
+        if db_path is not None:
+            self._db = database.get_manager(db_path)
+            with self._db.transaction() as conn:
+                _create_tables(conn)
+                (self._stored,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+
+    @staticmethod
+    def key_for(system: str, message: str, params: Dict[str, Any]) -> str:
+        """Hash of everything that determines a completion."""
+        payload = json.dumps([system, message, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Tuple[Optional[str], bool]:
+        """The cached completion or None, and whether it came from disk."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value, False
+            if self._db is None:
+                return None, False
+            with self._db.transaction() as conn:
+                row = conn.execute("SELECT completion FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None, False
+                conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+            self._store_locked(key, row[0])
+            return row[0], True
+
+    def put_many(self, items: List[Tuple[str, str]]) -> None:
+        """Store ``(key, completion)`` pairs, persisting them in one transaction."""
+        with self._lock:
+            for key, value in items:
+                self._store_locked(key, value)
+            if self._db is None or not items:
+                return
+            now = time.time()
+            with self._db.transaction() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO llm_cache (key, completion, used_at) VALUES (?, ?, ?)",
+                    [(key, value, now) for key, value in items],
+                )
+                # Replaced rows overcount; the bound is checked by a recount.
+                self._stored += len(items)
+                if self._stored > self.max_stored:
+                    (self._stored,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+                    excess = self._stored - self.max_stored
+                    if excess > 0:
+                        conn.execute(
+                            "DELETE FROM llm_cache WHERE key IN"
+                            " (SELECT key FROM llm_cache ORDER BY used_at LIMIT ?)",
+                            (excess,),
+                        )
+                        self._stored -= excess
+                        self.evictions += excess
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        """Detach from the backing database; the shared connection stays open."""
+        self._db = None
+
+    def _store_locked(self, key: str, value: str) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            if self._db is None:
+                self.evictions += 1
+
+
+class _Batch:
+    """Prompts waiting to be sent together; one future per distinct key."""
+
+    def __init__(self, params: Dict[str, Any]) -> None:
+        self.params = params
+        self.keys: List[str] = []
+        self.messages: List[str] = []
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class LLMClient:
+    """
+    Cached, micro-batching client for one system prompt.  ``params``
+    given to the calls (e.g. ``temperature``) are passed to the backend
+    and are part of the cache key.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        backend: Any = None,
+        cache: Optional[CompletionCache] = None,
+        max_batch: int = MAX_BATCH,
+        batch_window: float = BATCH_WINDOW,
+        telemetry: Optional[Telemetry] = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.system_prompt = system_prompt
+        self.backend = backend or LocalBackend()
+        self.cache = cache if cache is not None else CompletionCache()
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self.telemetry = telemetry or Telemetry()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._open: Dict[str, _Batch] = {}  # parameter hash -> batch being filled
+        self._inflight: Dict[str, Future] = {}
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def complete(self, message: str, **params: Any) -> str:
+        """The completion of ``message``, batched with concurrent calls."""
+        started = self._clock()
+        try:
+            key = self.cache.key_for(self.system_prompt, message, params)
+            value = self._cached(key)
+            if value is not None:
+                return value
+            return self._submit(key, message, params).result()
+        finally:
+            self.telemetry.record("llm.call", self._clock() - started)
+
+    def complete_many(self, messages: List[str], **params: Any) -> List[str]:
+        """Completions of ``messages``, in order, in as few requests as possible."""
+        started = self._clock()
+        try:
+            keys = [self.cache.key_for(self.system_prompt, m, params) for m in messages]
+            results: Dict[str, str] = {}
+            missing: Dict[str, str] = {}
+            for key, message in zip(keys, messages):
+                if key in results or key in missing:
+                    continue
+                value = self._cached(key)
+                if value is None:
+                    missing[key] = message
+                else:
+                    results[key] = value
+            pending = list(missing.items())
+            for start in range(0, len(pending), self.max_batch):
+                chunk = pending[start:start + self.max_batch]
+                completions = self._request([m for _, m in chunk], params)
+                results.update(zip([k for k, _ in chunk], completions))
+                self.cache.put_many(list(zip([k for k, _ in chunk], completions)))
+            return [results[key] for key in keys]
+        finally:
+            self.telemetry.record("llm.call", self._clock() - started)
+
+    def stream(self, message: str, **params: Any) -> Iterator[str]:
+        """
+        Yield the completion of ``message`` in chunks as the backend
+        produces them.  A cached completion is yielded as one chunk; a
+        streamed one is cached once the stream has been read to the end.
+        """
+        started = self._clock()
+        key = self.cache.key_for(self.system_prompt, message, params)
+        value = self._cached(key)
+        if value is not None:
+            self.telemetry.record("llm.call", self._clock() - started)
+            yield value
+            return
+        chunks: List[str] = []
+        with self._lock:
+            self._count("batches")
+            self._count("batched_prompts")
+        for chunk in self.backend.stream(self.system_prompt, message, params):
+            if not chunks:
+                self.telemetry.record("llm.first_chunk", self._clock() - started)
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put_many([(key, "".join(chunks))])
+        self.telemetry.record("llm.call", self._clock() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters, the cache hit rate and the mean and p95 call latency in
+        seconds.
+        """
+        with self._lock:
+            result: Dict[str, Any] = dict(self._counters)
+        result["evictions"] = self.cache.evictions
+        hits = result["hits"] + result["disk_hits"]
+        result["hit_rate"] = hits / result["calls"] if result["calls"] else 0.0
+        calls = self.telemetry.stats().get("llm.call")
+        result["avg_latency"] = calls.total / calls.count if calls else 0.0
+        result["p95_latency"] = (calls.sketch.quantile(0.95) or 0.0) if calls else 0.0
+        return result
+
+    def close(self) -> None:
+        self.cache.close()
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
+
+    def _cached(self, key: str) -> Optional[str]:
+        value, from_disk = self.cache.get(key)
+        with self._lock:
+            self._count("calls")
+            if value is None:
+                self._count("misses")
+            else:
+                self._count("disk_hits" if from_disk else "hits")
+        return value
+
+    def _submit(self, key: str, message: str, params: Dict[str, Any]) -> Future:
+        """
+        Add a prompt to the open batch for ``params``.  The caller that
+        opens a batch waits up to ``batch_window`` for others to join,
+        then sends it.
+        """
+        group = json.dumps(params, sort_keys=True, default=str)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._count("coalesced")
+                return future
+            future = self._inflight[key] = Future()
+            batch = self._open.get(group)
+            leader = batch is None
+            if leader:
+                batch = self._open[group] = _Batch(params)
+            batch.keys.append(key)
+            batch.messages.append(message)
+            batch.futures.append(future)
+            if len(batch.keys) >= self.max_batch:
+                del self._open[group]
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.batch_window)
+            with self._lock:
+                if self._open.get(group) is batch:
+                    del self._open[group]
+            self._send(batch)
+        return future
+
+    def _send(self, batch: _Batch) -> None:
+        try:
+            completions = self._request(batch.messages, batch.params)
+        except BaseException as exc:
+            for future in batch.futures:
+                future.set_exception(exc)
+        else:
+            self.cache.put_many(list(zip(batch.keys, completions)))
+            for future, completion in zip(batch.futures, completions):
+                future.set_result(completion)
+        finally:
+            with self._lock:
+                for key in batch.keys:
+                    self._inflight.pop(key, None)
+
+    def _request(self, messages: List[str], params: Dict[str, Any]) -> List[str]:
+        with self._lock:
+            self._count("batches")
+            self._counters["batched_prompts"] += len(messages)
+        with self.telemetry.span("llm.backend"):
+            completions = self.backend.complete(self.system_prompt, messages, params)
+        if len(completions) != len(messages):
+            raise ValueError(
+                f"backend returned {len(completions)} completions for {len(messages)} prompts"
+            )
+        return completions
+
+    def _count(self, name: str) -> None:
+        self._counters[name] += 1
+
+
+def stored_completions(db_path: str) -> Dict[str, int]:
+    """
+    Number of completions cached in ``db_path``.  Returns an empty dict if
+    the database or table does not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    except sqlite3.OperationalError:
+        return {}
+    return {"stored_completions": count}
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            completion TEXT NOT NULL,
+            used_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_used_at ON llm_cache (used_at)")
@@ -5,12 +5,18 @@ In a production system you would likely use a combination of in‑memory
 structures, relational databases and vector stores to persist context
 between runs.  This module provides lightweight placeholders to keep
 track of the agent’s observations and decisions during a single session.
+
+Finished episodes are persisted in an append‑only JSON Lines log, one
+record per episode, so ending an episode costs a single write regardless
+of how much history exists.  Legacy ``memory.json`` files are migrated
+to the log the first time they are opened.
 """
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, fields
 from typing import Any, Dict, List, Optional
 import json
 import os
+import threading
 
 
 @dataclass
@@ -19,54 +25,274 @@ class Episode:
     timestamp: str
     offers_evaluated: int = 0
     listings_created: int = 0
+    offers_skipped: int = 0
+    offers_unchanged: int = 0
+    listings_updated: int = 0
     notes: List[str] = field(default_factory=list)
 
 
+_EPISODE_FIELDS = {f.name for f in fields(Episode)}
+
+# Bytes read per step when scanning the log backwards.
+_TAIL_BLOCK = 64 * 1024
+
+
+def _episode_from_dict(data: Dict[str, Any]) -> Episode:
+    return Episode(**{k: v for k, v in data.items() if k in _EPISODE_FIELDS})
+
+
+def _parse_lines(lines: List[bytes]) -> List[Episode]:
+    episodes = []
+    for line in lines:
+        try:
+            episodes.append(_episode_from_dict(json.loads(line)))
+        except (ValueError, TypeError):
+            # Skip records that were damaged on disk
+            continue
+    return episodes
+
+
+class EpisodeLog:
+    """
+    Append-only JSON Lines file with one finished episode per line.
+
+    Each record is written with a single ``write`` call followed by
+    ``fsync`` (unless ``fsync`` is False).  A record cut short by a crash
+    has no trailing newline; readers ignore it and the next append
+    truncates it away.
+    """
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._compactor: Optional[threading.Thread] = None
+
+    def append(self, episode: Episode) -> None:
+        """Durably append one episode."""
+        data = (json.dumps(asdict(episode)) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None:
+                self._fd = self._open_for_append()
+            os.write(self._fd, data)
+            if self.fsync:
+                os.fsync(self._fd)
+
+    def read_all(self) -> List[Episode]:
+        """Return every complete episode in the log, oldest first."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return _parse_lines(data.split(b"\n")[:-1])
+
+    def tail(self, n: int) -> List[Episode]:
+        """Return the last ``n`` complete episodes without reading the whole log."""
+        if n <= 0:
+            return []
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            chunk = b""
+            # Collect n + 1 newlines so the first line kept is complete.
+            while pos > 0 and chunk.count(b"\n") <= n:
+                step = min(_TAIL_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step) + chunk
+        lines = chunk.split(b"\n")[:-1]
+        if pos > 0:
+            lines = lines[1:]
+        return _parse_lines(lines[-n:])
+
+    def compact(self, keep_last: Optional[int] = None) -> None:
+        """
+        Rewrite the log without damaged records, keeping only the newest
+        ``keep_last`` episodes when given.  The new file is written next
+        to the log and atomically renamed over it, so a crash leaves
+        either the old or the new log intact.  Appends may continue while
+        the bulk of the copy runs; records that arrive meanwhile are
+        carried over before the rename.
+        """
+        with self._lock:
+            try:
+                snapshot_size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                return
+        with open(self.path, "rb") as f:
+            lines = f.read(snapshot_size).split(b"\n")[:-1]
+        episodes = _parse_lines(lines)
+        if keep_last is not None:
+            episodes = episodes[-keep_last:] if keep_last > 0 else []
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "wb") as out:
+            for episode in episodes:
+                out.write((json.dumps(asdict(episode)) + "\n").encode("utf-8"))
+            with self._lock:
+                with open(self.path, "rb") as f:
+                    f.seek(snapshot_size)
+                    out.write(f.read())
+                out.flush()
+                os.fsync(out.fileno())
+                os.replace(tmp_path, self.path)
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+
+    def compact_in_background(self, keep_last: Optional[int] = None) -> threading.Thread:
+        """Run `compact` on a daemon thread unless one is already running."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return self._compactor
+            self._compactor = threading.Thread(
+                target=self.compact,
+                args=(keep_last,),
+                name="episode-log-compactor",
+                daemon=True,
+            )
+            self._compactor.start()
+            return self._compactor
+
+    def close(self) -> None:
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _open_for_append(self) -> int:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(fd).st_size
+        if size:
+            # Drop a partial record left behind by an interrupted write.
+            pos = size
+            while pos > 0:
+                step = min(_TAIL_BLOCK, pos)
+                pos -= step
+                block = os.pread(fd, step, pos)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    pos += newline + 1
+                    break
+            if pos != size:
+                os.ftruncate(fd, pos)
+        return fd
+
+
 class Memory:
     """
     Simple episodic and working memory.  Maintains a list of episodes
     and a working dictionary for the current run.
+
+    Past episodes are read from the log only when `episodes` is first
+    accessed.  ``max_episodes`` bounds the history kept on disk: every
+    ``compact_every`` appends a background compaction trims the log.
     """
 
-    def __init__(self, persistence_path: Optional[str] = None) -> None:
-        self.episodes: List[Episode] = []
+    def __init__(
+        self,
+        persistence_path: Optional[str] = None,
+        max_episodes: Optional[int] = None,
+        compact_every: int = 1000,
+        fsync: bool = True,
+    ) -> None:
         self.working_memory: Dict[str, Any] = {}
         self.persistence_path = persistence_path or os.path.join(
             os.getcwd(), "memory.json"
         )
+        root, ext = os.path.splitext(self.persistence_path)
+        if ext == ".json":
+            self._legacy_path = self.persistence_path
+            log_path = root + ".jsonl"
+        else:
+            self._legacy_path = root + ".json"
+            log_path = self.persistence_path
+        self.log = EpisodeLog(log_path, fsync=fsync)
+        self.max_episodes = max_episodes
+        self.compact_every = compact_every
+        self._appends_since_compaction = 0
+        self._history: Optional[List[Episode]] = None
+        # Episodes started in this process that are not yet in the log.
+        self._unsaved: List[Episode] = []
         self._load()
 
     def _load(self) -> None:
-        """Load persisted episodes from disk if available."""
-        if os.path.exists(self.persistence_path):
-            try:
-                with open(self.persistence_path, "r") as f:
-                    data = json.load(f)
-                for ep_dict in data.get("episodes", []):
-                    self.episodes.append(Episode(**ep_dict))
-            except (IOError, json.JSONDecodeError):
-                # If the file is corrupt or unreadable, start fresh
-                self.episodes = []
-
-    def _save(self) -> None:
-        """Persist episodes to disk."""
-        data = {"episodes": [ep.__dict__ for ep in self.episodes]}
+        """Migrate a legacy ``memory.json`` into the episode log if needed."""
+        if os.path.exists(self.log.path) or not os.path.exists(self._legacy_path):
+            return
+        try:
+            with open(self._legacy_path, "r") as f:
+                data = json.load(f)
+            episodes = [_episode_from_dict(d) for d in data.get("episodes", [])]
+        except (IOError, json.JSONDecodeError, TypeError):
+            # If the file is corrupt or unreadable, start fresh
+            return
+        tmp_path = self.log.path + ".migrate"
+        with open(tmp_path, "w") as f:
+            for episode in episodes:
+                f.write(json.dumps(asdict(episode)) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log.path)
+        os.replace(self._legacy_path, self._legacy_path + ".migrated")
+
+    @property
+    def episodes(self) -> List[Episode]:
+        """All episodes: persisted history followed by this session's runs."""
+        if self._history is None:
+            self._history = self.log.read_all()
+            self._history.extend(self._unsaved)
+        return self._history
+
+    def recent_episodes(self, n: int) -> List[Episode]:
+        """The last ``n`` episodes, read from the tail of the log if needed."""
+        if self._history is not None:
+            return self._history[-n:] if n > 0 else []
+        unsaved = self._unsaved
+        if len(unsaved) >= n:
+            return unsaved[-n:] if n > 0 else []
+        return self.log.tail(n - len(unsaved)) + unsaved
+
+    def _save(self, episode: Episode) -> None:
+        """Append a finished episode to the log."""
         try:
-            with open(self.persistence_path, "w") as f:
-                json.dump(data, f)
-        except IOError:
-            pass
+            self.log.append(episode)
+        except OSError:
+            return
+        # Forget saved episodes so a long-running process does not grow.
+        self._unsaved = [ep for ep in self._unsaved if ep is not episode]
+        self._appends_since_compaction += 1
+        if (
+            self.max_episodes is not None
+            and self._appends_since_compaction >= self.compact_every
+        ):
+            self._appends_since_compaction = 0
+            self.log.compact_in_background(self.max_episodes)
 
     def start_episode(self, timestamp: str) -> Episode:
         """Begin a new episode with the given timestamp."""
         episode = Episode(timestamp=timestamp)
-        self.episodes.append(episode)
+        self._unsaved.append(episode)
+        if self._history is not None:
+            self._history.append(episode)
         return episode
 
     def end_episode(self, episode: Episode) -> None:
         """Finalize an episode and persist it to disk."""
         # In a more advanced system you might compute metrics here
-        self._save()
+        self._save(episode)
+
+    def close(self) -> None:
+        """Wait for background compaction and release the log file."""
+        self.log.close()
 
     def remember(self, key: str, value: Any) -> None:
         """Store arbitrary data in working memory."""
@@ -0,0 +1,111 @@
+"""
+Money handling for the shopping agent.
+
+Amounts are carried as integer euro cents (`Cents`) so margins and
+comparisons are exact.  `parse_cents` turns the price strings returned by
+the tools ("€25.00", "1.299,00 €", "EUR 25", "1,299.99") into cents in a
+single scan and memoises the result, since the same price strings recur
+across items and runs.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import NewType, Optional, Union
+
+Cents = NewType("Cents", int)
+
+_CURRENCY_WORDS = ("EUR", "eur", "Eur")
+
+# The shape produced by `format_eur` and most APIs, parsed without a scan.
+_CANONICAL = re.compile(r"€?(\d+)[.,](\d\d)")
+
+# Characters treated as thousands grouping when they never act as the
+# decimal separator: spaces (incl. narrow/no-break) and apostrophes.
+_GROUPING = frozenset("   '’")
+
+
+@lru_cache(maxsize=65536)
+def parse_cents(text: str) -> Optional[Cents]:
+    """
+    Parse a price string into cents, or return None if it holds no
+    amount.  Currency symbols and words are ignored.  When both ``.`` and
+    ``,`` occur, the last one is the decimal separator; a single separator
+    followed by exactly three digits is read as thousands grouping
+    ("1.299" is 1299 euros); otherwise it is the decimal separator.
+    Fractions beyond cents are rounded half up.
+    """
+    match = _CANONICAL.fullmatch(text)
+    if match is not None:
+        return Cents(int(match.group(1)) * 100 + int(match.group(2)))
+    for word in _CURRENCY_WORDS:
+        if word in text:
+            text = text.replace(word, "")
+    digits = []
+    separators = []  # (position in digits, char)
+    negative = False
+    for ch in text:
+        if "0" <= ch <= "9":
+            digits.append(ch)
+        elif ch == "." or ch == ",":
+            separators.append((len(digits), ch))
+        elif ch == "-":
+            # A leading minus is a sign; a trailing one is "25,-" notation.
+            negative = negative or not digits
+        elif ch in _GROUPING or ch == "€" or ch == "+":
+            continue
+        else:
+            return None
+    if not digits:
+        return None
+    # Ignore separators that are not between digits ("25.-", ".5" stays).
+    separators = [(pos, ch) for pos, ch in separators if pos < len(digits)]
+    decimal_at = None
+    if separators:
+        last_pos, last_ch = separators[-1]
+        kinds = {ch for _, ch in separators}
+        if len(kinds) == 2:
+            decimal_at = last_pos
+        elif len(separators) == 1 and len(digits) - last_pos != 3:
+            decimal_at = last_pos
+    if decimal_at is None:
+        whole, fraction = "".join(digits), ""
+    else:
+        whole, fraction = "".join(digits[:decimal_at]), "".join(digits[decimal_at:])
+    cents = int(whole or "0") * 100
+    if fraction:
+        padded = (fraction + "00")[:2]
+        cents += int(padded)
+        if len(fraction) > 2 and fraction[2] >= "5":
+            cents += 1
+    return Cents(-cents if negative else cents)
+
+
+def to_cents(value: Union[str, int, float, None]) -> Optional[Cents]:
+    """
+    Convert a price in any of the representations used by the tools to
+    cents: strings are parsed, ints and floats are taken as euros.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return parse_cents(value)
+    return Cents(round(value * 100))
+
+
+def format_eur(cents: int) -> str:
+    """Format cents as a euro string like "€25.00"."""
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}€{whole}.{frac:02d}"
+
+
+def basis_points(fraction: float) -> int:
+    """Express a fraction such as a 0.15 margin in basis points (1500)."""
+    return round(fraction * 10_000)
+
+
+def scale(cents: int, bps: int) -> Cents:
+    """Multiply ``cents`` by ``bps`` / 10,000, rounding half up."""
+    return Cents((cents * bps + 5_000) // 10_000)
@@ -0,0 +1,378 @@
+"""
+Asynchronous notifications for the shopping agent.
+
+Run reports are not mailed from inside `Orchestrator.run` any more when a
+`Notifier` is configured: they are appended to a persistent ``outbox``
+table and delivered by a background sender thread, so a run never waits
+for the mail server and undelivered reports survive restarts.
+
+With a ``digest_window`` the sender holds a recipient's reports until
+the oldest one has waited that long and then merges all of them into a
+single digest message, so frequent runs produce one email per window.
+A failed delivery is retried with exponential backoff (``next_attempt_at``)
+rather than on every pass.
+Delivery goes through a transport: `SMTPTransport` keeps one SMTP
+connection open across messages, `ConsoleTransport` hands messages to
+the `tools.email` stub.
+"""
+
+from __future__ import annotations
+
+import datetime
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import database
+from .eval import QuantileSketch
+
+
+# Delivery attempts before a notification is left in the outbox as dead.
+MAX_ATTEMPTS = 5
+
+# A failed notification is retried after RETRY_DELAY seconds, doubling
+# with every further failure up to RETRY_MAX_DELAY.
+RETRY_DELAY = 30.0
+RETRY_MAX_DELAY = 3600.0
+
+# Notifications read from the outbox per sender pass.
+SEND_BATCH = 500
+
+# Quantiles of the deal-to-notification latency that are reported.
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class ConsoleTransport:
+    """Deliver through the `tools.email` stub (prints to the console)."""
+
+    def send(self, recipients: List[str], subject: str, body: str) -> None:
+        # Looked up at call time so the tool can be swapped out.
+        from .tools import email
+
+        email.send_email(subject, body, recipients=recipients)
+
+    def close(self) -> None:
+        pass
+
+
+class SMTPTransport:
+    """
+    Send through an SMTP server, reusing one connection for consecutive
+    messages.  The connection is reopened when the server drops it or
+    after ``max_idle`` seconds without traffic.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        sender: str = "shopping-agent@localhost",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 10.0,
+        max_idle: float = 60.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.connections_opened = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def send(self, recipients: List[str], subject: str, body: str) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = ", ".join(recipients)
+        message["Subject"] = subject
+        message.set_content(body)
+        for attempt in range(2):
+            smtp = self._connection()
+            try:
+                smtp.send_message(message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # A pooled connection the server has closed: reconnect once.
+                self._discard()
+                if attempt:
+                    raise
+            else:
+                self._last_used = time.monotonic()
+                return
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.max_idle:
+            self.close()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            self._smtp = smtp
+            self._last_used = time.monotonic()
+            self.connections_opened += 1
+        return self._smtp
+
+    def _discard(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except OSError:
+                pass
+            self._smtp = None
+
+
+class Notifier:
+    """
+    Persistent outbound queue plus background sender.
+
+    `enqueue` stores a report and returns immediately; `start` launches
+    the sender thread, which wakes on every enqueue (and every
+    ``poll_interval`` seconds for pending digests).  `send_due` performs
+    one sender pass synchronously.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        transport: Any = None,
+        digest_window: float = 0.0,
+        poll_interval: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.transport = transport or ConsoleTransport()
+        self.digest_window = digest_window
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._db = database.get_manager(db_path)
+        with self._db.transaction() as conn:
+            _create_tables(conn)
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.messages_sent = 0
+        self.notifications_sent = 0
+        self.failures = 0
+        # Wall-clock span from the first send pass to the last delivery.
+        self._first_pass: Optional[float] = None
+        self._last_sent: Optional[float] = None
+        self.latency = QuantileSketch()
+
+    def enqueue(
+        self,
+        subject: str,
+        body: str,
+        recipients: Sequence[str],
+        deals: int = 0,
+        found_at: Optional[float] = None,
+    ) -> None:
+        """
+        Queue a report for each recipient.  ``found_at`` is when the first
+        deal it mentions was found; latency is measured from there.
+        """
+        now = self._clock()
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO outbox (recipient, subject, body, deals, created_at, found_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(r, subject, body, deals, now, found_at or now) for r in recipients],
+            )
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the background sender thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="notifier", daemon=True)
+            self._thread.start()
+
+    def stop(self, force: bool = False) -> None:
+        """
+        Stop the sender after a final pass.  Digests that are not due yet
+        stay in the outbox for the next process unless ``force`` is set.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.send_due(force=force)
+        self.transport.close()
+
+    def send_due(self, force: bool = False) -> int:
+        """Deliver every due notification; returns the messages sent."""
+        with self._send_lock:
+            now = self._clock()
+            pending = self._pending(now)
+            if pending and self._first_pass is None:
+                self._first_pass = time.perf_counter()
+            by_recipient: Dict[str, List[Tuple]] = {}
+            for row in pending:
+                by_recipient.setdefault(row[1], []).append(row)
+            sent = 0
+            for recipient, rows in by_recipient.items():
+                if self.digest_window > 0:
+                    if not force and rows[0][5] + self.digest_window > now:
+                        continue
+                    batches = [rows]
+                else:
+                    batches = [[row] for row in rows]
+                for batch in batches:
+                    sent += self._deliver(recipient, batch)
+            return sent
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, send throughput and deal-to-notification latency of this process."""
+        elapsed = (
+            self._last_sent - self._first_pass if self._last_sent is not None else 0.0
+        )
+        result: Dict[str, Any] = {
+            "messages_sent": self.messages_sent,
+            "notifications_sent": self.notifications_sent,
+            "failures": self.failures,
+            "messages_per_sec": self.messages_sent / elapsed if elapsed > 0 else 0.0,
+        }
+        for q in LATENCY_QUANTILES:
+            result[f"latency_p{round(q * 100)}_sec"] = self.latency.quantile(q)
+        return result
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.send_due()
+            except sqlite3.Error:
+                # Keep the sender alive; the rows stay queued.
+                continue
+
+    def _pending(self, now: float) -> List[Tuple]:
+        with self._db.connection() as conn:
+            return conn.execute(
+                "SELECT id, recipient, subject, body, deals, created_at, found_at FROM outbox"
+                " WHERE sent_at IS NULL AND attempts < ? AND next_attempt_at <= ?"
+                " ORDER BY id LIMIT ?",
+                (MAX_ATTEMPTS, now, SEND_BATCH),
+            ).fetchall()
+
+    def _deliver(self, recipient: str, rows: List[Tuple]) -> int:
+        if len(rows) == 1:
+            subject, body = rows[0][2], rows[0][3]
+        else:
+            subject, body = _digest(rows)
+        ids = [(row[0],) for row in rows]
+        try:
+            self.transport.send([recipient], subject, body)
+        except Exception as exc:
+            self.failures += 1
+            now = self._clock()
+            with self._db.transaction() as conn:
+                conn.executemany(
+                    "UPDATE outbox SET attempts = attempts + 1, last_error = ?,"
+                    " next_attempt_at = ? + MIN(?, ? * (1 << attempts)) WHERE id = ?",
+                    [
+                        (repr(exc), now, RETRY_MAX_DELAY, RETRY_DELAY, row_id)
+                        for (row_id,) in ids
+                    ],
+                )
+            return 0
+        self._last_sent = time.perf_counter()
+        now = self._clock()
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "UPDATE outbox SET sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, row_id) for (row_id,) in ids],
+            )
+        self.messages_sent += 1
+        self.notifications_sent += len(rows)
+        for row in rows:
+            self.latency.add(now - row[6])
+        return 1
+
+
+def _digest(rows: List[Tuple]) -> Tuple[str, str]:
+    deals = sum(row[4] for row in rows)
+    subject = f"Shopping Agent digest: {deals} deals from {len(rows)} runs"
+    sections = []
+    for row in rows:
+        stamp = datetime.datetime.fromtimestamp(row[5]).isoformat(timespec="seconds")
+        sections.append(f"=== {row[2]} ({stamp}) ===\n{row[3]}")
+    return subject, "\n\n".join(sections)
+
+
+def outbox_stats(db_path: str) -> Dict[str, Any]:
+    """
+    Queue depth and delivery latency read from the outbox in ``db_path``.
+    Returns an empty dict if the database or table does not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            pending, sent, dead = conn.execute(
+                "SELECT"
+                " SUM(sent_at IS NULL AND attempts < ?),"
+                " SUM(sent_at IS NOT NULL),"
+                " SUM(sent_at IS NULL AND attempts >= ?)"
+                " FROM outbox",
+                (MAX_ATTEMPTS, MAX_ATTEMPTS),
+            ).fetchone()
+            latencies = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT sent_at - found_at FROM outbox WHERE sent_at IS NOT NULL"
+                    " ORDER BY id DESC LIMIT 10000"
+                )
+            ]
+    except sqlite3.OperationalError:
+        return {}
+    stats: Dict[str, Any] = {"pending": pending or 0, "sent": sent or 0, "dead": dead or 0}
+    latencies.sort()
+    for q in LATENCY_QUANTILES:
+        key = f"latency_p{round(q * 100)}_sec"
+        stats[key] = round(latencies[int(q * (len(latencies) - 1))], 3) if latencies else None
+    return stats
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            deals INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            found_at REAL NOT NULL,
+            sent_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT
+        )
+        """
+    )
+    database._add_missing_columns(
+        conn.cursor(), "outbox", {"next_attempt_at": "REAL NOT NULL DEFAULT 0"}
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (sent_at, id)")
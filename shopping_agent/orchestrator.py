@@ -8,26 +8,249 @@ eBay listings and send a summary email.
 from __future__ import annotations
 
 import datetime
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dataclasses import dataclass
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple
 
-from . import memory
-from .tools import amazon_api, idealo_api, ebay_api, email
+from . import database, memory
+from .cache import PriceCache
+from .deal_log import DealRow
+from .evaluator import BatchEvaluator
+from .listings import ActiveListing
+from .money import Cents, format_eur, parse_cents, to_cents
+from .pipeline import Pipeline, Stage
+from .telemetry import Telemetry
+from .vector_memory import Decision
 
+if TYPE_CHECKING:
+    from .catalog import ProductIndex
+    from .deal_log import DealLog
+    from .listings import ListingIndex
+    from .notify import Notifier
+    from .price_history import PriceHistory, Trend
+    from .vector_memory import DecisionMemory
+from .tools import amazon_api, client, idealo_api, ebay_api, email
 
-@dataclass
+
+# Upper bound on the number of unprofitable items named in the report.
+MAX_REPORTED_SKIPS = 20
+
+# Upper bound on the number of deals spelled out in the report; the rest
+# are only counted so a run's memory does not grow with the catalog.
+MAX_REPORTED_DEALS = 100
+
+# Upper bound on the number of failure notes kept on an episode.
+MAX_EPISODE_NOTES = 100
+
+# Timed-out Idealo lookups that may still hold a thread.  Once this many
+# are stuck, items are skipped instead of starting further lookups.
+MAX_ABANDONED_LOOKUPS = 16
+
+# Priced items handed to the batch evaluator at once.
+DECIDE_BATCH_SIZE = 256
+
+# Outcomes produced by the decide stage.
+SKIPPED = "skipped"
+UNPROFITABLE = "unprofitable"
+LISTED = "listed"
+UNCHANGED = "unchanged"
+# Outcomes of the batched list stage for items that already have a listing.
+REPRICED = "repriced"
+ACTIVE = "active"
+
+# Fingerprints written to the database at once.
+FINGERPRINT_FLUSH_SIZE = 500
+
+# Fetched names resolved against the product catalog at once.
+CATALOG_BATCH_SIZE = 256
+
+# Competitor prices written to the price history at once.
+HISTORY_FLUSH_SIZE = 500
+
+# Evaluated offers written to the deal log at once.
+DEAL_LOG_FLUSH_SIZE = 4096
+
+# Past decisions less similar than this are not reported as precedents.
+RECALL_MIN_SIMILARITY = 0.5
+
+
+@dataclass(slots=True)
 class Deal:
+    """A profitable item; prices are held in cents and formatted on demand."""
     item_name: str
-    purchase_price: str
-    competitor_price: str
-    resale_price: str
+    purchase_cents: Cents
+    competitor_cents: Cents
+    resale_cents: Cents
     listing_id: str | None = None
+    # Similar past decisions and how many of them were listed.
+    similar: int = 0
+    similar_listed: int = 0
+    # Competitor price trend from the price history, if there is one.
+    trend: Trend | None = None
+
+    @property
+    def purchase_price(self) -> str:
+        return format_eur(self.purchase_cents)
+
+    @property
+    def competitor_price(self) -> str:
+        return format_eur(self.competitor_cents)
+
+    @property
+    def resale_price(self) -> str:
+        return format_eur(self.resale_cents)
+
+
+@dataclass(slots=True)
+class Item:
+    """An Amazon item as it moves through the pipeline stages."""
+    name: str
+    purchase_cents: Cents | None
+    category: str | None = None
+    key: str = ""
+    fingerprint: database.Fingerprint | None = None
+    competitor_cents: Cents | None = None
+    price_reused: bool = False
+    # Resale price the evaluator targeted, listed or not.
+    target_cents: Cents | None = None
+    status: str = ""
+    deal: Deal | None = None
+    note: str | None = None
+
+
+# Item status -> decision stored in the deal log.
+_LOGGED = {
+    LISTED: "listed",
+    UNPROFITABLE: "unprofitable",
+    REPRICED: "repriced",
+    ACTIVE: "active",
+}
 
 
 class Orchestrator:
-    def __init__(self, mem: memory.Memory, profit_margin: float = 0.15) -> None:
+    def __init__(
+        self,
+        mem: memory.Memory,
+        profit_margin: float = 0.15,
+        max_concurrency: int = 1,
+        lookup_timeout: float | None = None,
+        price_cache: PriceCache | None = None,
+        stage_concurrency: Dict[str, int] | None = None,
+        queue_size: int = 256,
+        category_margins: Dict[str, float] | None = None,
+        fee_rate: float = 0.0,
+        shipping_cost: int = 0,
+        change_detection: bool = False,
+        price_ttl: float = 3600.0,
+        telemetry: Telemetry | None = None,
+        account: str | None = None,
+        notifier: Notifier | None = None,
+        catalog: ProductIndex | None = None,
+        decisions: DecisionMemory | None = None,
+        recall_k: int = 5,
+        history: PriceHistory | None = None,
+        listings: ListingIndex | None = None,
+        deal_log: DealLog | None = None,
+    ) -> None:
+        """
+        ``max_concurrency`` bounds the number of Idealo lookups in flight
+        at once; with the default of 1 items are priced one after the
+        other.  ``lookup_timeout`` is the number of seconds a single
+        lookup may take before its item is skipped.  When ``price_cache``
+        is given, repeated products are priced from the cache.
+
+        A run streams items through the stages fetch → price → decide →
+        list → notify.  ``stage_concurrency`` maps stage names ("price",
+        "decide", "list") to worker counts, overriding ``max_concurrency``
+        for "price"; ``queue_size`` bounds the items buffered between
+        stages.
+
+        Profitability is decided in batches by a `BatchEvaluator`;
+        ``category_margins`` overrides ``profit_margin`` per item category
+        and ``fee_rate``/``shipping_cost`` (in cents) are deducted from the
+        resale price before it is compared with the purchase price.
+
+        With ``change_detection`` the last inputs and decision for every
+        product are kept in the database.  An item whose purchase price is
+        unchanged and whose stored competitor price is younger than
+        ``price_ttl`` seconds is not priced again; an item whose inputs
+        are unchanged keeps its previous decision and is not relisted.
+
+        Every run records timing spans in ``telemetry`` (reset at the start
+        of the run): "run" for the whole run, "stage.<name>" per stage
+        call (per batch for batched stages) and "tool.<service>.<call>"
+        per tool call.
+
+        ``account`` selects the Amazon account whose orders, cart and
+        wishlist are fetched; by default the tools' default account.
+
+        With a ``notifier`` the run report is queued for asynchronous
+        delivery instead of being emailed before `run` returns.
+
+        With a ``catalog`` every fetched name is resolved to a canonical
+        product ID first.  Price lookups, the price cache and change
+        detection key on that ID.  Every purchase is priced and decided
+        on its own; the price lookup is made once per product and run.
+
+        With ``decisions`` every decided item is stored in that similarity
+        memory (one record per product, replaced on each run), and each
+        deal is reported with how many of its ``recall_k`` most similar
+        other products were listed.
+
+        With a ``history`` every freshly looked-up competitor price is
+        stored in that price history, and deals are reported with the
+        product's 7-day competitor low and average (one query per
+        decided batch).
+
+        With ``listings`` deals are listed in bulk, up to
+        `ebay_api.BULK_LIMIT` per call, against that index of active
+        listings: a product without a listing gets one (its key is the
+        SKU, so eBay never creates a second), a listed product whose
+        resale price changed is repriced, and one whose price is unchanged
+        costs no call.
+
+        With a ``deal_log`` every evaluated offer (listed, unprofitable,
+        repriced or still active) is appended to that columnar log with
+        its prices and decision.
+        """
         self.mem = mem
         self.profit_margin = profit_margin
+        self.max_concurrency = max(1, max_concurrency)
+        self.lookup_timeout = lookup_timeout
+        self.price_cache = price_cache
+        self.stage_concurrency = {"price": self.max_concurrency, "decide": 1, "list": 1}
+        self.stage_concurrency.update(stage_concurrency or {})
+        self.queue_size = queue_size
+        self.evaluator = BatchEvaluator(
+            profit_margin,
+            category_margins=category_margins,
+            fee_rate=fee_rate,
+            shipping_cost=shipping_cost,
+        )
+        self.change_detection = change_detection
+        self.price_ttl = price_ttl
+        self.telemetry = telemetry or Telemetry()
+        self.account = account
+        self.notifier = notifier
+        self.catalog = catalog
+        self.decisions = decisions
+        self.recall_k = recall_k
+        self.history = history
+        self.listings = listings
+        self.deal_log = deal_log
+        self._lookup_pool: ThreadPoolExecutor | None = None
+        self._lookup_slots: threading.Semaphore | None = None
+        if lookup_timeout is not None:
+            # Kept across runs, so hung calls stay counted against the cap.
+            slots = self.stage_concurrency["price"] + MAX_ABANDONED_LOOKUPS
+            self._lookup_pool = ThreadPoolExecutor(slots, thread_name_prefix="idealo-lookup")
+            self._lookup_slots = threading.Semaphore(slots)
+        # The price lookup of each product in the current run, shared by
+        # every purchase of it.
+        self._run_lock = threading.Lock()
+        self._run_lookups: Dict[str, Future] = {}
 
     def run(self) -> None:
         """
@@ -35,78 +258,594 @@ class Orchestrator:
         not return anything; it performs side effects such as creating
         listings and sending emails.
         """
+        run_started = time.perf_counter()
+        self.telemetry.reset()
+        with self._run_lock:
+            self._run_lookups = {}
+        timed = self.telemetry.timed
         timestamp = datetime.datetime.now().isoformat()
         episode = self.mem.start_episode(timestamp)
         self.mem.reset_working_memory()
+        counts = {"fetched": 0, "merged": 0}
 
+        stages = []
+        if self.change_detection:
+            database.initialize_db()
+            stages.append(
+                Stage(
+                    "check",
+                    timed("stage.check", self._check),
+                    batch_size=database.LOOKUP_CHUNK,
+                )
+            )
+        stages += [
+            # Step 2: get competitor prices, possibly several at a time
+            Stage("price", timed("stage.price", self._price), self.stage_concurrency["price"]),
+            # Step 3: decide whether to list (if profit is positive)
+            Stage(
+                "decide",
+                timed("stage.decide", self._decide),
+                self.stage_concurrency["decide"],
+                batch_size=DECIDE_BATCH_SIZE,
+            ),
+        ]
+        if self.listings is None:
+            stages.append(
+                Stage("list", timed("stage.list", self._list), self.stage_concurrency["list"])
+            )
+        else:
+            stages.append(
+                Stage(
+                    "list",
+                    timed("stage.list", self._list_batch),
+                    self.stage_concurrency["list"],
+                    batch_size=ebay_api.BULK_LIMIT,
+                )
+            )
         # Step 1: gather items from Amazon
-        orders = amazon_api.get_recent_orders()
-        cart = amazon_api.get_cart_items()
-        wishlist = amazon_api.get_wishlist_items()
-        all_items = []
-        for collection in (orders, cart, wishlist):
-            for item in collection:
-                all_items.append(item)
-
-        self.mem.remember("items_fetched", len(all_items))
-
+        pipeline = Pipeline(self._fetch(counts), stages, queue_size=self.queue_size)
         deals: List[Deal] = []
-        for item in all_items:
-            name = item["item"]
-            purchase_price = item["price"]
-            # Step 2: get competitor price
-            comp = idealo_api.get_lowest_price(name)
-            competitor_price = comp["price"]
-            # Compute resale price: competitor price plus margin
-            purchase_value = _parse_eur(purchase_price)
-            competitor_value = _parse_eur(competitor_price)
-            if purchase_value is None or competitor_value is None:
-                continue
-            target_price = competitor_value * (1 + self.profit_margin)
-            resale_price_str = f"€{target_price:.2f}"
-            # Step 3: decide whether to list (if profit is positive)
-            if target_price > purchase_value:
-                listing = ebay_api.create_listing(name, purchase_price, resale_price_str)
-                deals.append(
-                    Deal(
-                        item_name=name,
-                        purchase_price=purchase_price,
-                        competitor_price=competitor_price,
-                        resale_price=resale_price_str,
-                        listing_id=listing["listing_id"],
+        skipped: List[str] = []
+        unreported = 0
+        first_deal_at: float | None = None
+        fingerprints: List[database.Fingerprint] = []
+        prices: List[Tuple[str, Cents, None]] = []
+        offers: List[DealRow] = []
+        for item in pipeline:
+            if self.deal_log is not None and item.status in _LOGGED:
+                offers.append(
+                    DealRow(
+                        time.time(),
+                        item.key,
+                        item.purchase_cents,
+                        item.competitor_cents,
+                        item.target_cents,
+                        _LOGGED[item.status],
                     )
                 )
+                if len(offers) >= DEAL_LOG_FLUSH_SIZE:
+                    self.deal_log.append_many(offers)
+                    offers = []
+            if (
+                self.history is not None
+                and item.competitor_cents is not None
+                and not item.price_reused
+            ):
+                prices.append((item.key, item.competitor_cents, None))
+                if len(prices) >= HISTORY_FLUSH_SIZE:
+                    self.history.record_many(prices)
+                    prices = []
+            if self.change_detection:
+                fingerprint = self._fingerprint(item)
+                if fingerprint is not None:
+                    fingerprints.append(fingerprint)
+                    if len(fingerprints) >= FINGERPRINT_FLUSH_SIZE:
+                        database.upsert_fingerprints(fingerprints)
+                        fingerprints = []
+            if item.status == SKIPPED:
+                episode.offers_skipped += 1
+                if item.note and len(episode.notes) < MAX_EPISODE_NOTES:
+                    episode.notes.append(item.note)
+                continue
+            if item.status in (UNCHANGED, ACTIVE):
+                episode.offers_unchanged += 1
+                continue
+            if item.status == REPRICED:
+                episode.listings_updated += 1
+                episode.offers_evaluated += 1
+                continue
+            if item.status == LISTED:
+                if first_deal_at is None:
+                    first_deal_at = time.time()
                 episode.listings_created += 1
+                if len(deals) < MAX_REPORTED_DEALS:
+                    deals.append(item.deal)
+                else:
+                    unreported += 1
+            elif len(skipped) < MAX_REPORTED_SKIPS:
+                skipped.append(item.note)
             episode.offers_evaluated += 1
+        if fingerprints:
+            database.upsert_fingerprints(fingerprints)
+        if prices:
+            self.history.record_many(prices)
+        if offers:
+            self.deal_log.append_many(offers)
+        self.mem.remember("items_fetched", counts["fetched"])
+        if self.catalog is not None:
+            self.mem.remember("duplicates_merged", counts["merged"])
 
         # Step 4: notify user
-        self._notify_user(deals)
+        with self.telemetry.span("stage.notify"):
+            self._notify_user(
+                deals,
+                skipped,
+                unreported,
+                episode.offers_unchanged,
+                first_deal_at,
+                episode.listings_updated,
+            )
         # Step 5: finalize episode
         self.mem.end_episode(episode)
+        self.telemetry.record("run", time.perf_counter() - run_started)
+
+    def _fetch(self, counts: Dict[str, int]) -> Iterator[Item]:
+        """
+        Yield normalised orders, cart and wishlist items one at a time.
+        With a catalog, items resolving to a product fetched before are
+        counted as merged: they share its price lookup, but each is still
+        evaluated at its own purchase price.
+        """
+        kwargs = {} if self.account is None else {"account": self.account}
+        seen: set = set()
+        for call in ("get_recent_orders", "get_cart_items", "get_wishlist_items"):
+            raws = self._tool("amazon", call, getattr(amazon_api, call), **kwargs)
+            if self.catalog is None:
+                for raw in raws:
+                    counts["fetched"] += 1
+                    item = _normalize_item(raw)
+                    item.key = PriceCache.key_for(item.name)
+                    yield item
+                continue
+            for batch in _batched(map(_normalize_item, raws), CATALOG_BATCH_SIZE):
+                counts["fetched"] += len(batch)
+                ids = self.catalog.resolve_many([item.name for item in batch])
+                for item, product_id in zip(batch, ids):
+                    item.key = f"product:{product_id}"
+                    if item.key in seen:
+                        counts["merged"] += 1
+                    seen.add(item.key)
+                    yield item
+
+    def _check(self, batch: List[Item]) -> List[Item]:
+        """Attach stored fingerprints to a batch with one indexed query."""
+        stored = database.fetch_fingerprints(item.key for item in batch)
+        for item in batch:
+            item.fingerprint = stored.get(item.key)
+        return batch
+
+    def _price(self, item: Item) -> Item:
+        if item.purchase_cents is None:
+            # Wishlist items have no purchase price: nothing to resell.
+            item.status = SKIPPED
+            item.note = f"no purchase price for {item.name}"
+            return item
+        fingerprint = item.fingerprint
+        if (
+            fingerprint is not None
+            and fingerprint.purchase_cents == item.purchase_cents
+            and time.time() - fingerprint.priced_at < self.price_ttl
+        ):
+            item.competitor_cents = fingerprint.competitor_cents
+            item.price_reused = True
+            return item
+        comp = self._shared_lookup(item.name, item.key)
+        if comp is None:
+            item.status = SKIPPED
+            item.note = f"price lookup failed for {item.name}"
+            return item
+        item.competitor_cents = parse_cents(comp["price"])
+        if item.competitor_cents is None:
+            item.status = SKIPPED
+            item.note = f"unreadable competitor price for {item.name}"
+        return item
+
+    def _shared_lookup(self, name: str, key: str) -> Dict[str, str] | None:
+        """`_timed_lookup` once per product and run; later callers get its result."""
+        with self._run_lock:
+            future = self._run_lookups.get(key)
+            first = future is None
+            if first:
+                future = self._run_lookups[key] = Future()
+        if not first:
+            return future.result()
+        result = None
+        try:
+            result = self._timed_lookup(name, key)
+        finally:
+            future.set_result(result)
+        return result
+
+    def _timed_lookup(self, name: str, key: str) -> Dict[str, str] | None:
+        if self._lookup_pool is None:
+            return self._safe_lookup(name, key)
+        # A lookup holds a slot until its call returns, and the pool has a
+        # thread per slot, so the call starts at once and the deadline
+        # counts from its start.  The slots beyond the price workers are
+        # for abandoned calls; with all of them stuck, skip the item.
+        if not self._lookup_slots.acquire(blocking=False):
+            return None
+        deadline = time.monotonic() + self.lookup_timeout
+        future = self._lookup_pool.submit(self._safe_lookup, name, key, deadline)
+        future.add_done_callback(lambda _: self._lookup_slots.release())
+        try:
+            return future.result(timeout=self.lookup_timeout)
+        except FutureTimeout:
+            return None
+
+    def _decide(self, batch: List[Item]) -> List[Item]:
+        """Decide a batch of priced items, evaluating prices column-wise."""
+        pending = []
+        for item in batch:
+            if item.status:
+                continue
+            fingerprint = item.fingerprint
+            if (
+                fingerprint is not None
+                and fingerprint.purchase_cents == item.purchase_cents
+                and fingerprint.competitor_cents == item.competitor_cents
+            ):
+                item.status = UNCHANGED
+                continue
+            pending.append(item)
+
+        result = self.evaluator.evaluate(
+            [item.purchase_cents for item in pending],
+            [item.competitor_cents for item in pending],
+            [item.category for item in pending],
+        )
+        for item, target_cents, listed in zip(pending, result.target_prices, result.mask):
+            item.target_cents = int(target_cents)
+            if listed:
+                item.status = LISTED
+                item.deal = Deal(item.name, item.purchase_cents, item.competitor_cents, target_cents)
+            else:
+                item.status = UNPROFITABLE
+                item.note = (
+                    f"{item.name}: bought for {format_eur(item.purchase_cents)}, "
+                    f"competitor price {format_eur(item.competitor_cents)}"
+                )
+        if self.history is not None:
+            listed = [item for item in pending if item.deal is not None]
+            if listed:
+                with self.telemetry.span("history.trends"):
+                    trends = self.history.trends(item.key for item in listed)
+                for item in listed:
+                    item.deal.trend = trends.get(item.key)
+        if self.decisions is not None and pending:
+            with self.telemetry.span("decisions.recall"):
+                self._recall(pending, result.margins)
+        return batch
 
-    def _notify_user(self, deals: List[Deal]) -> None:
+    def _recall(self, decided: List[Item], margins: Iterable[Cents]) -> None:
+        """Attach similar past decisions to new deals, then remember these."""
+        dealt = [item for item in decided if item.deal is not None]
+        if dealt and self.recall_k > 0:
+            # The product's own earlier decision is held once (upserted
+            # by key) and is not a precedent for itself.
+            found = self.decisions.nearest_many(
+                [item.deal.item_name for item in dealt], self.recall_k + 1
+            )
+            for item, neighbours in zip(dealt, found):
+                deal = item.deal
+                similar = [
+                    d for score, d in neighbours
+                    if score >= RECALL_MIN_SIMILARITY and d.key != item.key
+                ][:self.recall_k]
+                deal.similar = len(similar)
+                deal.similar_listed = sum(d.listed for d in similar)
+        timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+        self.decisions.add_many([
+            Decision(
+                item.name,
+                item.key,
+                item.status == LISTED,
+                item.purchase_cents,
+                item.competitor_cents,
+                int(margin),
+                timestamp,
+            )
+            for item, margin in zip(decided, margins)
+        ])
+
+    def _list(self, item: Item) -> Item:
+        if item.status == LISTED:
+            deal = item.deal
+            listing = self._tool(
+                "ebay",
+                "create_listing",
+                ebay_api.create_listing,
+                deal.item_name,
+                deal.purchase_price,
+                deal.resale_price,
+                # No idempotency key: a retried timeout could list twice.
+                idempotent=False,
+            )
+            deal.listing_id = listing["listing_id"]
+        return item
+
+    def _list_batch(self, batch: List[Item]) -> List[Item]:
+        """
+        Reconcile a batch of deals with the active listings: one bulk
+        price update for changed ones and one bulk create for new
+        products, and for those whose listing turned out to have ended.
+        A create that finds the SKU already listed on eBay adopts that
+        listing and reprices it if eBay's price differs.
+        """
+        deals = [item for item in batch if item.status == LISTED]
+        if not deals:
+            return batch
+        active = self.listings.fetch(item.key for item in deals)
+        create: List[Item] = []
+        reprice: List[Item] = []
+        for item in deals:
+            listing = active.get(item.key)
+            if listing is None:
+                create.append(item)
+                continue
+            item.deal.listing_id = listing.listing_id
+            if listing.resale_cents == item.deal.resale_cents:
+                item.status = ACTIVE
+            else:
+                reprice.append(item)
+        recorded: List[ActiveListing] = []
+        ended: List[Item] = []
+        if reprice:
+            self._reprice(reprice, recorded, ended)
+        if ended:
+            # Sold or ended on eBay: forget the listing and list it anew.
+            self.listings.remove(item.key for item in ended)
+            for item in ended:
+                item.deal.listing_id = None
+            create.extend(ended)
+        if create:
+            responses = self._bulk(
+                "create_listings",
+                ebay_api.create_listings,
+                create,
+                [
+                    {
+                        "sku": self._sku(item),
+                        "item_name": item.deal.item_name,
+                        "purchase_price": item.deal.purchase_price,
+                        "resale_price": item.deal.resale_price,
+                    }
+                    for item in create
+                ],
+            )
+            existing: List[Item] = []
+            listed_at: Dict[str, Cents | None] = {}
+            for item, response in zip(create, responses):
+                if response is None:
+                    continue
+                item.deal.listing_id = response["listing_id"]
+                if response.get("status") != "exists":
+                    recorded.append(self._active(item))
+                    continue
+                # Listed before, e.g. by a run whose index was lost: eBay's
+                # price is the one to compare against.
+                listed_at[item.key] = parse_cents(response.get("resale_price") or "")
+                if listed_at[item.key] == item.deal.resale_cents:
+                    item.status = ACTIVE
+                    recorded.append(self._active(item))
+                else:
+                    existing.append(item)
+            if existing:
+                self._reprice(existing, recorded)
+                for item in existing:
+                    if item.status == SKIPPED and listed_at[item.key] is not None:
+                        # Remember eBay's price so the next run reprices it.
+                        recorded.append(
+                            self._active(item)._replace(resale_cents=listed_at[item.key])
+                        )
+        if recorded:
+            self.listings.record(recorded)
+        return batch
+
+    def _reprice(
+        self,
+        items: List[Item],
+        recorded: List[ActiveListing],
+        ended: List[Item] | None = None,
+    ) -> None:
+        """
+        Send the items' new prices in one bulk update, marking them
+        REPRICED and adding them to ``recorded`` on success.  Listings
+        unknown to eBay go to ``ended``, if given.
+        """
+        responses = self._bulk(
+            "update_prices",
+            ebay_api.update_prices,
+            items,
+            [
+                {"listing_id": item.deal.listing_id, "resale_price": item.deal.resale_price}
+                for item in items
+            ],
+            ended=ended,
+        )
+        for item, response in zip(items, responses):
+            if response is not None:
+                item.status = REPRICED
+                recorded.append(self._active(item))
+
+    def _bulk(
+        self,
+        call: str,
+        fn: Any,
+        items: List[Item],
+        requests: List[Dict[str, str]],
+        ended: List[Item] | None = None,
+    ) -> List[Dict[str, str] | None]:
+        """
+        Send one bulk call; items whose request failed, or the whole batch
+        if the call failed, are skipped with a note.  Items whose listing
+        is unknown to eBay are added to ``ended`` instead, if given.
+        Returns the successful responses, None for failures.
+        """
+        try:
+            responses = self._tool("ebay", call, fn, requests)
+            if len(responses) != len(items):
+                raise ValueError(f"{len(responses)} responses to {len(items)} requests")
+        except Exception as exc:
+            responses = [{"status": "error", "error": str(exc)}] * len(items)
+        results: List[Dict[str, str] | None] = []
+        for item, response in zip(items, responses):
+            if ended is not None and response.get("error") == ebay_api.UNKNOWN_LISTING:
+                ended.append(item)
+                results.append(None)
+            elif response.get("status") == "error":
+                item.status = SKIPPED
+                item.note = f"listing failed for {item.name}: {response.get('error')}"
+                results.append(None)
+            else:
+                results.append(response)
+        return results
+
+    def _sku(self, item: Item) -> str:
+        """
+        The eBay SKU of an item: its product key, scoped by account since
+        accounts share the catalog but each has its own listings.
+        """
+        return item.key if self.account is None else f"{self.account}:{item.key}"
+
+    @staticmethod
+    def _active(item: Item) -> ActiveListing:
+        return ActiveListing(item.key, item.deal.listing_id, item.deal.resale_cents, time.time())
+
+    def _fingerprint(self, item: Item) -> database.Fingerprint | None:
+        """The fingerprint to store for a finished item, if it changed."""
+        if item.status in (LISTED, UNPROFITABLE, REPRICED, ACTIVE):
+            deal = item.deal
+            return database.Fingerprint(
+                item.key,
+                item.purchase_cents,
+                item.competitor_cents,
+                UNPROFITABLE if item.status == UNPROFITABLE else LISTED,
+                deal.resale_cents if deal else None,
+                deal.listing_id if deal else None,
+                time.time(),
+            )
+        if item.status == UNCHANGED and not item.price_reused:
+            # Freshly priced but identical: keep the decision, renew the age.
+            return item.fingerprint._replace(priced_at=time.time())
+        return None
+
+    def _safe_lookup(
+        self, name: str, key: str, deadline: float | None = None
+    ) -> Dict[str, str] | None:
+        """Query Idealo (via the cache, if any), returning None instead of raising."""
+        def lookup() -> Dict[str, str] | None:
+            return self._tool(
+                "idealo", "get_lowest_price", idealo_api.get_lowest_price, name, deadline=deadline
+            )
+
+        try:
+            if self.price_cache is None:
+                return lookup()
+            return self.price_cache.get_or_load(key, lookup)
+        except Exception:
+            return None
+
+    def _tool(
+        self,
+        service: str,
+        call: str,
+        fn: Any,
+        *args: Any,
+        deadline: float | None = None,
+        idempotent: bool = True,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Call a tool function, recording a "tool.<service>.<call>" span.
+        Calls to rate-limited services go through the shared
+        `client.ServiceClient` for the service (quota, retries, hedging),
+        which stops retrying at ``deadline`` (`time.monotonic`) and
+        retries calls that are not ``idempotent`` only when throttled.
+        """
+        with self.telemetry.span(f"tool.{service}.{call}"):
+            if service in client.SERVICE_DEFAULTS:
+                return client.get_client(service).call_until(
+                    deadline, fn, *args, idempotent=idempotent, **kwargs
+                )
+            return fn(*args, **kwargs)
+
+    def _notify_user(
+        self,
+        deals: List[Deal],
+        skipped: List[str] | None = None,
+        unreported: int = 0,
+        unchanged: int = 0,
+        found_at: float | None = None,
+        repriced: int = 0,
+    ) -> None:
         if not deals:
             subject = "Shopping Agent Report: No deals found"
-            body = "No profitable resale opportunities were detected during this run."
+            lines = ["No profitable resale opportunities were detected during this run."]
         else:
             subject = "Shopping Agent Report: Deals Available"
             lines = [
                 "The agent found the following items that can be resold for a profit:\n",
             ]
             for deal in deals:
-                lines.append(
-                    f"- {deal.item_name}: bought for {deal.purchase_price}, competitor price {deal.competitor_price}, listing at {deal.resale_price} (ID {deal.listing_id})"
-                )
-            body = "\n".join(lines)
-        email.send_email(subject, body, recipients=["user@example.com"])
+                line = f"- {deal.item_name}: bought for {deal.purchase_price}, competitor price {deal.competitor_price}, listing at {deal.resale_price} (ID {deal.listing_id})"
+                if deal.trend is not None:
+                    line += f"; 7-day competitor low {format_eur(deal.trend.min_cents)}, average {format_eur(deal.trend.avg_cents)}"
+                if deal.similar:
+                    line += f"; {deal.similar_listed} of {deal.similar} similar past items were listed"
+                lines.append(line)
+            if unreported:
+                lines.append(f"- ... and {unreported} more listings")
+        if skipped:
+            lines.append("\nItems evaluated without a profitable margin:")
+            lines.extend(f"- {line}" for line in skipped)
+        if repriced:
+            lines.append(f"\n{repriced} active listings were repriced.")
+        if unchanged:
+            lines.append(f"\n{unchanged} items were unchanged since the last run.")
+        body = "\n".join(lines)
+        recipients = ["user@example.com"]
+        if self.notifier is not None:
+            self._tool(
+                "notify",
+                "enqueue",
+                self.notifier.enqueue,
+                subject,
+                body,
+                recipients,
+                deals=len(deals) + unreported,
+                found_at=found_at,
+            )
+            return
+        self._tool("email", "send_email", email.send_email, subject, body, recipients=recipients)
+
 
+def _batched(items: Iterable[Item], size: int) -> Iterator[List[Item]]:
+    batch: List[Item] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-def _parse_eur(price_str: str) -> float | None:
+
+def _normalize_item(item: Any) -> Item:
     """
-    Convert a price string like "€25.00" to a float.  Returns None on
-    failure.
+    Reduce an Amazon order, cart entry or wishlist entry to an `Item`.
+    Wishlist entries carry no price.
     """
-    try:
-        return float(price_str.replace("€", "").replace(",", "."))
-    except ValueError:
-        return None
+    if isinstance(item, str):
+        return Item(item, None)
+    return Item(item["name"], to_cents(item.get("price")), item.get("category"))
@@ -0,0 +1,161 @@
+"""
+Minimal threaded stage pipeline used by the orchestrator.
+
+A `Pipeline` pulls items from a source iterable and pushes them through a
+sequence of `Stage` objects.  Stages are connected by bounded queues, so
+a slow stage blocks the ones upstream of it (backpressure) and at most
+``queue_size`` items wait between any two stages.  Each stage runs
+``concurrency`` worker threads; with more than one worker, output order
+is not preserved.  A stage with ``batch_size`` > 1 receives a list of up
+to that many items (whatever is already queued, at least one) and
+returns an iterable of outputs.  Iterating over the pipeline yields the output of the
+last stage in the calling thread.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+
+# Returned by a stage function to drop the item from the stream.
+DROP = object()
+
+_END = object()
+
+# Seconds between checks of the stop flag while blocked on a queue.
+_POLL = 0.1
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    concurrency: int = 1
+    batch_size: int = 1
+
+
+class PipelineError(RuntimeError):
+    """Raised by the consumer when a stage or the source fails."""
+
+    def __init__(self, stage: str, error: BaseException) -> None:
+        super().__init__(f"pipeline stage {stage!r} failed: {error!r}")
+        self.stage = stage
+        self.error = error
+
+
+class Pipeline:
+    def __init__(
+        self, source: Iterable[Any], stages: List[Stage], queue_size: int = 256
+    ) -> None:
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._error: Optional[PipelineError] = None
+        self._threads: List[threading.Thread] = []
+
+    def __iter__(self) -> Iterator[Any]:
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._start("source", self._feed, queues[0])
+        for stage, q_in, q_out in zip(self.stages, queues, queues[1:]):
+            remaining = [max(1, stage.concurrency)]
+            lock = threading.Lock()
+            for _ in range(remaining[0]):
+                self._start(stage.name, self._work, stage, q_in, q_out, remaining, lock)
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _start(self, name: str, target: Callable, *args: Any) -> None:
+        thread = threading.Thread(
+            target=self._guard, args=(name, target) + args, name=f"pipeline-{name}", daemon=True
+        )
+        self._threads.append(thread)
+        thread.start()
+
+    def _guard(self, name: str, target: Callable, *args: Any) -> None:
+        try:
+            target(*args)
+        except BaseException as exc:
+            if self._error is None:
+                self._error = PipelineError(name, exc)
+            self._stop.set()
+
+    def _feed(self, q_out: queue.Queue) -> None:
+        for item in self.source:
+            if not self._put(q_out, item):
+                return
+        self._put(q_out, _END)
+
+    def _work(
+        self,
+        stage: Stage,
+        q_in: queue.Queue,
+        q_out: queue.Queue,
+        remaining: List[int],
+        lock: threading.Lock,
+    ) -> None:
+        while True:
+            item = self._get(q_in)
+            if item is not _END and stage.batch_size > 1:
+                item = self._collect_batch(stage.batch_size, item, q_in)
+            if item is _END:
+                # Let sibling workers see the end marker too; the last one
+                # to finish forwards it downstream.
+                self._put(q_in, _END)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self._put(q_out, _END)
+                return
+            if stage.batch_size > 1:
+                results = stage.fn(item)
+            else:
+                results = (stage.fn(item),)
+            for result in results:
+                if result is not DROP and not self._put(q_out, result):
+                    return
+
+    def _collect_batch(self, size: int, first: Any, q_in: queue.Queue) -> List[Any]:
+        batch = [first]
+        while len(batch) < size:
+            try:
+                item = q_in.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                # Leave the end marker for the next read.
+                q_in.put(_END)
+                break
+            batch.append(item)
+        return batch
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+        return _END
@@ -0,0 +1,272 @@
+"""
+Competitor price history.
+
+`PriceHistory` keeps every competitor price the agent has seen in the
+``price_history`` table, keyed by product and time, so trends survive
+the run that observed them.  Prices are stored at three resolutions:
+raw samples, hourly and daily buckets.  Each row aggregates its bucket
+(minimum, maximum, sum, count and last price), so a raw sample is just
+a bucket of one and rolling rows up into a coarser resolution is a
+single ``INSERT ... SELECT ... GROUP BY``.
+
+`downsample` applies the `RETENTION` policy: raw samples older than two
+days become hourly buckets, hourly buckets older than 30 days become
+daily ones and daily buckets older than a year are dropped.  Recording
+runs it automatically at most once per `DOWNSAMPLE_INTERVAL`, so the
+table stays bounded by the number of products rather than by the number
+of runs.
+
+The primary key ``(product, ts, resolution)`` serves range, latest-value
+and trend queries for a product; the ``(resolution, ts)`` index serves
+the downsampling scans.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import database
+from .money import Cents
+
+
+RAW = 0
+HOURLY = 3600
+DAILY = 86400
+
+# Resolution -> (seconds rows are kept at it, resolution they roll into;
+# None drops them).
+RETENTION: Dict[int, Tuple[int, Optional[int]]] = {
+    RAW: (2 * DAILY, HOURLY),
+    HOURLY: (30 * DAILY, DAILY),
+    DAILY: (365 * DAILY, None),
+}
+
+# Minimum seconds between automatic downsampling passes.
+DOWNSAMPLE_INTERVAL = 3600
+
+# Window of the trend features read by `trends`.
+TREND_WINDOW = 7 * DAILY
+
+
+class PricePoint(NamedTuple):
+    """One stored bucket; ``ts`` is its start in epoch seconds."""
+    ts: int
+    resolution: int
+    min_cents: Cents
+    max_cents: Cents
+    avg_cents: Cents
+    last_cents: Cents
+    count: int
+
+
+class Trend(NamedTuple):
+    """Competitor price features of a product over a window."""
+    min_cents: Cents
+    avg_cents: Cents
+    samples: int
+
+
+class PriceHistory:
+    """
+    Time series of competitor prices per product in the SQLite database
+    at ``db_path`` (default: ``database.DB_PATH``).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._db = database.get_manager(db_path)
+        self._clock = clock
+        self._next_downsample = 0.0
+        with self._db.transaction() as conn:
+            _create_tables(conn)
+
+    def record_many(
+        self, samples: Iterable[Tuple[str, Cents, Optional[float]]]
+    ) -> None:
+        """
+        Store ``(product, cents, timestamp)`` samples in one transaction;
+        a timestamp of None means now.  Downsamples first when due.
+        """
+        now = self._clock()
+        rows = [
+            (product, int(now if ts is None else ts), cents)
+            for product, cents, ts in samples
+        ]
+        if now >= self._next_downsample:
+            self.downsample(now)
+        with self._db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO price_history"
+                " (product, ts, resolution, min_cents, max_cents, sum_cents, count, last_cents)"
+                " VALUES (?1, ?2, 0, ?3, ?3, ?3, 1, ?3)" + _MERGE,
+                rows,
+            )
+
+    def record(self, product: str, cents: Cents, ts: Optional[float] = None) -> None:
+        """Store one sample."""
+        self.record_many([(product, cents, ts)])
+
+    def range(
+        self,
+        product: str,
+        start: float,
+        end: float,
+        resolution: Optional[int] = None,
+    ) -> List[PricePoint]:
+        """
+        Buckets of ``product`` starting in ``[start, end)``, oldest first;
+        all resolutions unless ``resolution`` is given.
+        """
+        sql = (
+            "SELECT ts, resolution, min_cents, max_cents, sum_cents / count, last_cents, count"
+            " FROM price_history WHERE product = ? AND ts >= ? AND ts < ?"
+        )
+        params: List = [product, int(start), int(end)]
+        if resolution is not None:
+            sql += " AND resolution = ?"
+            params.append(resolution)
+        with self._db.connection() as conn:
+            return [PricePoint(*row) for row in conn.execute(sql + " ORDER BY ts", params)]
+
+    def latest_many(self, products: Iterable[str]) -> Dict[str, Tuple[int, Cents]]:
+        """The newest ``(ts, cents)`` of each product that has a history."""
+        # SQLite returns the bare columns of the row holding MAX(ts).
+        return {
+            product: (ts, cents)
+            for product, ts, cents in self._per_product(
+                "SELECT product, MAX(ts), last_cents FROM price_history"
+                " WHERE product IN ({}) GROUP BY product",
+                products,
+            )
+        }
+
+    def trends(
+        self, products: Iterable[str], window: float = TREND_WINDOW
+    ) -> Dict[str, Trend]:
+        """Minimum and average price of each product over the last ``window`` seconds."""
+        since = int(self._clock() - window)
+        return {
+            product: Trend(low, total // count, count)
+            for product, low, total, count in self._per_product(
+                "SELECT product, MIN(min_cents), SUM(sum_cents), SUM(count)"
+                " FROM price_history WHERE product IN ({}) AND ts >= ? GROUP BY product",
+                products,
+                since,
+            )
+        }
+
+    def downsample(self, now: Optional[float] = None) -> Dict[int, int]:
+        """
+        Apply `RETENTION` as of ``now``; returns the rows removed from
+        each resolution.  Only whole buckets are rolled up.
+        """
+        now = self._clock() if now is None else now
+        self._next_downsample = now + DOWNSAMPLE_INTERVAL
+        removed = {}
+        with self._db.transaction() as conn:
+            for resolution, (keep, into) in RETENTION.items():
+                cutoff = int(now - keep)
+                if into is not None:
+                    cutoff -= cutoff % into
+                    conn.execute(
+                        f"""
+                        INSERT INTO price_history
+                            (product, ts, resolution, min_cents, max_cents, sum_cents, count, last_cents)
+                        SELECT product, bucket, {into}, MIN(min_cents), MAX(max_cents),
+                               SUM(sum_cents), SUM(count), MAX(last)
+                        FROM (
+                            SELECT product, ts - ts % {into} AS bucket, min_cents, max_cents,
+                                   sum_cents, count,
+                                   FIRST_VALUE(last_cents) OVER (
+                                       PARTITION BY product, ts - ts % {into} ORDER BY ts DESC
+                                   ) AS last
+                            FROM price_history WHERE resolution = ? AND ts < ?
+                        )
+                        WHERE true
+                        GROUP BY product, bucket
+                        """ + _MERGE,
+                        (resolution, cutoff),
+                    )
+                removed[resolution] = conn.execute(
+                    "DELETE FROM price_history WHERE resolution = ? AND ts < ?",
+                    (resolution, cutoff),
+                ).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Stored rows per resolution."""
+        with self._db.connection() as conn:
+            return _count_rows(conn)
+
+    def _per_product(self, sql: str, products: Iterable[str], *params) -> List[Tuple]:
+        keys = list(dict.fromkeys(products))
+        rows: List[Tuple] = []
+        with self._db.connection() as conn:
+            for start in range(0, len(keys), database.LOOKUP_CHUNK):
+                chunk = keys[start:start + database.LOOKUP_CHUNK]
+                rows += conn.execute(sql.format(",".join("?" * len(chunk))), (*chunk, *params))
+        return rows
+
+
+# Merges a row into an existing bucket of the same product, time and
+# resolution.  "WHERE true" resolves the parsing ambiguity of an upsert
+# after "INSERT ... SELECT".
+_MERGE = """
+    ON CONFLICT (product, ts, resolution) DO UPDATE SET
+        min_cents = MIN(min_cents, excluded.min_cents),
+        max_cents = MAX(max_cents, excluded.max_cents),
+        sum_cents = sum_cents + excluded.sum_cents,
+        count = count + excluded.count,
+        last_cents = excluded.last_cents
+"""
+
+
+def history_stats(db_path: str) -> Dict[str, int]:
+    """
+    Stored price-history rows per resolution in ``db_path``.  Returns an
+    empty dict if the database or table does not exist.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    try:
+        with database.get_manager(db_path).connection() as conn:
+            return _count_rows(conn)
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _count_rows(conn: sqlite3.Connection) -> Dict[str, int]:
+    counts = dict(conn.execute("SELECT resolution, COUNT(*) FROM price_history GROUP BY resolution"))
+    return {
+        "raw_samples": counts.get(RAW, 0),
+        "hourly_buckets": counts.get(HOURLY, 0),
+        "daily_buckets": counts.get(DAILY, 0),
+    }
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_history (
+            product TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            min_cents INTEGER NOT NULL,
+            max_cents INTEGER NOT NULL,
+            sum_cents INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            last_cents INTEGER NOT NULL,
+            PRIMARY KEY (product, ts, resolution)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS price_history_resolution_ts"
+        " ON price_history (resolution, ts)"
+    )
@@ -0,0 +1,141 @@
+"""
+Timing spans for the shopping agent.
+
+A `Telemetry` collects named spans — one per pipeline stage call and one
+per tool call — and keeps, per name, the call count, total and maximum
+duration and a `QuantileSketch` for p50/p95/p99.  Recording a span costs
+two clock reads and a short critical section, and memory does not grow
+with the number of calls.  `Telemetry.rows` produces the records stored
+in the ``spans`` table by `database.insert_spans`.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+from .eval import QuantileSketch
+
+
+T = TypeVar("T")
+
+# Quantiles reported for every span.
+SPAN_QUANTILES = (0.5, 0.95, 0.99)
+
+# Relative error of the per-span duration sketches.
+SKETCH_ACCURACY = 0.01
+
+
+class SpanStats:
+    """Aggregate of every duration recorded under one span name."""
+
+    __slots__ = ("count", "total", "max", "sketch")
+
+    def __init__(self, sketch: QuantileSketch | None = None) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = sketch or QuantileSketch(SKETCH_ACCURACY)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.sketch.add(seconds)
+
+    def merge(self, other: "SpanStats") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> Dict[str, float]:
+        result = {"count": self.count, "total": self.total, "max": self.max}
+        for q in SPAN_QUANTILES:
+            result[f"p{round(q * 100)}"] = self.sketch.quantile(q) or 0.0
+        return result
+
+
+class Telemetry:
+    """Thread-safe collection of timing spans for one run."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: Dict[str, SpanStats] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats()
+            stats.add(seconds)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the body of a ``with`` block under ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str, fn: Callable[..., T]) -> Callable[..., T]:
+        """Wrap ``fn`` so every call is recorded as a span."""
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return wrapper
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans = {}
+
+    def stats(self) -> Dict[str, SpanStats]:
+        with self._lock:
+            return dict(self._spans)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, total, max and quantiles in seconds, per span name."""
+        return {name: stats.summary() for name, stats in sorted(self.stats().items())}
+
+    def rows(self) -> List[Tuple[str, int, float, float, str]]:
+        """``(name, count, total, max, sketch json)`` for `database.insert_spans`."""
+        return [
+            (name, stats.count, stats.total, stats.max, json.dumps(stats.sketch.to_dict()))
+            for name, stats in sorted(self.stats().items())
+        ]
+
+
+def merge_rows(rows: Iterable[Tuple[str, int, float, float, str]]) -> Dict[str, SpanStats]:
+    """Combine stored span rows (e.g. from several runs) per span name."""
+    merged: Dict[str, SpanStats] = {}
+    for name, count, total, max_seconds, sketch in rows:
+        stats = SpanStats(QuantileSketch.from_dict(json.loads(sketch)))
+        stats.count, stats.total, stats.max = count, total, max_seconds
+        if name in merged:
+            merged[name].merge(stats)
+        else:
+            merged[name] = stats
+    return merged
+
+
+def format_breakdown(stats: Dict[str, SpanStats]) -> List[str]:
+    """Render span statistics as table lines, slowest total first."""
+    header = f"{'span':<32} {'count':>9} {'total s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    lines = [header, "-" * len(header)]
+    ordered = sorted(stats.items(), key=lambda kv: kv[1].total, reverse=True)
+    for name, span in ordered:
+        summary = span.summary()
+        lines.append(
+            f"{name:<32} {span.count:>9} {span.total:>10.3f} "
+            f"{summary['p50'] * 1000:>9.2f} {summary['p95'] * 1000:>9.2f} "
+            f"{summary['p99'] * 1000:>9.2f}"
+        )
+    return lines
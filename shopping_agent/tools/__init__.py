@@ -6,5 +6,29 @@ handling.
 
 Stubs in this directory return mocked data to facilitate development
 without hitting real APIs.  Replace the stubbed implementations with
-actual API calls when integrating with Amazon, Idealo and eBay.
+actual API calls when integrating with Amazon, Idealo and eBay.  The
+orchestrator calls them through `client`, which rate-limits and retries
+per service; a tool reports an HTTP 429 by raising
+`client.RateLimitedError`.  `trace` records and replays their traffic.
+
+Submodules are imported on first attribute access (PEP 562), so
+``import shopping_agent.tools`` stays cheap and only the services a
+command actually uses are loaded.
 """
+
+import importlib
+from typing import Any
+
+__all__ = ["amazon_api", "client", "ebay_api", "email", "idealo_api", "trace"]
+
+
+def __getattr__(name: str) -> Any:
+    if name in __all__:
+        module = importlib.import_module(f"{__name__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
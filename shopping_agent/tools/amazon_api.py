@@ -5,24 +5,31 @@ This module provides stub functions that return fake data for orders,
 cart items, and wishlist items. In a real implementation, these functions
 would access the Amazon API or scrape data.
 """
-from typing import List, Dict
+from typing import List, Dict, Optional
 import datetime
 
-def get_recent_orders() -> List[Dict]:
-    """Return a list of recent Amazon orders with name, price, and date."""
+# Every function takes an optional ``account`` naming the Amazon account
+# whose data is returned; None means the default account.  The stubs
+# return the same data for every account.
+
+def get_recent_orders(account: Optional[str] = None) -> List[Dict]:
+    """
+    Return a list of recent Amazon orders with name, price, and date.
+    Prices are strings as displayed by Amazon; see `money.parse_cents`.
+    """
     return [
-        {"name": "PlayStation 5", "price": 499.0, "date": datetime.date.today().isoformat()},
-        {"name": "Coffee Grinder", "price": 89.0, "date": datetime.date.today().isoformat()},
-        {"name": "Kettlebell Set", "price": 120.0, "date": datetime.date.today().isoformat()},
+        {"name": "PlayStation 5", "price": "€499.00", "date": datetime.date.today().isoformat()},
+        {"name": "Coffee Grinder", "price": "€89.00", "date": datetime.date.today().isoformat()},
+        {"name": "Kettlebell Set", "price": "€120.00", "date": datetime.date.today().isoformat()},
     ]
 
-def get_cart_items() -> List[Dict]:
+def get_cart_items(account: Optional[str] = None) -> List[Dict]:
     """Return the current items in the user's shopping cart."""
     return [
-        {"name": "Wireless Mouse", "price": 25.0, "quantity": 1},
-        {"name": "USB-C Cable", "price": 8.0, "quantity": 2},
+        {"name": "Wireless Mouse", "price": "€25.00", "quantity": 1},
+        {"name": "USB-C Cable", "price": "€8.00", "quantity": 2},
     ]
 
-def get_wishlist_items() -> List[str]:
+def get_wishlist_items(account: Optional[str] = None) -> List[str]:
     """Return a list of item names from the user's wishlist."""
     return ["Mechanical Keyboard", "Noise Cancelling Headphones", "Fitness Tracker"]
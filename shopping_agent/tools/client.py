@@ -0,0 +1,389 @@
+"""
+Shared call layer for the external services behind the tools.
+
+Every service (``amazon``, ``idealo``, ``ebay``) gets one `ServiceClient`
+that all callers in the process go through.  A client combines
+
+* a token bucket holding calls to the service's quota (calls/second),
+* an AIMD concurrency limit: each success raises the limit by about one
+  call per round trip, a 429 (`RateLimitedError`) or a call slower than
+  ``latency_target`` halves it,
+* retries with exponential backoff and full jitter for throttled and
+  transient failures, honouring ``retry_after`` hints (writes that are
+  not idempotent are retried only when throttled), and
+* optional hedging: when a call has not answered within ``hedge_after``
+  seconds (by default the observed p95), a second copy is sent and the
+  first answer wins.
+
+`metrics` reports the current rate, limits and queue depth per service.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+
+T = TypeVar("T")
+
+
+class RateLimitedError(Exception):
+    """
+    Raised by a tool when the service rejects a call for exceeding its
+    quota (HTTP 429).  ``retry_after`` is the server's hint in seconds.
+    """
+
+    def __init__(self, message: str = "rate limited", retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Failures worth retrying; anything else propagates immediately.
+RETRYABLE: Tuple[Type[BaseException], ...] = (RateLimitedError, ConnectionError, TimeoutError)
+
+# The only failure safe to retry for a call that is not idempotent: a
+# throttled call was rejected, while one that timed out may have landed.
+RETRYABLE_WRITE: Tuple[Type[BaseException], ...] = (RateLimitedError,)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, at most ``burst``
+    stored.  `acquire` blocks until a token is available.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waiting = 0
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """Take a token, waiting for the bucket to refill if necessary."""
+        wait_for = self._reserve()
+        if wait_for > 0:
+            try:
+                self._sleep(wait_for)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            # Go into debt so concurrent waiters queue up behind each other.
+            wait_for = (1 - self._tokens) / self.rate
+            self._tokens -= 1
+            self.waiting += 1
+            return wait_for
+
+    def available(self) -> float:
+        """Tokens currently in the bucket (negative while callers wait)."""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit adjusted by additive increase / multiplicative
+    decrease.  `acquire` blocks while ``limit`` calls are in flight.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.5,
+        latency_target: Optional[float] = None,
+    ) -> None:
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self._last_decrease = 0.0
+        # Enter the plain lock on the hot path; the condition shares it.
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.waiting += 1
+                try:
+                    while self.in_flight >= int(self.limit):
+                        self._cond.wait()
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self, latency: float, throttled: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if throttled or (self.latency_target is not None and latency > self.latency_target):
+                # Decrease at most once per round trip, like TCP.
+                now = time.monotonic()
+                if now - self._last_decrease >= latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if self.waiting:
+                self._cond.notify_all()
+
+
+class ServiceClient:
+    """Rate limiting, adaptive concurrency, retries and hedging for one service."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        initial_concurrency: float = 64,
+        max_concurrency: float = 64,
+        latency_target: Optional[float] = None,
+        retries: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 10.0,
+        hedge: bool = False,
+        hedge_after: Optional[float] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, sleep=sleep) if rate else None
+        self.limiter = AIMDLimiter(
+            initial_concurrency, max_limit=max_concurrency, latency_target=latency_target
+        )
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._started: Deque[float] = deque(maxlen=1024)
+        self._latencies: Deque[float] = deque(maxlen=256)
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self.counters = dict.fromkeys(
+            ("retries", "throttled", "failures", "hedges", "hedge_wins"), 0
+        )
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Call ``fn(*args, **kwargs)`` under the service's limits, retrying
+        retryable failures up to ``retries`` times.
+        """
+        return self.call_until(None, fn, *args, **kwargs)
+
+    def call_until(
+        self,
+        deadline: Optional[float],
+        fn: Callable[..., T],
+        *args: Any,
+        idempotent: bool = True,
+        **kwargs: Any,
+    ) -> T:
+        """
+        `call`, but give up instead of retrying when the backoff would end
+        after ``deadline`` (a `time.monotonic` timestamp).  Calls that are
+        not ``idempotent`` are never hedged and are retried only when
+        throttled, so a write is not repeated after it may have landed.
+        """
+        retryable = RETRYABLE if idempotent else RETRYABLE_WRITE
+        attempt = 0
+        while True:
+            try:
+                if self.hedge and idempotent:
+                    return self._hedged(fn, args, kwargs)
+                return self._attempt(fn, args, kwargs)
+            except retryable as exc:
+                delay = self._backoff(attempt + 1, exc)
+                if attempt >= self.retries or (
+                    deadline is not None and time.monotonic() + delay > deadline
+                ):
+                    self._count("failures")
+                    raise
+                attempt += 1
+                self._count("retries")
+                self._sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current rate (calls/s over the last 10s), limits, queue depth and counters."""
+        now = time.monotonic()
+        with self._lock:
+            while self._started and self._started[0] < now - 10:
+                self._started.popleft()
+            window = min(10.0, now - self._started[0]) if self._started else 0.0
+            rate = len(self._started) / window if window > 0 else float(len(self._started))
+            result: Dict[str, Any] = {"calls": self.limiter.admitted, **self.counters}
+        result.update(
+            rate=round(rate, 2),
+            rate_limit=self.bucket.rate if self.bucket else None,
+            concurrency_limit=int(self.limiter.limit),
+            in_flight=self.limiter.in_flight,
+            # Callers held by the quota, then by the concurrency limit.
+            queue_depth=(self.bucket.waiting if self.bucket else 0) + self.limiter.waiting,
+        )
+        return result
+
+    def close(self) -> None:
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+            self._hedge_pool = None
+
+    def _attempt(
+        self, fn: Callable[..., T], args: tuple, kwargs: dict, take_token: bool = True
+    ) -> T:
+        if take_token and self.bucket is not None:
+            self.bucket.acquire()
+        self.limiter.acquire()
+        started = time.monotonic()
+        # deque.append is atomic, so the hot path takes no extra lock.
+        self._started.append(started)
+        throttled = False
+        try:
+            return fn(*args, **kwargs)
+        except RateLimitedError:
+            throttled = True
+            self._count("throttled")
+            raise
+        finally:
+            latency = time.monotonic() - started
+            self.limiter.release(latency, throttled)
+            if not throttled and self.hedge:
+                self._latencies.append(latency)
+
+    def _hedged(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(thread_name_prefix=f"{self.name}-hedge")
+            pool = self._hedge_pool
+        primary = pool.submit(self._attempt, fn, args, kwargs)
+        delay = self._hedge_delay()
+        done, _ = wait([primary], timeout=delay)
+        if done or (self.bucket is not None and not self.bucket.try_acquire()):
+            return primary.result()
+        # The hedge spends its own token (taken above) and concurrency slot.
+        self._count("hedges")
+        backup = pool.submit(self._attempt, fn, args, kwargs, False)
+        done, _ = wait([primary, backup], return_when=FIRST_COMPLETED)
+        winner: Future = primary if primary in done else backup
+        if winner is backup:
+            self._count("hedge_wins")
+        try:
+            return winner.result()
+        except RETRYABLE:
+            # Fall back to whichever copy is still running.
+            other = backup if winner is primary else primary
+            return other.result()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            samples = sorted(tuple(self._latencies))
+        if len(samples) < 20:
+            return None  # not enough history: never hedge
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = getattr(exc, "retry_after", None)
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay = self._rng.uniform(0, ceiling)  # full jitter
+        return max(delay, retry_after or 0.0)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+
+# Per-service settings used when a client is first requested; override
+# with `configure` before the first call.
+SERVICE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "amazon": {"retries": 3},
+    "idealo": {"retries": 3},
+    "ebay": {"retries": 3},
+}
+
+_clients: Dict[str, ServiceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service: str) -> ServiceClient:
+    """The process-wide client for ``service``."""
+    with _clients_lock:
+        client = _clients.get(service)
+        if client is None:
+            client = _clients[service] = ServiceClient(
+                service, **SERVICE_DEFAULTS.get(service, {})
+            )
+        return client
+
+
+def configure(service: str, **settings: Any) -> ServiceClient:
+    """Replace the client for ``service`` with one built from ``settings``."""
+    with _clients_lock:
+        options = {**SERVICE_DEFAULTS.get(service, {}), **settings}
+        old = _clients.get(service)
+        client = _clients[service] = ServiceClient(service, **options)
+    if old is not None:
+        old.close()
+    return client
+
+
+def metrics() -> Dict[str, Dict[str, Any]]:
+    """`ServiceClient.metrics` for every client created so far."""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.metrics() for name, client in sorted(clients.items())}
+
+
+def reset() -> None:
+    """Drop all clients (their settings and counters)."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
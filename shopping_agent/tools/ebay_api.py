@@ -3,11 +3,42 @@ Stubbed interface for creating eBay listings.  Replace these
 implementations with calls to the eBay API using an SDK or REST
 interface.  Authentication credentials should be stored securely and
 injected via environment variables or a secrets manager.
+
+`create_listings` and `update_prices` are the bulk calls, taking up to
+`BULK_LIMIT` listings each (the limit of eBay's bulk inventory calls).
+Each listing carries a ``sku`` (the agent's product key) that the
+service uses to make creation idempotent.  With ``BASE_URL`` set (or
+``SHOPPING_AGENT_EBAY_URL`` in the environment) they are sent as JSON to
+a service speaking the protocol of `tools.ebay_server`, the local
+stand-in used by the tests; otherwise they are answered by the mock,
+which remembers the listings it created by SKU for the life of the
+process (`reset` forgets them).
 """
 
-from typing import Dict
+from typing import Any, Dict, List, Optional
+import json
+import os
+import threading
 import uuid
 
+# Listings per bulk call.
+BULK_LIMIT = 25
+
+# Base URL of the listing service; None answers bulk calls in-process.
+BASE_URL: Optional[str] = os.environ.get("SHOPPING_AGENT_EBAY_URL") or None
+
+# Seconds before an HTTP request to the listing service is abandoned.
+TIMEOUT = 10.0
+
+# Error of a price update for a listing that has ended or sold.
+UNKNOWN_LISTING = "unknown listing"
+
+# Listings created by the mock `create_listings`, by SKU, and their SKUs
+# by listing ID.
+_mock_listings: Dict[str, Dict[str, str]] = {}
+_mock_skus: Dict[str, str] = {}
+_mock_lock = threading.Lock()
+
 
 def create_listing(item_name: str, purchase_price: str, resale_price: str) -> Dict[str, str]:
     """
@@ -26,3 +57,84 @@ def create_listing(item_name: str, purchase_price: str, resale_price: str) -> Di
         "resale_price": resale_price,
         "status": "created",
     }
+
+
+def create_listings(listings: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Create up to `BULK_LIMIT` listings in one call.  Each listing has the
+    keys ``sku``, ``item_name``, ``purchase_price`` and ``resale_price``;
+    the result holds one response per listing, in order, each with the
+    ``sku`` and either a ``listing_id`` or ``status`` "error" and an
+    ``error`` message.  A SKU that is already listed returns its existing
+    listing with ``status`` "exists".
+    """
+    if BASE_URL is not None:
+        return _post("/listings/bulk_create", {"requests": listings})["responses"]
+    responses = []
+    with _mock_lock:
+        for listing in listings:
+            existing = _mock_listings.get(listing["sku"])
+            if existing is not None:
+                responses.append(dict(existing, status="exists"))
+                continue
+            created = dict(
+                create_listing(
+                    listing["item_name"], listing["purchase_price"], listing["resale_price"]
+                ),
+                sku=listing["sku"],
+            )
+            _mock_listings[listing["sku"]] = created
+            _mock_skus[created["listing_id"]] = listing["sku"]
+            responses.append(created)
+    return responses
+
+
+def update_prices(updates: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Change the price of up to `BULK_LIMIT` listings in one call.  Each
+    update has the keys ``listing_id`` and ``resale_price``; responses
+    are shaped like those of `create_listings`.  A listing that has
+    ended or sold fails with the error `UNKNOWN_LISTING`.
+    """
+    if BASE_URL is not None:
+        return _post("/listings/bulk_update_price", {"requests": updates})["responses"]
+    with _mock_lock:
+        for update in updates:
+            sku = _mock_skus.get(update["listing_id"])
+            if sku is not None:
+                _mock_listings[sku]["resale_price"] = update["resale_price"]
+    return [dict(update, status="updated") for update in updates]
+
+
+def reset() -> None:
+    """Forget the listings created by the mock."""
+    with _mock_lock:
+        _mock_listings.clear()
+        _mock_skus.clear()
+
+
+def _post(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST JSON to the listing service, mapping 429 and 5xx to retryable errors."""
+    import urllib.error
+    import urllib.request
+
+    from .client import RateLimitedError
+
+    request = urllib.request.Request(
+        BASE_URL.rstrip("/") + path,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as exc:
+        if exc.code == 429:
+            retry_after = exc.headers.get("Retry-After")
+            raise RateLimitedError(retry_after=float(retry_after) if retry_after else None) from exc
+        if exc.code >= 500:
+            raise ConnectionError(f"eBay listing service returned {exc.code}") from exc
+        raise
+    except urllib.error.URLError as exc:
+        raise ConnectionError(str(exc.reason)) from exc
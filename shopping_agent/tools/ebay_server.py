@@ -0,0 +1,179 @@
+"""
+Local stand-in for the eBay listing service.
+
+`StandInServer` answers the bulk calls of `ebay_api` over HTTP on
+localhost, so the batched listing path can be exercised end to end
+(serialisation, concurrency, throttling) without eBay.  It keeps its
+listings in memory and, like eBay's inventory API, treats the SKU as
+the idempotency key: creating a listing for a SKU that already has one
+returns the existing listing instead of a duplicate.
+
+    python -m shopping_agent.tools.ebay_server --port 8765
+    SHOPPING_AGENT_EBAY_URL=http://127.0.0.1:8765 python -m shopping_agent.ui run
+
+Requests are ``POST /listings/bulk_create`` and ``POST
+/listings/bulk_update_price`` with a JSON body ``{"requests": [...]}``;
+responses are ``{"responses": [...]}`` in request order.  More than
+`ebay_api.BULK_LIMIT` requests in one call are rejected with 400.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ebay_api import BULK_LIMIT, UNKNOWN_LISTING
+
+
+class StandInServer:
+    """
+    In-memory listing service on ``host:port`` (port 0 picks a free
+    one).  ``latency`` seconds are added to every request; `throttle`
+    makes the next requests fail with 429.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.listings: Dict[str, Dict[str, Any]] = {}  # listing ID -> listing
+        self._by_sku: Dict[str, str] = {}
+        # (path, number of requests in the body) per call served.
+        self.calls: List[Tuple[str, int]] = []
+        self._throttled = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="ebay-stand-in", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def throttle(self, requests: int = 1) -> None:
+        """Answer the next ``requests`` calls with 429 Too Many Requests."""
+        with self._lock:
+            self._throttled += requests
+
+    def end(self, listing_id: str) -> None:
+        """End a listing, as if it sold; its SKU can be listed again."""
+        with self._lock:
+            listing = self.listings.pop(listing_id)
+            del self._by_sku[listing["sku"]]
+
+    def handle(self, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Serve one call; returns the HTTP status and the JSON response."""
+        requests = body.get("requests")
+        if not isinstance(requests, list) or len(requests) > BULK_LIMIT:
+            return 400, {"error": f"expected a list of at most {BULK_LIMIT} requests"}
+        with self._lock:
+            if self._throttled:
+                self._throttled -= 1
+                return 429, {"error": "too many requests"}
+            self.calls.append((path, len(requests)))
+            if path == "/listings/bulk_create":
+                return 200, {"responses": [self._create(r) for r in requests]}
+            if path == "/listings/bulk_update_price":
+                return 200, {"responses": [self._update(r) for r in requests]}
+        return 404, {"error": f"unknown path {path}"}
+
+    def _create(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        sku = request.get("sku")
+        if not sku:
+            return {"sku": sku, "status": "error", "error": "missing sku"}
+        existing = self._by_sku.get(sku)
+        if existing is not None:
+            return dict(self.listings[existing], status="exists")
+        listing_id = str(uuid.uuid4())
+        listing = {
+            "sku": sku,
+            "listing_id": listing_id,
+            "title": f"{request.get('item_name')} – bargain price!",
+            "purchase_price": request.get("purchase_price"),
+            "resale_price": request.get("resale_price"),
+        }
+        self.listings[listing_id] = listing
+        self._by_sku[sku] = listing_id
+        return dict(listing, status="created")
+
+    def _update(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        listing = self.listings.get(request.get("listing_id"))
+        if listing is None:
+            return {
+                "listing_id": request.get("listing_id"),
+                "status": "error",
+                "error": UNKNOWN_LISTING,
+            }
+        listing["resale_price"] = request.get("resale_price")
+        return dict(listing, status="updated")
+
+
+def _handler(server: StandInServer) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if server.latency:
+                time.sleep(server.latency)
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                status, payload = 400, {"error": "invalid JSON"}
+            else:
+                status, payload = server.handle(self.path, body)
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass  # keep test and CLI output clean
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m shopping_agent.tools.ebay_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every call")
+    args = parser.parse_args(argv)
+    server = StandInServer(args.host, args.port, args.latency_ms / 1000)
+    print(f"eBay stand-in listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
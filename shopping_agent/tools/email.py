@@ -5,14 +5,19 @@ as SMTP, SendGrid or AWS SES.  Credentials and recipients would be
 configured via environment variables or configuration files.
 """
 
-from typing import List
+from typing import List, Optional
 
 
-def send_email(subject: str, body: str, recipients: List[str]) -> None:
+DEFAULT_RECIPIENTS = ["user@example.com"]
+
+
+def send_email(subject: str, body: str, recipients: Optional[List[str]] = None) -> None:
     """
     Pretend to send an email by printing the contents to the console.
-    Replace this with calls to a real email service when ready.
+    Replace this with calls to a real email service when ready.  When no
+    recipients are given the report goes to ``DEFAULT_RECIPIENTS``.
     """
+    recipients = recipients or DEFAULT_RECIPIENTS
     print(f"\n=== Email Sent ===")
     print(f"To: {', '.join(recipients)}")
     print(f"Subject: {subject}")
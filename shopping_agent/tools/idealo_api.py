@@ -8,6 +8,12 @@ based on simple heuristics.
 
 from typing import Dict
 import random
+import re
+
+from ..money import Cents, format_eur, parse_cents
+
+# First number-like token in a string, e.g. "25.00" in "Mouse €25.00".
+_PRICE_RE = re.compile(r"\d[\d.,]*")
 
 
 def get_lowest_price(item_name: str) -> Dict[str, str]:
@@ -19,30 +25,30 @@ def get_lowest_price(item_name: str) -> Dict[str, str]:
     """
     # Simulate a competitive price that is between 50% and 90% of the
     # original price.  This is a naive heuristic for demonstration.
-    base_price = _extract_price(item_name)
-    if base_price is None:
-        price_eur = round(random.uniform(10.0, 100.0), 2)
+    base_cents = _extract_price(item_name)
+    if base_cents is None:
+        price_cents = random.randint(1_000, 10_000)
     else:
-        price_eur = round(base_price * random.uniform(0.5, 0.9), 2)
+        price_cents = round(base_cents * random.uniform(0.5, 0.9))
     return {
         "vendor": "Idealo Vendor",
-        "price": f"€{price_eur:.2f}",
+        "price": format_eur(price_cents),
     }
 
 
-def _extract_price(item_name: str) -> float | None:
+def _extract_price(item_name: str) -> Cents | None:
     """
-    Extract a numeric price from a string if it appears to contain one.
+    Extract a price in cents from a string if it appears to contain one.
     This helper is purely for mocking and has no place in a production
     system.
     """
     # Attempt to parse a number in the item name (e.g., "€25.00").  This
     # will not work for most product names and will return None.
-    digits = "".join(c for c in item_name if c.isdigit() or c in {".", ","})
-    try:
-        return float(digits.replace(",", "."))
-    except ValueError:
-        
+    match = _PRICE_RE.search(item_name)
+    if match is None:
+        return None
+    return parse_cents(match.group())
+
 
 def find_lowest_price(item_name: str) -> float:
     """
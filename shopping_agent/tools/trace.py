@@ -0,0 +1,242 @@
+"""
+Record and replay of tool traffic.
+
+`Recorder` wraps the tool functions of `amazon_api`, `idealo_api`,
+`ebay_api` and `email` and appends every call to a trace file: service,
+function, arguments, result (or exception), start time (epoch seconds)
+and duration.  `Replayer` installs stand-ins for the same functions that
+answer from a trace instead of calling the services, so a run can be
+reproduced exactly, profiled or load-tested offline:
+
+    python3 -m shopping_agent.ui run --record run.trace
+    python3 -m shopping_agent.ui run --replay run.trace --replay-speed 0
+
+A trace is JSON Lines with short keys, one record per call, written
+append-only and flushed per record so a crashed run still leaves a
+usable trace; a path ending in ``.gz`` is gzip-compressed.  Replayed
+calls are matched on service, function and arguments; the bulk eBay
+calls are matched per listing (on its SKU or listing ID), so a replay
+may batch listings differently than the recorded run did.  Repeated
+identical calls get the recorded responses in order, the last one once
+they run out.  With ``speed`` 1 each replayed call takes as long as it
+did when recorded, with 10 a tenth of that, and with 0 it returns
+immediately.  A call that is not in the trace raises `TraceMismatch`.
+
+Both install by replacing module attributes, like the tests' monkeypatches:
+the orchestrator looks tools up at call time, so no code changes are
+needed to trace it.  Nested tool calls (the mock ``create_listings``
+calls ``create_listing``) are recorded only at the outermost call.
+"""
+
+from __future__ import annotations
+
+import collections
+import gzip
+import importlib
+import json
+import threading
+import time
+from typing import IO, Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .client import RateLimitedError
+
+
+# Service -> (tool module, traced functions).
+TRACED: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "amazon": ("amazon_api", ("get_recent_orders", "get_cart_items", "get_wishlist_items")),
+    "idealo": ("idealo_api", ("get_lowest_price",)),
+    "ebay": ("ebay_api", ("create_listing", "create_listings", "update_prices")),
+    "email": ("email", ("send_email",)),
+}
+
+# Bulk calls replayed per element: (service, function) -> the field that
+# identifies an element of the request list.
+BULK_CALLS: Dict[Tuple[str, str], str] = {
+    ("ebay", "create_listings"): "sku",
+    ("ebay", "update_prices"): "listing_id",
+}
+
+# Exceptions re-raised by name on replay; others become RuntimeError.
+_ERRORS: Dict[str, type] = {
+    cls.__name__: cls
+    for cls in (RateLimitedError, ConnectionError, TimeoutError, LookupError, ValueError, KeyError)
+}
+
+
+class TraceMismatch(LookupError):
+    """A replayed call that does not appear in the trace."""
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _call_key(service: str, call: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    return json.dumps([service, call, list(args), kwargs], sort_keys=True, default=str)
+
+
+class _Patcher:
+    """Replaces the traced tool functions until `uninstall`."""
+
+    def __init__(self) -> None:
+        self._saved: List[Tuple[Any, str, Any]] = []
+
+    def install(self) -> "_Patcher":
+        for service, (module_name, calls) in TRACED.items():
+            module = importlib.import_module(f"{__package__}.{module_name}")
+            for call in calls:
+                original = getattr(module, call)
+                self._saved.append((module, call, original))
+                setattr(module, call, self._wrap(service, call, original))
+        return self
+
+    def uninstall(self) -> None:
+        for module, call, original in reversed(self._saved):
+            setattr(module, call, original)
+        self._saved = []
+
+    def __enter__(self) -> "_Patcher":
+        return self.install()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.uninstall()
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def _wrap(self, service: str, call: str, original: Callable) -> Callable:
+        raise NotImplementedError
+
+
+class Recorder(_Patcher):
+    """Appends every tool call made while installed to the trace at ``path``."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self.records = 0
+        self._file = _open(path, "a")
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def _wrap(self, service: str, call: str, original: Callable) -> Callable:
+        def traced(*args: Any, **kwargs: Any) -> Any:
+            if getattr(self._local, "active", False):
+                return original(*args, **kwargs)
+            self._local.active = True
+            started = time.time()
+            record: Dict[str, Any] = {"s": service, "c": call, "a": list(args)}
+            if kwargs:
+                record["k"] = kwargs
+            try:
+                result = original(*args, **kwargs)
+            except Exception as exc:
+                record["e"] = [type(exc).__name__, str(exc)]
+                raise
+            else:
+                record["r"] = result
+                return result
+            finally:
+                self._local.active = False
+                record["t"] = round(started, 6)
+                record["d"] = round(time.time() - started, 6)
+                self._write(record)
+
+        return traced
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.records += 1
+
+
+class Replayer(_Patcher):
+    """
+    Answers tool calls from the trace at ``path`` while installed.
+    ``speed`` scales the recorded call durations: 1 replays at the
+    original pacing, 0 as fast as possible.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        speed: float = 0.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.replayed = 0
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._responses: Dict[str, Deque[Dict[str, Any]]] = {}
+        for record in load(path):
+            field = BULK_CALLS.get((record["s"], record["c"]))
+            if field is None:
+                key = _call_key(record["s"], record["c"], tuple(record["a"]), record.get("k", {}))
+                self._responses.setdefault(key, collections.deque()).append(record)
+                continue
+            # One record per element, answering it with its own response.
+            results = record.get("r") or []
+            for i, element in enumerate(record["a"][0]):
+                part = {"d": record.get("d")}
+                if "e" in record:
+                    part["e"] = record["e"]
+                else:
+                    part["r"] = results[i] if i < len(results) else None
+                key = _call_key(record["s"], record["c"], (element.get(field),), {})
+                self._responses.setdefault(key, collections.deque()).append(part)
+
+    def _wrap(self, service: str, call: str, original: Callable) -> Callable:
+        field = BULK_CALLS.get((service, call))
+
+        def replayed(*args: Any, **kwargs: Any) -> Any:
+            if field is None:
+                keys = [_call_key(service, call, args, kwargs)]
+            else:
+                keys = [_call_key(service, call, (element.get(field),), {}) for element in args[0]]
+            records = self._next(keys)
+            if records is None:
+                raise TraceMismatch(f"{service}.{call}{args!r} is not in {self.path}")
+            duration = max((record.get("d") or 0 for record in records), default=0)
+            if self.speed > 0 and duration:
+                self._sleep(duration / self.speed)
+            for record in records:
+                if "e" in record:
+                    name, message = record["e"]
+                    raise _ERRORS.get(name, RuntimeError)(message)
+            if field is None:
+                return records[0].get("r")
+            return [record.get("r") for record in records]
+
+        return replayed
+
+    def _next(self, keys: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """The next recorded response for every key, or None if one is missing."""
+        with self._lock:
+            queues = [self._responses.get(key) for key in keys]
+            if not all(queues):
+                return None
+            self.replayed += 1
+            # The last response answers every further identical call.
+            return [queue.popleft() if len(queue) > 1 else queue[0] for queue in queues]
+
+
+def load(path: str) -> Iterator[Dict[str, Any]]:
+    """The records of a trace, in order; a torn last line is ignored."""
+    with _open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
@@ -1,42 +1,582 @@
 # Simple command-line interface (CLI) for the shopping agent.
+#
+# Subcommands import what they need when they run, so short invocations
+# such as ``stats`` never load the orchestrator, the tools or the
+# scheduler.  tests/test_startup.py holds the import-time budget.
 
+from __future__ import annotations
+
+import argparse
 import sys
-from .memory import Memory
-from .orchestrator import Orchestrator
-from .eval import log_metrics, compute_statistics
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .memory import Memory
+    from .notify import Notifier
+    from .orchestrator import Orchestrator
+
+
+def _add_run_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="maximum number of Idealo lookups in flight (default: 1)",
+    )
+    parser.add_argument(
+        "--lookup-timeout",
+        type=float,
+        default=None,
+        help="seconds before a single price lookup is skipped",
+    )
+    parser.add_argument(
+        "--listing-concurrency",
+        type=int,
+        default=1,
+        help="number of eBay listings created in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=256,
+        help="items buffered between pipeline stages (default: 256)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=3600.0,
+        help="seconds a competitor price stays cached (default: 3600)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-evaluate items whose prices changed since the last run",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always query Idealo instead of using the price cache",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="SERVICE=RATE",
+        help="cap calls per second to amazon, idealo or ebay (repeatable)",
+    )
+    parser.add_argument(
+        "--hedge-lookups",
+        action="store_true",
+        help="resend Idealo lookups slower than the observed p95",
+    )
+    parser.add_argument(
+        "--recall",
+        type=int,
+        default=0,
+        metavar="K",
+        help="report how many of the K most similar past decisions were listed (default: off)",
+    )
+    parser.add_argument(
+        "--ebay-url",
+        default=None,
+        metavar="URL",
+        help="send bulk listing calls to this listing service, e.g. a local "
+        "shopping_agent.tools.ebay_server (default: $SHOPPING_AGENT_EBAY_URL or the mock)",
+    )
+
+
+def _add_notify_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--digest-window",
+        type=float,
+        default=0.0,
+        help="merge run reports into one email per this many seconds (default: off)",
+    )
+    parser.add_argument(
+        "--smtp",
+        default=None,
+        metavar="HOST[:PORT]",
+        help="deliver reports through this SMTP server instead of the console; "
+        "credentials are read from SHOPPING_AGENT_SMTP_USER/_PASSWORD",
+    )
+    parser.add_argument(
+        "--smtp-from",
+        default="shopping-agent@localhost",
+        help="sender address for SMTP delivery",
+    )
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python3 -m shopping_agent.ui")
+    sub = parser.add_subparsers(dest="cmd")
+    run = sub.add_parser("run", help="execute a single iteration of the workflow")
+    _add_run_options(run)
+    _add_notify_options(run)
+    trace = run.add_mutually_exclusive_group()
+    trace.add_argument(
+        "--record",
+        default=None,
+        metavar="TRACE",
+        help="append every tool request and response to this trace file",
+    )
+    trace.add_argument(
+        "--replay",
+        default=None,
+        metavar="TRACE",
+        help="answer tool calls from this trace file instead of the services",
+    )
+    run.add_argument(
+        "--replay-speed",
+        type=float,
+        default=0.0,
+        help="replayed call durations relative to the recording: "
+        "1 = original pacing, 10 = ten times faster, 0 = as fast as possible (default)",
+    )
+    watch = sub.add_parser("watch", help="run the workflow repeatedly in one process")
+    _add_run_options(watch)
+    _add_notify_options(watch)
+    schedule = watch.add_mutually_exclusive_group()
+    schedule.add_argument(
+        "--interval",
+        type=float,
+        default=300.0,
+        help="seconds between runs (default: 300)",
+    )
+    schedule.add_argument(
+        "--cron",
+        default=None,
+        help='five-field cron expression, e.g. "*/5 * * * *"',
+    )
+    watch.add_argument(
+        "--overlap",
+        choices=("skip", "queue"),
+        default="skip",
+        help="what to do when a run is still going at the next tick (default: skip)",
+    )
+    watch.add_argument(
+        "--max-runs",
+        type=int,
+        default=None,
+        help="exit after this many runs (default: run until interrupted)",
+    )
+    profile = sub.add_parser("profile", help="show where the time of recent runs went")
+    _add_run_options(profile)
+    profile.add_argument(
+        "--runs",
+        type=int,
+        default=10,
+        help="number of recent runs to summarise (default: 10)",
+    )
+    profile.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="execute one run under cProfile and print the hottest functions",
+    )
+    profile.add_argument(
+        "--top",
+        type=int,
+        default=25,
+        help="functions listed with --cprofile (default: 25)",
+    )
+    profile.add_argument(
+        "--cprofile-out",
+        default=None,
+        help="also write the raw cProfile data to this file",
+    )
+    accounts = sub.add_parser("accounts", help="run the workflow for several Amazon accounts")
+    accounts.add_argument("names", nargs="+", help="Amazon account names")
+    _add_run_options(accounts)
+    accounts.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="worker processes (default: one per CPU)",
+    )
+    accounts.add_argument(
+        "--data-dir",
+        default="accounts",
+        help="directory for per-account state and the shared cache (default: accounts)",
+    )
+    stats = sub.add_parser("stats", help="print aggregate run statistics")
+    stats.add_argument(
+        "--by",
+        choices=("hour", "day"),
+        default=None,
+        help="also print runs per hour or per day",
+    )
+    stats.add_argument(
+        "--since",
+        default=None,
+        metavar="TIMESTAMP",
+        help="only count runs from this ISO timestamp on (with --by)",
+    )
+    stats.add_argument(
+        "--export-csv",
+        default=None,
+        metavar="PATH",
+        help="write every run's metrics to this CSV file",
+    )
+    return parser
+
+
+def _orchestrator_options(args: argparse.Namespace) -> dict:
+    return {
+        "max_concurrency": args.concurrency,
+        "lookup_timeout": args.lookup_timeout,
+        "stage_concurrency": {"list": args.listing_concurrency},
+        "queue_size": args.queue_size,
+        "change_detection": args.incremental,
+        "price_ttl": args.cache_ttl,
+        "recall_k": args.recall,
+    }
+
+
+def _configure_clients(args: argparse.Namespace, processes: int = 1) -> None:
+    """
+    Apply ``--rate-limit``, ``--hedge-lookups`` and ``--ebay-url`` to the
+    tool clients.
+    Limits are enforced per process, so a quota shared by ``processes``
+    workers is split between them.
+    """
+    from .tools import client
+
+    settings: dict = {}
+    for spec in args.rate_limit:
+        service, sep, rate = spec.partition("=")
+        if not sep or service not in client.SERVICE_DEFAULTS:
+            raise SystemExit(f"invalid --rate-limit {spec!r}: expected SERVICE=RATE")
+        settings.setdefault(service, {})["rate"] = float(rate) / processes
+    if args.hedge_lookups:
+        settings.setdefault("idealo", {})["hedge"] = True
+    for service, options in settings.items():
+        client.configure(service, **options)
+    if args.ebay_url:
+        from .tools import ebay_api
+
+        ebay_api.BASE_URL = args.ebay_url
+
+
+def _make_orchestrator(
+    args: argparse.Namespace, mem: Memory, notifier: Notifier | None = None
+) -> Orchestrator:
+    from . import database
+    from .cache import PriceCache
+    from .catalog import ProductIndex
+    from .deal_log import DealLog
+    from .listings import ListingIndex
+    from .orchestrator import Orchestrator
+    from .price_history import PriceHistory
+
+    _configure_clients(args)
+    cache = None
+    if not args.no_cache:
+        cache = PriceCache(ttl=args.cache_ttl, db_path=database.DB_PATH)
+    decisions = None
+    if args.recall > 0:
+        from .vector_memory import DecisionMemory
+
+        decisions = DecisionMemory("decisions")
+    return Orchestrator(
+        mem,
+        price_cache=cache,
+        notifier=notifier,
+        catalog=ProductIndex(database.DB_PATH),
+        decisions=decisions,
+        history=PriceHistory(database.DB_PATH),
+        listings=ListingIndex(database.DB_PATH),
+        deal_log=DealLog("deals"),
+        **_orchestrator_options(args),
+    )
+
+
+def _close_orchestrator(orchestrator: Orchestrator) -> None:
+    """Close the price cache, decision memory and deal log of an orchestrator."""
+    if orchestrator.price_cache is not None:
+        orchestrator.price_cache.close()
+    if orchestrator.decisions is not None:
+        orchestrator.decisions.close()
+    if orchestrator.deal_log is not None:
+        orchestrator.deal_log.close()
+
+
+def _make_tracer(args: argparse.Namespace) -> Any:
+    """The `tools.trace` recorder or replayer selected by the options."""
+    if args.record:
+        from .tools.trace import Recorder
+
+        return Recorder(args.record)
+    if args.replay:
+        from .tools.trace import Replayer
+
+        return Replayer(args.replay, speed=args.replay_speed)
+    import contextlib
+
+    return contextlib.nullcontext()
+
+
+def _replay_state(args: argparse.Namespace) -> Any:
+    """
+    With ``--replay``, a context that points the database and the data
+    files (memory, deal log, decisions) at a temporary directory and turns
+    the price cache off.  A warm cache, fingerprint or listing index would
+    skip recorded calls, and the replayed prices and listings must not
+    end up in the real state.  Without ``--replay`` it does nothing.
+    """
+    import contextlib
+    import os
+    import tempfile
+
+    from . import database
+
+    if not args.replay:
+        return contextlib.nullcontext()
+    args.replay = os.path.abspath(args.replay)
+    args.no_cache = True
+
+    @contextlib.contextmanager
+    def isolated() -> Any:
+        saved = database.DB_PATH, os.getcwd()
+        with tempfile.TemporaryDirectory(prefix="shopping-agent-replay-") as tmp:
+            database.DB_PATH = os.path.join(tmp, "shopping_agent.db")
+            os.chdir(tmp)
+            try:
+                yield
+            finally:
+                database.close(database.DB_PATH)
+                database.DB_PATH = saved[0]
+                os.chdir(saved[1])
+
+    return isolated()
+
+
+def _make_notifier(args: argparse.Namespace) -> Notifier:
+    import os
+
+    from . import database
+    from .notify import Notifier, SMTPTransport
+
+    transport = None
+    if args.smtp:
+        host, _, port = args.smtp.partition(":")
+        transport = SMTPTransport(
+            host,
+            int(port or 25),
+            sender=args.smtp_from,
+            username=os.environ.get("SHOPPING_AGENT_SMTP_USER"),
+            password=os.environ.get("SHOPPING_AGENT_SMTP_PASSWORD"),
+        )
+    return Notifier(database.DB_PATH, transport, digest_window=args.digest_window)
+
+
+def _record_run(mem: Memory, orchestrator: Orchestrator) -> None:
+    """Log the last episode's metrics and store its timing spans."""
+    from .eval import record_run
+
+    recent = mem.recent_episodes(1)
+    if recent:
+        record_run(recent[0], orchestrator.telemetry.rows())
+
+
+def _print_client_metrics() -> None:
+    from .tools import client
+
+    for service, m in client.metrics().items():
+        limit = f"{m['rate_limit']}/s" if m["rate_limit"] else "unlimited"
+        print(
+            f"{service}: {m['calls']} calls ({m['rate']}/s, limit {limit}),"
+            f" concurrency limit {m['concurrency_limit']}, queue depth {m['queue_depth']},"
+            f" {m['retries']} retries, {m['throttled']} throttled, {m['hedges']} hedged"
+        )
+
+
+def _profile(args: argparse.Namespace) -> None:
+    from . import database
+    from .telemetry import format_breakdown, merge_rows
+
+    if args.cprofile:
+        import cProfile
+        import pstats
+
+        from .memory import Memory
+
+        mem = Memory()
+        orchestrator = _make_orchestrator(args, mem)
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(orchestrator.run)
+        finally:
+            _close_orchestrator(orchestrator)
+        _record_run(mem, orchestrator)
+        print("Timing breakdown of this run:")
+        for line in format_breakdown(orchestrator.telemetry.stats()):
+            print(line)
+        if args.cprofile_out:
+            profiler.dump_stats(args.cprofile_out)
+        print(f"\nHottest {args.top} functions by cumulative time:")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(args.top)
+        return
+
+    database.initialize_db()
+    runs, rows = database.fetch_spans(args.runs)
+    if not runs:
+        print("No timing data available yet.")
+        return
+    print(f"Timing breakdown of the last {len(runs)} runs ({runs[0]} .. {runs[-1]}):")
+    for line in format_breakdown(merge_rows(rows)):
+        print(line)
+
+
+def _watch(args: argparse.Namespace) -> None:
+    from .memory import Memory
+    from .watch import CronSchedule, IntervalSchedule, Watcher
+
+    # Memory, the SQLite connections and the price cache are created once
+    # and stay warm for every iteration.  Reports are delivered by the
+    # notifier's background thread.
+    mem = Memory()
+    notifier = _make_notifier(args)
+    notifier.start()
+    orchestrator = _make_orchestrator(args, mem, notifier)
+    cache = orchestrator.price_cache
+
+    def iteration() -> None:
+        orchestrator.run()
+        if cache is not None:
+            cache.flush()
+        _record_run(mem, orchestrator)
+
+    schedule = CronSchedule(args.cron) if args.cron else IntervalSchedule(args.interval)
+    watcher = Watcher(iteration, schedule, overlap=args.overlap)
+    watcher.install_signal_handlers()
+    try:
+        watcher.serve(max_iterations=args.max_runs)
+    finally:
+        watcher.restore_signal_handlers()
+        notifier.stop()
+        stats = notifier.stats()
+        print(
+            f"watch: {stats['messages_sent']} notification emails sent"
+            f" ({stats['messages_per_sec']:.1f}/s), deal-to-notification"
+            f" p50 {stats['latency_p50_sec'] or 0:.2f}s"
+            f" p95 {stats['latency_p95_sec'] or 0:.2f}s"
+        )
+        _print_client_metrics()
+        _close_orchestrator(orchestrator)
+        mem.close()
 
 
 def main(argv: list[str] | None = None) -> None:
     if argv is None:
         argv = sys.argv[1:]
     if not argv:
-        print("Usage: python3 -m shopping_agent.ui [run|stats]")
+        print("Usage: python3 -m shopping_agent.ui [run|watch|accounts|profile|stats]")
         return
     cmd = argv[0]
+    if cmd not in ("run", "watch", "accounts", "profile", "stats"):
+        print(f"Unknown command: {cmd}")
+        return
+    args = _build_parser().parse_args(argv)
     if cmd == "run":
         # Execute a single iteration
-        mem = Memory()
-        orchestrator = Orchestrator(mem)
-        orchestrator.run()
-        # Log metrics
-        if mem.episodes:
-            ep = mem.episodes[-1]
-            log_metrics(
-                {
-                    "offers_evaluated": ep.offers_evaluated,
-                    "listings_created": ep.listings_created,
-                }
-            )
+        from .memory import Memory
+
+        with _replay_state(args):
+            mem = Memory()
+            notifier = _make_notifier(args)
+            notifier.start()
+            orchestrator = _make_orchestrator(args, mem, notifier)
+            with _make_tracer(args):
+                try:
+                    orchestrator.run()
+                finally:
+                    # Deliver what is still due; digests keep waiting in the outbox.
+                    notifier.stop()
+                    _close_orchestrator(orchestrator)
+            # Log metrics
+            _record_run(mem, orchestrator)
+            mem.close()
+    elif cmd == "watch":
+        _watch(args)
+    elif cmd == "accounts":
+        from .accounts import format_report, run_accounts
+
+        import os
+
+        # Workers are forked after this, so they inherit the clients.
+        workers = min(args.workers or os.cpu_count() or 1, len(args.names))
+        _configure_clients(args, processes=workers)
+        results = run_accounts(
+            args.names,
+            args.data_dir,
+            workers=args.workers,
+            shared_cache=not args.no_cache,
+            options=_orchestrator_options(args),
+        )
+        print(format_report(results))
+    elif cmd == "profile":
+        _profile(args)
     elif cmd == "stats":
-        stats = compute_statistics()
+        from . import analytics, database
+        from .cache import persisted_stats
+        from .eval import deal_statistics
+        from .catalog import catalog_stats
+        from .listings import listing_stats
+        from .llm import stored_completions
+        from .notify import outbox_stats
+        from .price_history import history_stats
+
+        stats = analytics.run_statistics(database.DB_PATH)
         if not stats:
             print("No metrics available yet.")
         else:
             print("Run statistics:")
             for k, v in stats.items():
                 print(f"{k}: {v}")
-    else:
-        print(f"Unknown command: {cmd}")
+            if args.by:
+                print(f"Runs per {args.by}:")
+                for bucket in analytics.time_buckets(args.by, since=args.since):
+                    print(
+                        f"{bucket.start}: {bucket.runs} runs, {bucket.offers_evaluated} evaluated,"
+                        f" {bucket.listings_created} listed"
+                    )
+            if args.export_csv:
+                rows = analytics.export_csv(args.export_csv)
+                print(f"Exported {rows} runs to {args.export_csv}")
+        offers = deal_statistics("deals")
+        if offers:
+            print("Deal log:")
+            for k, v in offers.items():
+                print(f"{k}: {v}")
+        cache_stats = persisted_stats(database.DB_PATH)
+        if cache_stats:
+            print("Price cache:")
+            for k, v in cache_stats.items():
+                print(f"{k}: {v}")
+        products = catalog_stats(database.DB_PATH)
+        if products:
+            print("Product catalog:")
+            for k, v in products.items():
+                print(f"{k}: {v}")
+        history = history_stats(database.DB_PATH)
+        if history:
+            print("Price history:")
+            for k, v in history.items():
+                print(f"{k}: {v}")
+        active = listing_stats(database.DB_PATH)
+        if active:
+            print("Active listings:")
+            for k, v in active.items():
+                print(f"{k}: {v}")
+        completions = stored_completions(database.DB_PATH)
+        if completions:
+            print("LLM cache:")
+            for k, v in completions.items():
+                print(f"{k}: {v}")
+        notify_stats = outbox_stats(database.DB_PATH)
+        if notify_stats:
+            print("Notifications:")
+            for k, v in notify_stats.items():
+                print(f"{k}: {v}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,432 @@
+"""
+Similarity memory over past decisions.
+
+`DecisionMemory` keeps every item the agent has decided on (listed or
+not, with its margin and, once known, whether it sold) together with a
+local embedding of its name, and answers "which past decisions are most
+like this item?" without any network service.
+
+Embeddings are hashed character trigrams plus whole words of the
+normalised name (`catalog.normalize`), signed and L2-normalised, so the
+dot product of two vectors is their cosine similarity.  Two search modes
+are available and can be switched at any time:
+
+* ``"exact"`` scores every stored vector (one matrix-vector product),
+* ``"lsh"`` hashes vectors with random hyperplanes into several tables
+  and only rescores the items sharing a bucket with the query.
+
+With NumPy installed the vectors are searched as ``float32`` matrices;
+without it the same code runs on ``array('f')`` rows, correct but far
+slower.  When given a directory the memory persists there: vectors are
+appended to ``vectors.f32`` and memory-mapped when reopened, decisions
+and later outcome updates are appended to ``decisions.jsonl``.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import os
+import random
+import threading
+import zlib
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .catalog import normalize
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the stdlib fallback is slower.
+    np = None
+
+
+# Embedding width.  Stored with the vectors; reopening checks it.
+DEFAULT_DIM = 256
+
+MODES = ("exact", "lsh")
+
+# Random-hyperplane LSH: tables x bits per table.
+LSH_TABLES = 8
+LSH_BITS = 10
+
+
+@dataclass
+class Decision:
+    """One past decision; prices are in cents."""
+    name: str
+    key: str
+    listed: bool
+    purchase_cents: Optional[int] = None
+    competitor_cents: Optional[int] = None
+    margin_cents: Optional[int] = None
+    timestamp: str = ""
+    sold: Optional[bool] = None
+
+
+def embed(text: str, dim: int = DEFAULT_DIM) -> array:
+    """The unit-length hashed n-gram embedding of a product name."""
+    norm = normalize(text)
+    padded = f" {norm} "
+    grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    grams += norm.split()
+    vector = [0.0] * dim
+    for gram in grams:
+        # crc32 is stable across processes, unlike hash().
+        h = zlib.crc32(gram.encode())
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    length = sum(x * x for x in vector) ** 0.5 or 1.0
+    return array("f", [x / length for x in vector])
+
+
+class DecisionMemory:
+    """
+    Incrementally growing similarity index over `Decision` records,
+    optionally persisted in ``path`` (a directory).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dim: int = DEFAULT_DIM,
+        mode: str = "exact",
+        lsh_tables: int = LSH_TABLES,
+        lsh_bits: int = LSH_BITS,
+        seed: int = 0,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.path = path
+        self.dim = dim
+        self.mode = mode
+        self.lsh_tables = lsh_tables
+        self.lsh_bits = lsh_bits
+        self._seed = seed
+        self._lock = threading.Lock()
+        self.decisions: List[Decision] = []
+        self._by_key: Dict[str, int] = {}  # key -> index of its decision
+        # Vectors persisted before this process opened the memory
+        # (memory-mapped) followed by the ones added since.
+        self._base: Any = None  # NumPy view of the mapped rows, if NumPy
+        self._base_flat: Optional[memoryview] = None
+        self._base_rows = 0
+        self._tail: Any = _Rows(dim)
+        self._buckets: Optional[List[Dict[int, List[int]]]] = None
+        self._planes: Any = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._vector_file = None
+        self._log_file = None
+        if path is not None:
+            self._open(path)
+
+    def __len__(self) -> int:
+        return len(self.decisions)
+
+    def add(self, decision: Decision) -> int:
+        """Store ``decision``; returns its index."""
+        return self.add_many([decision])[0]
+
+    def add_many(self, decisions: Sequence[Decision]) -> List[int]:
+        """
+        Store several decisions, appending them to disk in one write each.
+
+        A decision whose ``key`` is already stored replaces that record
+        in place, so a product rerun every day is held once; its row
+        keeps the vector of the name it was first stored under.
+        """
+        with self._lock:
+            first = len(self.decisions)
+            indices, updates = [], []
+            for decision in decisions:
+                index = self._by_key.setdefault(decision.key, len(self.decisions))
+                if index == len(self.decisions):
+                    self.decisions.append(decision)
+                else:
+                    self.decisions[index] = decision
+                    if index < first:
+                        updates.append(index)
+                indices.append(index)
+            added = self.decisions[first:]
+            vectors = [embed(d.name, self.dim) for d in added]
+            for vector in vectors:
+                self._tail.append(vector)
+            if self._buckets is not None:
+                for index, vector in enumerate(vectors, first):
+                    self._bucket(index, vector)
+            if self._vector_file is not None:
+                self._vector_file.write(b"".join(v.tobytes() for v in vectors))
+                self._vector_file.flush()
+                self._log_file.write(
+                    "".join(json.dumps(asdict(d)) + "\n" for d in added)
+                    + "".join(
+                        json.dumps({"update": i, "decision": asdict(self.decisions[i])}) + "\n"
+                        for i in dict.fromkeys(updates)
+                    )
+                )
+                self._log_file.flush()
+            return indices
+
+    def set_sold(self, index: int, sold: bool = True) -> None:
+        """Record whether the item of decision ``index`` sold."""
+        with self._lock:
+            self.decisions[index].sold = sold
+            if self._log_file is not None:
+                self._log_file.write(json.dumps({"update": index, "sold": sold}) + "\n")
+                self._log_file.flush()
+
+    def nearest(self, name: str, k: int = 5) -> List[Tuple[float, Decision]]:
+        """The ``k`` past decisions most similar to ``name``, best first."""
+        return self.nearest_many([name], k)[0]
+
+    def nearest_many(
+        self, names: Sequence[str], k: int = 5
+    ) -> List[List[Tuple[float, Decision]]]:
+        """`nearest` for several names at once."""
+        queries = [embed(name, self.dim) for name in names]
+        with self._lock:
+            if not self.decisions or k <= 0:
+                return [[] for _ in names]
+            if self.mode == "lsh":
+                hits = [self._search_lsh(q, k) for q in queries]
+            else:
+                hits = self._search_exact(queries, k)
+            return [[(score, self.decisions[i]) for score, i in found] for found in hits]
+
+    def close(self) -> None:
+        """Close the files backing a persisted memory."""
+        with self._lock:
+            for f in (self._vector_file, self._log_file):
+                if f is not None:
+                    f.close()
+            self._vector_file = self._log_file = None
+            if self._mmap is not None:
+                self._base = None
+                self._base_flat.release()
+                self._base_flat = None
+                try:
+                    self._mmap.close()
+                except BufferError:
+                    pass  # a NumPy view is still alive; the GC closes it
+                self._mmap = None
+
+    # Search --------------------------------------------------------------
+
+    def _search_exact(self, queries: List[array], k: int) -> List[List[Tuple[float, int]]]:
+        if np is not None:
+            matrix = np.frombuffer(b"".join(q.tobytes() for q in queries), dtype=np.float32)
+            scores = self._scores_np(matrix.reshape(len(queries), self.dim))
+            return [_top_k_np(row, k) for row in scores]
+        rows = list(self._rows())
+        return [
+            heapq.nlargest(k, zip(map(_sparse_dot(q), rows), range(len(rows))), key=_rank)
+            for q in queries
+        ]
+
+    def _search_lsh(self, query: array, k: int) -> List[Tuple[float, int]]:
+        buckets = self._ensure_buckets()
+        codes = self._codes([query])[0]
+        candidates = set()
+        for table, code in zip(buckets, codes):
+            candidates.update(table.get(code, ()))
+        if len(candidates) < k:
+            # Too few neighbours share a bucket: fall back to a full scan.
+            return self._search_exact([query], k)[0]
+        ids = sorted(candidates)
+        if np is not None:
+            rows = np.stack([self._row_np(i) for i in ids])
+            q = np.frombuffer(query.tobytes(), dtype=np.float32)
+            scores = rows @ q
+            return [(float(scores[j]), ids[j]) for j in _top_indices(scores, k)]
+        dot = _sparse_dot(query)
+        return heapq.nlargest(k, ((dot(self._row(i)), i) for i in ids), key=_rank)
+
+    def _scores_np(self, queries: Any) -> Any:
+        parts = []
+        if self._base_rows:
+            parts.append(self._base @ queries.T)
+        if len(self._tail):
+            parts.append(self._tail.matrix() @ queries.T)
+        return np.concatenate(parts).T
+
+    def _ensure_buckets(self) -> List[Dict[int, List[int]]]:
+        if self._buckets is None:
+            self._buckets = [{} for _ in range(self.lsh_tables)]
+            for index, codes in enumerate(self._codes(list(self._rows()))):
+                for table, code in zip(self._buckets, codes):
+                    table.setdefault(code, []).append(index)
+        return self._buckets
+
+    def _bucket(self, index: int, vector: array) -> None:
+        for table, code in zip(self._buckets, self._codes([vector])[0]):
+            table.setdefault(code, []).append(index)
+
+    def _codes(self, vectors: List[Any]) -> List[List[int]]:
+        """LSH bucket codes of ``vectors``: one int per table."""
+        planes = self._ensure_planes()
+        bits = self.lsh_bits
+        if np is not None and vectors:
+            matrix = np.stack([np.asarray(v, dtype=np.float32) for v in vectors])
+            signs = (matrix @ planes.T) > 0
+            weights = 1 << np.arange(bits, dtype=np.int64)
+            codes = signs.reshape(len(vectors), self.lsh_tables, bits) @ weights
+            return codes.tolist()
+        result = []
+        for vector in vectors:
+            dot = _sparse_dot(vector)
+            signs = [dot(plane) > 0 for plane in planes]
+            result.append([
+                sum(1 << b for b in range(bits) if signs[t * bits + b])
+                for t in range(self.lsh_tables)
+            ])
+        return result
+
+    def _ensure_planes(self) -> Any:
+        if self._planes is None:
+            # Seeded, so codes are the same in every process.
+            rng = random.Random(self._seed)
+            planes = [
+                array("f", [rng.gauss(0.0, 1.0) for _ in range(self.dim)])
+                for _ in range(self.lsh_tables * self.lsh_bits)
+            ]
+            if np is not None:
+                planes = np.stack([np.asarray(p, dtype=np.float32) for p in planes])
+            self._planes = planes
+        return self._planes
+
+    # Storage -------------------------------------------------------------
+
+    def _rows(self):
+        for i in range(len(self.decisions)):
+            yield self._row(i)
+
+    def _row(self, index: int) -> Any:
+        if index < self._base_rows:
+            start = index * self.dim
+            return self._base_flat[start:start + self.dim]
+        return self._tail[index - self._base_rows]
+
+    def _row_np(self, index: int) -> Any:
+        if index < self._base_rows:
+            return self._base[index]
+        return self._tail.matrix()[index - self._base_rows]
+
+    def _open(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)["dim"]
+            if stored != self.dim:
+                raise ValueError(f"{path} holds {stored}-dimensional vectors, not {self.dim}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"dim": self.dim}, f)
+        log_path = os.path.join(path, "decisions.jsonl")
+        logged, torn = 0, False
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        torn = True  # a write cut short by a crash
+                        break
+                    if "update" in record:
+                        if record["update"] >= len(self.decisions):
+                            continue
+                        if "decision" in record:
+                            self.decisions[record["update"]] = Decision(**record["decision"])
+                        else:
+                            self.decisions[record["update"]].sold = record["sold"]
+                    else:
+                        self.decisions.append(Decision(**record))
+            logged = len(self.decisions)
+        vector_path = os.path.join(path, "vectors.f32")
+        row_bytes = self.dim * 4
+        size = os.path.getsize(vector_path) if os.path.exists(vector_path) else 0
+        # A crash can leave vectors and decisions out of step: keep the
+        # records both files agree on.
+        rows = min(size // row_bytes, logged)
+        if rows * row_bytes != size:
+            with open(vector_path, "r+b") as f:
+                f.truncate(rows * row_bytes)
+        del self.decisions[rows:]
+        self._by_key = {d.key: i for i, d in enumerate(self.decisions)}
+        if torn or rows != logged:
+            tmp = log_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.writelines(json.dumps(asdict(d)) + "\n" for d in self.decisions)
+            os.replace(tmp, log_path)
+        if rows:
+            with open(vector_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._base_flat = memoryview(self._mmap).cast("f")
+            if np is not None:
+                self._base = np.frombuffer(self._mmap, dtype=np.float32).reshape(rows, self.dim)
+            self._base_rows = rows
+        self._vector_file = open(vector_path, "ab")
+        self._log_file = open(log_path, "a")
+
+
+class _Rows:
+    """Vectors added in this process: a growable float32 matrix."""
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self._rows: List[array] = []
+        self._matrix: Any = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index: int) -> array:
+        return self._rows[index]
+
+    def append(self, vector: array) -> None:
+        self._rows.append(vector)
+        if self._matrix is not None:
+            if len(self._rows) > len(self._matrix):
+                grown = np.empty((2 * len(self._matrix), self.dim), dtype=np.float32)
+                grown[: len(self._matrix)] = self._matrix
+                self._matrix = grown
+            self._matrix[len(self._rows) - 1] = np.frombuffer(vector.tobytes(), dtype=np.float32)
+
+    def matrix(self) -> Any:
+        """The rows as a NumPy matrix (built once, then grown in place)."""
+        if self._matrix is None:
+            self._matrix = np.empty((max(64, 2 * len(self._rows)), self.dim), dtype=np.float32)
+            for i, row in enumerate(self._rows):
+                self._matrix[i] = np.frombuffer(row.tobytes(), dtype=np.float32)
+        return self._matrix[: len(self._rows)]
+
+
+def _sparse_dot(query: array) -> Callable[[Sequence[float]], float]:
+    """Dot product with ``query`` over its non-zero entries only."""
+    terms = [(i, x) for i, x in enumerate(query) if x]
+    return lambda row: sum(row[i] * x for i, x in terms)
+
+
+def _rank(hit: Tuple[float, int]) -> Tuple[float, int]:
+    """Sort key for hits: higher score first, then the lower index."""
+    return hit[0], -hit[1]
+
+
+def _top_indices(scores: Any, k: int) -> Any:
+    """The ``k`` best indices, ordered like `_rank` orders hits."""
+    if k < len(scores):
+        # argpartition picks arbitrarily among ties at the cut; keep the
+        # lowest indices there, as the stdlib path does.
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        top = np.concatenate([above, ties])
+    else:
+        top = np.arange(len(scores))
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def _top_k_np(scores: Any, k: int) -> List[Tuple[float, int]]:
+    return [(float(scores[i]), int(i)) for i in _top_indices(scores, k)]
@@ -0,0 +1,210 @@
+"""
+Long-running scheduler behind ``ui.py watch``.
+
+A `Watcher` calls a run function on an `IntervalSchedule` or a
+`CronSchedule` inside a single process, so memory, database connections
+and caches stay warm between iterations.  Runs execute on a worker
+thread; when a run is still in progress at the next tick the overlap
+policy either skips the tick or queues one follow-up run.  SIGINT and
+SIGTERM stop the loop after the current run finishes.
+"""
+
+from __future__ import annotations
+
+import datetime
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+SKIP = "skip"
+QUEUE = "queue"
+
+
+class IntervalSchedule:
+    """Fire every ``seconds`` seconds, starting immediately."""
+
+    def __init__(self, seconds: float) -> None:
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        return moment + datetime.timedelta(seconds=self.seconds)
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression (minute hour day-of-month month
+    day-of-week).  Fields accept ``*``, numbers, ranges ``a-b``, steps
+    ``*/n`` or ``a-b/n`` and comma-separated lists.  Day-of-week runs
+    0-6 with 0 (or 7) meaning Sunday.  As in cron, when both day fields
+    are restricted a day matching either one fires.
+    """
+
+    _BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str) -> None:
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        fields = [_parse_field(p, lo, hi) for p, (lo, hi) in zip(parts, self._BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    def _day_matches(self, day: datetime.date) -> bool:
+        dom = day.day in self.days
+        dow = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        """The first matching minute strictly after ``moment``."""
+        t = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = t + datetime.timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                year, month = (t.year + 1, 1) if t.month == 12 else (t.year, t.month + 1)
+                t = t.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(t.date()):
+                t = (t + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours:
+                t = (t + datetime.timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes:
+                t += datetime.timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+
+def _parse_field(text: str, lo: int, hi: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"invalid cron step: {text!r}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron field out of range: {text!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Watcher:
+    """
+    Repeatedly call ``run`` on ``schedule``.  ``overlap`` decides what
+    happens when a tick arrives while a run is still in progress: SKIP
+    drops the tick, QUEUE starts one more run as soon as the current one
+    ends.  After each run a latency line is passed to ``log``.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[], None],
+        schedule,
+        overlap: str = SKIP,
+        log: Callable[[str], None] = print,
+        clock: Callable[[], datetime.datetime] = datetime.datetime.now,
+    ) -> None:
+        if overlap not in (SKIP, QUEUE):
+            raise ValueError(f"unknown overlap policy: {overlap!r}")
+        self.run = run
+        self.schedule = schedule
+        self.overlap = overlap
+        self.log = log
+        self.clock = clock
+        self.iterations = 0
+        self.skipped = 0
+        self.latencies: List[float] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._queued = False
+        self._previous_handlers: Dict[int, Any] = {}
+
+    def stop(self, *_: object) -> None:
+        """Ask the loop to exit once the current run has finished."""
+        self._stop.set()
+
+    def install_signal_handlers(self) -> None:
+        """Stop cleanly on SIGINT and SIGTERM (main thread only)."""
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self._previous_handlers[signum] = signal.signal(signum, self.stop)
+
+    def restore_signal_handlers(self) -> None:
+        """Reinstate the handlers replaced by `install_signal_handlers`."""
+        while self._previous_handlers:
+            signum, handler = self._previous_handlers.popitem()
+            signal.signal(signum, handler)
+
+    def serve(self, max_iterations: Optional[int] = None) -> None:
+        """
+        Block until `stop` is called (or ``max_iterations`` runs have
+        been started or queued), then wait for the in-flight run to
+        finish.  A queued run is dropped when `stop` was called.
+        """
+        first = isinstance(self.schedule, IntervalSchedule)
+        next_at = self.clock() if first else self.schedule.next_after(self.clock())
+        try:
+            while not self._stop.is_set():
+                delay = (next_at - self.clock()).total_seconds()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                next_at = self.schedule.next_after(max(next_at, self.clock()))
+                self._tick()
+                if max_iterations is not None and self.iterations >= max_iterations:
+                    break
+        finally:
+            worker = self._worker
+            if worker is not None:
+                worker.join()
+
+    def _tick(self) -> None:
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                if self.overlap == QUEUE and not self._queued:
+                    self._queued = True
+                    self.iterations += 1
+                else:
+                    self.skipped += 1
+                    self.log("watch: previous run still in progress, skipping tick")
+                return
+            self.iterations += 1
+            self._worker = threading.Thread(target=self._work, name="watch-run", daemon=True)
+            self._worker.start()
+
+    def _work(self) -> None:
+        while True:
+            self._run_once()
+            with self._lock:
+                if not self._queued or self._stop.is_set():
+                    self._queued = False
+                    return
+                self._queued = False
+
+    def _run_once(self) -> None:
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            self.run()
+        except Exception as exc:  # keep the daemon alive
+            status = f"failed: {exc!r}"
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.log(
+            f"watch: run {len(self.latencies)} {status} in {elapsed:.3f}s"
+            f" at {datetime.datetime.now().isoformat(timespec='seconds')}"
+        )
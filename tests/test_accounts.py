@@ -0,0 +1,121 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import analytics
+from shopping_agent import ui
+from shopping_agent.accounts import account_dir, format_report, run_accounts
+from shopping_agent.cache import persisted_stats
+from shopping_agent.tools import amazon_api, idealo_api, email, ebay_api
+
+
+@pytest.fixture(autouse=True)
+def fresh_listings():
+    ebay_api.reset()  # the mock remembers listings by SKU
+    yield
+    ebay_api.reset()
+
+
+def _stub_tools(monkeypatch, lookups=None, failing_account=None):
+    def orders(account=None):
+        if account == failing_account:
+            raise RuntimeError(f"login failed for {account}")
+        return [{"name": f"Item {i}", "price": "€10.00"} for i in range(4)] + [
+            {"name": f"Only {account}", "price": "€10.00"}
+        ]
+
+    def lookup(name):
+        if lookups is not None:
+            lookups.append(name)
+        return {"vendor": "V", "price": "€30.00"}
+
+    monkeypatch.setattr(amazon_api, "get_recent_orders", orders)
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda account=None: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda account=None: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda subject, body, recipients=None: None)
+
+
+def test_accounts_list_under_their_own_skus(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    _stub_tools(monkeypatch)
+    skus = []
+
+    def create(listings):
+        skus.extend(listing["sku"] for listing in listings)
+        return [{"sku": l["sku"], "listing_id": l["sku"], "status": "created"} for l in listings]
+
+    monkeypatch.setattr(ebay_api, "create_listings", create)
+    run_accounts(["alice", "bob"], str(tmp_path / "data"), workers=1)
+    # The catalog is shared, so both accounts list "Item 0" as the same product.
+    alice = {sku.split(":", 1)[1] for sku in skus if sku.startswith("alice:")}
+    bob = {sku.split(":", 1)[1] for sku in skus if sku.startswith("bob:")}
+    assert len(skus) == 10 and len(alice & bob) == 4
+
+
+def test_accounts_get_private_state_and_share_prices(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    lookups = []
+    _stub_tools(monkeypatch, lookups)
+    saved = db.DB_PATH
+
+    results = run_accounts(["alice", "bob"], str(tmp_path / "data"), workers=1)
+
+    assert [r.account for r in results] == ["alice", "bob"]
+    assert all(r.error is None and r.episode["listings_created"] == 5 for r in results)
+    # Shared items are priced once; each account's own item once.
+    assert sorted(lookups) == ["Item 0", "Item 1", "Item 2", "Item 3", "Only alice", "Only bob"]
+    for account in ("alice", "bob"):
+        directory = account_dir(str(tmp_path / "data"), account)
+        assert {"memory.jsonl", "shopping_agent.db"} <= set(os.listdir(directory))
+        runs = analytics.summary(db_path=os.path.join(directory, "shopping_agent.db"))
+        assert (runs["runs"], runs["sum_listings_created"]) == (1, 5)
+    assert not os.path.exists(tmp_path / "memory.jsonl")
+    assert db.DB_PATH == saved
+
+    report = json.loads((tmp_path / "data" / "report.json").read_text())
+    assert report["totals"]["listings_created"] == 10
+    assert report["failed"] == []
+    text = format_report(results)
+    assert "- alice: 5 evaluated, 5 listed" in text
+    assert "Total: 10 evaluated, 10 listed" in text
+    assert "tool.idealo.get_lowest_price" in text
+
+
+def test_failed_account_is_reported(monkeypatch, tmp_path):
+    _stub_tools(monkeypatch, failing_account="carol")
+    results = run_accounts(["alice", "carol"], str(tmp_path), workers=1)
+    assert results[0].error is None
+    assert "login failed for carol" in results[1].error
+    assert "- carol: FAILED" in format_report(results)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork start method"
+)
+def test_accounts_run_in_process_pool(monkeypatch, tmp_path):
+    # Forked workers inherit the stubbed tools.
+    _stub_tools(monkeypatch)
+    names = [f"user{i}" for i in range(4)]
+    results = run_accounts(
+        names, str(tmp_path), workers=2, mp_context=multiprocessing.get_context("fork")
+    )
+    assert [r.account for r in results] == names
+    assert all(r.error is None for r in results), [r.error for r in results]
+    assert sum(r.episode["listings_created"] for r in results) == 20
+    stats = persisted_stats(str(tmp_path / "price_cache.db"))
+    assert stats["stored_entries"] == 8
+    assert stats["hits"] + stats["disk_hits"] + stats["misses"] == 20
+    db.close(str(tmp_path / "price_cache.db"))
+
+
+def test_ui_accounts(monkeypatch, tmp_path, capsys):
+    _stub_tools(monkeypatch)
+    ui.main(["accounts", "alice", "bob", "--workers", "1", "--data-dir", str(tmp_path)])
+    out = capsys.readouterr().out
+    assert "Runs for 2 accounts:" in out
+    assert "Total: 10 evaluated, 10 listed" in out
@@ -38,7 +38,8 @@ def test_database_in_memory(monkeypatch):
     assert metrics[-1][3] == 15.5
 
 
-def test_orchestrator_run(monkeypatch, capsys):
+def test_orchestrator_run(monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
     # stub Amazon functions to return predictable data
     monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "Test Item", "price": "€100.00"}])
     monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
@@ -53,7 +54,7 @@ def test_orchestrator_run(monkeypatch, capsys):
         "resale_price": resale_price,
         "status": "listed"
     })
-    mem = Memory()
+    mem = Memory(str(tmp_path / "memory.json"))
     orchestrator = Orchestrator(mem)
     orchestrator.run()
     captured = capsys.readouterr()
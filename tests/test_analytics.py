@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import analytics, ui
+from shopping_agent import eval as agent_eval
+
+
+START = datetime.datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.initialize_db()
+    yield path
+    db.close_all()
+
+
+def _runs(count, step=datetime.timedelta(minutes=30)):
+    return [((START + i * step).isoformat(), i, i % 3) for i in range(count)]
+
+
+def test_summary_and_buckets_are_computed_in_sql(db_path):
+    db.insert_runs(_runs(96))
+    db.insert_metrics(7, 0.5)  # a legacy row, not a run
+
+    total = analytics.summary()
+    assert total["runs"] == 96
+    assert total["sum_offers_evaluated"] == sum(range(96))
+    assert (total["min_offers_evaluated"], total["max_offers_evaluated"]) == (0, 95)
+    day = analytics.summary(since="2025-01-02T00:00:00")
+    assert day["runs"] == 48 and day["avg_listings_created"] == pytest.approx(1.0)
+
+    days = analytics.time_buckets("day")
+    assert [(b.start, b.runs) for b in days] == [("2025-01-01T00:00:00", 48), ("2025-01-02T00:00:00", 48)]
+    hours = analytics.time_buckets("hour", since="2025-01-01T10:00:00", until="2025-01-01T12:00:00")
+    assert [(b.start, b.runs, b.offers_evaluated) for b in hours] == [
+        ("2025-01-01T10:00:00", 2, 20 + 21),
+        ("2025-01-01T11:00:00", 2, 22 + 23),
+    ]
+
+
+def test_keyset_pagination_streams_every_row_once(db_path):
+    # Duplicate timestamps must not be skipped or repeated across pages.
+    db.insert_runs(_runs(10) + _runs(10))
+    page = analytics.fetch_runs(limit=7)
+    assert len(page.rows) == 7 and page.next_cursor == (page.rows[-1].timestamp, page.rows[-1].id)
+    rows = list(analytics.iter_runs(page_size=3))
+    assert len({row.id for row in rows}) == 20
+    assert [row.timestamp for row in rows] == sorted(row.timestamp for row in rows)
+    assert analytics.fetch_runs(after=(rows[-1].timestamp, rows[-1].id)) == analytics.Page([], None)
+    with db.get_manager().connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM metrics WHERE timestamp >= ? ORDER BY timestamp, id",
+            ("2025",),
+        ).fetchall()
+    assert "metrics_timestamp" in str(plan)
+
+
+def test_run_statistics_match_brute_force(db_path):
+    now = START + datetime.timedelta(hours=40)
+    runs = _runs(60)
+    db.insert_runs(runs)
+    stats = analytics.run_statistics(now=now)
+
+    offers = sorted(r[1] for r in runs)
+    day = [r[1] for r in runs if r[0] > (now - datetime.timedelta(days=1)).isoformat()]
+    assert stats["runs"] == 60
+    assert stats["avg_offers_evaluated"] == pytest.approx(sum(offers) / 60)
+    assert stats["last_60_runs_avg_listings_created"] == pytest.approx(sum(r[2] for r in runs) / 60)
+    assert stats["last_24h_runs"] == len(day)
+    assert stats["last_24h_avg_offers_evaluated"] == pytest.approx(sum(day) / len(day))
+    for q in agent_eval.QUANTILES:
+        assert stats[f"p{round(q * 100)}_offers_evaluated"] == pytest.approx(
+            offers[int(q * 59)], rel=0.05, abs=1
+        )
+
+    # Later calls only fold in the runs recorded since.
+    db.insert_runs([(now.isoformat(), 100, 1)])
+    with db.get_manager().connection() as conn:
+        traced = []
+        conn.set_trace_callback(traced.append)
+        try:
+            assert analytics.run_statistics(now=now)["runs"] == 61
+        finally:
+            conn.set_trace_callback(None)
+    assert not any("ORDER BY offers_evaluated" in sql for sql in traced)
+    assert any("WHERE id > 60 " in sql for sql in traced)
+
+
+def test_ui_stats_reads_database(monkeypatch, tmp_path, db_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    ui.main(["stats"])
+    assert "No metrics available yet." in capsys.readouterr().out
+
+    db.insert_runs(_runs(4))
+    ui.main(["stats", "--by", "hour", "--export-csv", str(tmp_path / "runs.csv")])
+    out = capsys.readouterr().out
+    assert "Run statistics:\nruns: 4\n" in out
+    assert "Runs per hour:\n2025-01-01T00:00:00: 2 runs, 1 evaluated, 1 listed" in out
+    assert "Exported 4 runs" in out
+    assert (tmp_path / "runs.csv").read_text().splitlines()[0] == "timestamp,offers_evaluated,listings_created"
@@ -0,0 +1,46 @@
+import json
+
+import shopping_agent.database as db
+from shopping_agent.tools import idealo_api
+
+from benchmarks import suite
+from benchmarks.synthetic import PRODUCT_TYPES, LatencyProfile, generate_catalog, stubbed_tools
+
+
+def test_catalog_is_deterministic_and_distinct():
+    catalog = generate_catalog(500, seed=1)
+    assert catalog == generate_catalog(500, seed=1)
+    assert len({item.name for item in catalog}) == 500
+    assert {item.category for item in catalog} <= {c for c, _, _ in PRODUCT_TYPES.values()}
+    assert all(item.purchase_cents > 0 and item.competitor_cents > 0 for item in catalog)
+
+
+def test_stubbed_tools_inject_latency_and_restore():
+    original = idealo_api.get_lowest_price
+    catalog = generate_catalog(3)
+    with stubbed_tools(catalog, LatencyProfile.uniform(0.001)) as calls:
+        assert idealo_api.get_lowest_price(catalog[0].name)["vendor"] == "Synthetic"
+        assert idealo_api.get_lowest_price("unknown") is None
+    assert calls["idealo"] == 2
+    assert idealo_api.get_lowest_price is original
+
+
+def test_suite_writes_results_and_flags_regressions(tmp_path):
+    saved = db.DB_PATH
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    assert suite.main(["--sizes", "50", "--repeat", "1", "--baseline", str(baseline), "--update-baseline"]) == 0
+    assert db.DB_PATH == saved
+
+    data = json.loads(baseline.read_text())
+    assert {"orchestrator_run_50", "database_insert_orders_50", "memory_load_50",
+            "eval_statistics_cold_50"} <= set(data["results"])
+    assert suite.compare(data, data, tolerance=0.0) == []
+
+    # A baseline ten times faster than anything measured must fail the run.
+    for metric in data["results"].values():
+        metric["value"] *= 10 if metric["higher_is_better"] else 0.1
+    baseline.write_text(json.dumps(data))
+    args = ["--sizes", "50", "--repeat", "1", "--baseline", str(baseline), "--output", str(output)]
+    assert suite.main(args) == 1
+    assert "orchestrator_run_50" in json.loads(output.read_text())["results"]
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from shopping_agent.cache import PriceCache, persisted_stats
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = PriceCache(max_entries=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    clock.now += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 2
+    assert stats["hits"] == 1
+
+
+def test_single_flight_shares_upstream_call():
+    calls = 0
+    started = threading.Event()
+    release = threading.Event()
+
+    def loader():
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait(2)
+        return {"price": "€10.00"}
+
+    cache = PriceCache()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("ps5", loader)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(2)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == 1
+    assert results == [{"price": "€10.00"}] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_loader_errors_are_not_cached():
+    cache = PriceCache()
+
+    def failing():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        cache.get_or_load("x", failing)
+    assert cache.get_or_load("x", lambda: 5) == 5
+
+
+def test_sqlite_backing_survives_restart(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    first = PriceCache(db_path=db_path)
+    first.get_or_load("mouse", lambda: {"price": "€9.99"})
+    first.close()
+
+    second = PriceCache(db_path=db_path)
+    assert second.get_or_load("mouse", lambda: pytest.fail("upstream called")) == {"price": "€9.99"}
+    second.close()
+
+    stats = persisted_stats(db_path)
+    assert stats["misses"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["stored_entries"] == 1
+
+
+def test_disk_reads_do_not_block_other_lookups(tmp_path):
+    cache = PriceCache(db_path=str(tmp_path / "cache.db"))
+    cache.put("warm", 1)
+    manager = cache._db
+    reading = threading.Event()
+    release = threading.Event()
+
+    class SlowDisk:
+        def connection(self):
+            reading.set()
+            release.wait(5)
+            return manager.connection()
+
+        def transaction(self):
+            return manager.transaction()
+
+    cache._db = SlowDisk()
+    cold = threading.Thread(target=cache.get, args=("cold",))
+    cold.start()
+    assert reading.wait(5)
+    start = time.monotonic()
+    assert cache.get("warm") == 1
+    cache.put("other", 2)
+    assert time.monotonic() - start < 1
+    release.set()
+    cold.join()
+    cache._db = manager
+    cache.close()
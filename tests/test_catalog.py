@@ -0,0 +1,109 @@
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.cache import PriceCache
+from shopping_agent.catalog import SCAN_LIMIT, ProductIndex, catalog_stats, normalize
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, ebay_api, email, idealo_api
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["PS5", "PlayStation 5 Console", "Playstation-5", "PlayStation®5", "  playstation   5 "],
+)
+def test_normalize_folds_spellings(name):
+    assert normalize(name) == "playstation 5"
+
+
+def test_normalize_keeps_distinguishing_words():
+    assert normalize("Kaffeemühle für Espresso") == "kaffeemuhle fur espresso"
+    assert normalize("PS5 Digital Edition") == "playstation 5 digital edition"
+    assert normalize("Sony WH-1000XM5") == "sony wh 1000 xm 5"
+    assert normalize("!!!") == "!!!"
+
+
+def test_resolve_merges_variants_but_not_different_models():
+    index = ProductIndex()
+    ps5, same, typo, ps4, phone, pro = index.resolve_many(
+        ["PS5", "PlayStation 5 Console", "Playstaton 5", "PlayStation 4", "iPhone 15", "iPhone 15 Pro"]
+    )
+    assert ps5 == same == typo
+    assert len({ps5, ps4, phone, pro}) == 4
+    assert index.name(ps5) == "PS5"
+    assert index.resolve("iphone15") == phone
+    stats = index.stats()
+    assert (stats["products"], stats["fuzzy_matches"], stats["created"]) == (4, 1, 4)
+
+
+def test_fuzzy_match_in_large_bucket():
+    index = ProductIndex()
+    # Same shape for every product, so the bucket is searched by trigrams.
+    names = [f"{brand} {kind} {n}" for brand in ("Sony", "Bosch", "Anker") for kind in (
+        "Headphones", "Blender", "Charger", "Speaker") for n in range(20)]
+    ids = index.resolve_many(names)
+    assert len(set(ids)) == len(names) > SCAN_LIMIT
+    assert index.resolve("Bosch Blendr 7") == ids[names.index("Bosch Blender 7")]
+    assert index.resolve("Bosch Blender 77") not in ids
+
+
+def test_index_is_persisted(db_path):
+    index = ProductIndex(db_path)
+    first = index.resolve_many(["PS5", "Playstaton 5", "Yoga Mat"])
+    reloaded = ProductIndex(db_path)
+    assert reloaded.resolve_many(["Playstaton 5", "Yoga Mat"]) == first[1:]
+    assert reloaded.stats()["exact_hits"] == 2
+    assert catalog_stats(db_path) == {"products": 2, "aliases": 3}
+    # A second writer that has not seen a product reuses its stored ID.
+    stale = ProductIndex(db_path)
+    index.resolve("Board Game")
+    assert stale.resolve("board game") == index.resolve("Board Game")
+
+
+def test_run_looks_up_each_product_once_and_evaluates_each_purchase(monkeypatch, tmp_path, db_path):
+    lookups, listings = [], []
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "PS5", "price": "€400.00"}])
+    monkeypatch.setattr(
+        amazon_api, "get_cart_items", lambda: [{"name": "PlayStation 5 Console", "price": "€700.00"}]
+    )
+    monkeypatch.setattr(
+        amazon_api, "get_wishlist_items", lambda: [{"name": "Playstation-5", "price": "€400.00"}]
+    )
+
+    def lookup(name):
+        lookups.append(name)
+        return {"vendor": "V", "price": "€550.00"}
+
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: listings.append(args) or {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: None)
+
+    mem = Memory(str(tmp_path / "memory.json"))
+    catalog = ProductIndex(db_path)
+    Orchestrator(mem, price_cache=PriceCache(), catalog=catalog, change_detection=True).run()
+
+    assert lookups == ["PS5"]
+    # The cart entry costs more than it resells for; the others are listed.
+    assert [args[0] for args in listings] == ["PS5", "Playstation-5"]
+    assert (mem.episodes[-1].offers_evaluated, mem.episodes[-1].listings_created) == (3, 2)
+    assert mem.recall("items_fetched") == 3
+    assert mem.recall("duplicates_merged") == 2
+    product = catalog.resolve("PS5")
+    assert list(db.fetch_fingerprints([f"product:{product}"])) == [f"product:{product}"]
+
+
+def test_ui_stats_reports_catalog(monkeypatch, tmp_path, db_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    ProductIndex(db_path).resolve_many(["PS5", "PlayStation 5 Console", "Yoga Mat"])
+    ui.main(["stats"])
+    out = capsys.readouterr().out
+    assert "Product catalog:\nproducts: 2\naliases: 2" in out
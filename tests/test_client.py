@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+
+import pytest
+
+from shopping_agent import ui
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, client, ebay_api, email, idealo_api
+from shopping_agent.tools.client import AIMDLimiter, RateLimitedError, ServiceClient, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    client.reset()
+    yield
+    client.reset()
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_spends_burst_then_paces_at_rate():
+    fake = _FakeTime()
+    bucket = TokenBucket(rate=10, burst=3, clock=fake.clock, sleep=fake.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert fake.slept == []
+    assert not bucket.try_acquire()
+    for _ in range(5):
+        bucket.acquire()
+    assert fake.now == pytest.approx(0.5)
+    fake.now += 10
+    assert bucket.available() == 3
+
+
+def test_aimd_grows_on_success_and_halves_on_throttle():
+    limiter = AIMDLimiter(initial=4, max_limit=8, latency_target=0.5)
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(0.01)
+    assert 5 < limiter.limit <= 8
+    grown = limiter.limit
+    limiter.acquire()
+    limiter.release(0.01, throttled=True)
+    assert limiter.limit == pytest.approx(grown / 2)
+    # A second signal within the same round trip does not halve again.
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(grown / 2)
+
+
+def test_aimd_bounds_calls_in_flight():
+    limiter = AIMDLimiter(initial=2, max_limit=2)
+    peak, running, lock = [0], [0], threading.Lock()
+
+    def work():
+        limiter.acquire()
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        limiter.release(0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+
+
+def test_retries_throttled_calls_with_backoff():
+    slept = []
+    service = ServiceClient("svc", retries=3, sleep=slept.append, rng=random.Random(1))
+    answers = [RateLimitedError(retry_after=2.0), ConnectionError("reset"), "ok"]
+
+    def flaky():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert service.call(flaky) == "ok"
+    assert slept[0] >= 2.0  # the server's hint is honoured
+    assert 0 <= slept[1] <= 0.2  # full jitter below base * 2
+    m = service.metrics()
+    assert (m["calls"], m["retries"], m["throttled"], m["failures"]) == (3, 2, 1, 0)
+
+
+def test_gives_up_after_retries_and_does_not_retry_other_errors():
+    service = ServiceClient("svc", retries=2, sleep=lambda s: None)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise TimeoutError("slow")
+
+    with pytest.raises(TimeoutError):
+        service.call(down)
+    assert len(calls) == 3
+    assert service.metrics()["failures"] == 1
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError):
+        service.call(broken)
+    assert len(calls) == 4
+
+
+def test_hedged_request_wins_over_slow_primary():
+    service = ServiceClient("svc", hedge=True, hedge_after=0.02)
+    release = threading.Event()
+    first = threading.Event()
+
+    def lookup():
+        if not first.is_set():
+            first.set()
+            release.wait(5)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert service.call(lookup) == "fast"
+    assert time.monotonic() - start < 1
+    release.set()
+    m = service.metrics()
+    assert (m["hedges"], m["hedge_wins"]) == (1, 1)
+    service.close()
+
+
+def test_metrics_report_rate_limit_and_queue():
+    service = client.configure("idealo", rate=50, burst=5)
+    for _ in range(5):
+        service.call(lambda: None)
+    m = client.metrics()["idealo"]
+    assert m["rate_limit"] == 50
+    assert m["calls"] == 5 and m["rate"] > 0
+    assert m["queue_depth"] == 0 and m["in_flight"] == 0
+    assert m["concurrency_limit"] == 64
+
+
+def test_queue_depth_counts_callers_waiting_for_the_rate_limit():
+    asleep = threading.Event()
+    release = threading.Event()
+
+    def sleep(seconds):
+        asleep.set()
+        release.wait(5)
+
+    service = ServiceClient("svc", rate=1, burst=1, sleep=sleep)
+    service.call(lambda: None)
+    waiter = threading.Thread(target=service.call, args=(lambda: None,))
+    waiter.start()
+    assert asleep.wait(5)
+    assert service.metrics()["queue_depth"] == 1
+    release.set()
+    waiter.join()
+    assert service.metrics()["queue_depth"] == 0
+
+
+def test_orchestrator_routes_tool_calls_through_clients(monkeypatch, tmp_path):
+    throttled = []
+
+    def lookup(name):
+        if not throttled:
+            throttled.append(name)
+            raise RateLimitedError(retry_after=0)
+        return {"vendor": "V", "price": "€30.00"}
+
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "Item", "price": "€10.00"}])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: None)
+    client.configure("idealo", backoff_base=0.001)
+
+    mem = Memory(str(tmp_path / "memory.json"))
+    Orchestrator(mem).run()
+
+    assert mem.episodes[-1].listings_created == 1
+    m = client.metrics()
+    assert set(m) == {"amazon", "idealo", "ebay"}
+    assert (m["idealo"]["calls"], m["idealo"]["retries"]) == (2, 1)
+    assert m["amazon"]["calls"] == 3 and m["ebay"]["calls"] == 1
+
+
+def test_ui_rate_limit_option():
+    args = ui._build_parser().parse_args(
+        ["run", "--rate-limit", "idealo=5", "--rate-limit", "ebay=0.5", "--hedge-lookups"]
+    )
+    ui._configure_clients(args)
+    assert client.get_client("idealo").bucket.rate == 5
+    assert client.get_client("idealo").hedge
+    assert client.get_client("ebay").bucket.rate == 0.5
+    assert client.get_client("amazon").bucket is None
+    with pytest.raises(SystemExit):
+        ui._configure_clients(ui._build_parser().parse_args(["run", "--rate-limit", "paypal=1"]))
+
+
+def test_no_retry_past_deadline():
+    slept = []
+    service = ServiceClient(
+        "svc", retries=5, backoff_base=1.0, sleep=slept.append, rng=random.Random(0)
+    )
+
+    def down():
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        service.call_until(time.monotonic() + 0.001, down)
+    assert slept == []
+    assert service.metrics()["failures"] == 1
+
+
+def test_writes_are_retried_only_when_throttled():
+    service = ServiceClient("svc", retries=3, hedge=True, hedge_after=0, sleep=lambda s: None)
+    answers = [RateLimitedError(retry_after=0), TimeoutError("slow"), "ok"]
+    calls = []
+
+    def create():
+        calls.append(1)
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    # The timeout may have created the listing, so it is not retried.
+    with pytest.raises(TimeoutError):
+        service.call_until(None, create, idempotent=False)
+    assert len(calls) == 2
+    m = service.metrics()
+    assert (m["retries"], m["throttled"], m["hedges"]) == (1, 1, 0)
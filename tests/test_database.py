@@ -0,0 +1,64 @@
+import threading
+
+import shopping_agent.database as db
+
+
+def _use_file_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+    db.initialize_db()
+
+
+def test_connection_is_reused_in_wal_mode(monkeypatch, tmp_path):
+    _use_file_db(monkeypatch, tmp_path)
+    manager = db.get_manager()
+    assert db.get_manager() is manager
+    with manager.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.configure(synchronous="FULL")
+    with manager.connection() as conn:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    db.configure(synchronous="NORMAL")
+
+
+def test_bulk_insert_orders_in_batches(monkeypatch, tmp_path):
+    _use_file_db(monkeypatch, tmp_path)
+    orders = ({"name": f"Item {i}", "price": i, "date": "2025-01-01"} for i in range(2500))
+    db.insert_orders(orders, batch_size=1000)
+    with db.get_manager().connection() as conn:
+        count, total = conn.execute("SELECT COUNT(*), SUM(price) FROM orders").fetchone()
+    assert count == 2500
+    assert total == sum(range(2500))
+
+
+def test_failed_bulk_insert_rolls_back(monkeypatch, tmp_path):
+    _use_file_db(monkeypatch, tmp_path)
+    orders = [{"name": "ok", "price": 1.0}, {"name": "bad", "price": "not a number"}]
+    try:
+        db.insert_orders(orders)
+    except ValueError:
+        pass
+    with db.get_manager().connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+
+
+def test_concurrent_metric_inserts(monkeypatch, tmp_path):
+    _use_file_db(monkeypatch, tmp_path)
+    threads = [
+        threading.Thread(target=lambda: [db.insert_metrics(1, 0.5) for _ in range(50)])
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(db.fetch_metrics()) == 200
+
+
+def test_fingerprints_round_trip_in_chunks(monkeypatch, tmp_path):
+    _use_file_db(monkeypatch, tmp_path)
+    monkeypatch.setattr(db, "LOOKUP_CHUNK", 7)
+    rows = [db.Fingerprint(f"p{i}", i, i + 1, "listed", i + 2, f"L{i}", 1.0) for i in range(30)]
+    db.upsert_fingerprints(rows)
+    found = db.fetch_fingerprints([f"p{i}" for i in range(0, 40, 2)])
+    assert sorted(found) == sorted(f"p{i}" for i in range(0, 30, 2))
+    assert found["p4"] == rows[4]
@@ -0,0 +1,147 @@
+import os
+import random
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import deal_log, ui
+from shopping_agent import eval as agent_eval
+from shopping_agent.cache import PriceCache
+from shopping_agent.deal_log import DECISIONS, DealLog, DealRow
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, ebay_api, email, idealo_api
+
+
+def _rows(count, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        purchase = rng.randint(500, 5000)
+        resale = purchase + rng.randint(-1000, 2000)
+        decision = DECISIONS[rng.randrange(4)] if resale > purchase else "unprofitable"
+        rows.append(DealRow(1000.0 + i, f"p{i % 17}", purchase, rng.randint(400, 6000), resale, decision))
+    return rows
+
+
+def _expected(rows):
+    margins = sorted(r.resale_cents - r.purchase_cents for r in rows)
+    listed = sum(r.decision != "unprofitable" for r in rows)
+    return {
+        "offers": len(rows),
+        "listed": listed,
+        "avg_margin_cents": sum(margins) / len(rows),
+        "p50_margin_cents": margins[(len(rows) - 1) // 2],
+        "p95_margin_cents": margins[int(0.95 * (len(rows) - 1))],
+    }
+
+
+def test_append_reopen_and_crash_recovery(tmp_path):
+    path = str(tmp_path / "deals")
+    log = DealLog(path)
+    assert log.append_many(_rows(10)) == 10
+    log.close()
+
+    # A crash after writing only some columns of a batch.
+    with open(os.path.join(path, "timestamp.col"), "ab") as f:
+        f.write(b"\0" * 8 * 3)
+    with open(os.path.join(path, "products.jsonl"), "a") as f:
+        f.write('[1, "torn')
+    log = DealLog(path)
+    assert len(log) == 10 and len(log.products) == 10
+    assert os.path.getsize(os.path.join(path, "timestamp.col")) == 80
+    log.append_many(_rows(5, seed=8))
+    columns = log.columns()
+    assert len(columns["decision"]) == 15
+    assert list(columns["purchase_cents"][:10]) == [r.purchase_cents for r in _rows(10)]
+    assert log.products[deal_log.product_id("p3")] == "p3"
+    log.close()
+
+
+def test_corrupt_product_lines_are_skipped_not_truncated(tmp_path):
+    path = str(tmp_path / "deals")
+    log = DealLog(path)
+    log.append_many(_rows(20)[:3])
+    log.close()
+    products = os.path.join(path, "products.jsonl")
+    lines = open(products).readlines()
+    lines.insert(1, "not json\n")
+    with open(products, "w") as f:
+        f.writelines(lines + ['[7, "p'])
+
+    log = DealLog(path)
+    assert log.corrupt_products == 1
+    assert sorted(log.products.values()) == ["p0", "p1", "p2"]
+    assert open(products).read() == "".join(lines)
+    log.close()
+
+
+@pytest.mark.parametrize("numpy", [False, True])
+def test_statistics_match_brute_force(tmp_path, monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(deal_log, "np", None)
+    path = str(tmp_path / "deals")
+    rows = _rows(2000)
+    log = DealLog(path)
+    log.append_many(rows)
+    log.close()
+
+    stats = agent_eval.deal_statistics(path)
+    for key, value in _expected(rows).items():
+        assert stats[key] == pytest.approx(value), key
+    assert sum(stats[f"{d}_offers"] for d in DECISIONS) == 2000
+    assert stats["hit_rate"] == pytest.approx(stats["listed"] / 2000)
+    assert agent_eval.deal_statistics(path, since=1000.0 + 1500)["offers"] == 500
+
+    products = agent_eval.product_statistics(path)
+    assert len(products) == 17 and sum(p.offers for p in products) == 2000
+    p3 = next(p for p in products if p.product == "p3")
+    mine = [r for r in rows if r.product == "p3"]
+    assert p3.offers == len(mine)
+    assert p3.listed == sum(r.decision != "unprofitable" for r in mine)
+    assert p3.min_competitor_cents == min(r.competitor_cents for r in mine)
+    assert p3.last_competitor_cents == mine[-1].competitor_cents
+    assert p3.avg_margin_cents == pytest.approx(sum(r.resale_cents - r.purchase_cents for r in mine) / len(mine))
+    assert agent_eval.product_statistics(path, top=2) == products[:2]
+
+    edges = [-1000, 0, 1000, 2001]
+    counts = agent_eval.margin_histogram(edges, path)
+    margins = [r.resale_cents - r.purchase_cents for r in rows]
+    assert counts == [sum(lo <= m < hi for m in margins) for lo, hi in zip(edges, edges[1:])]
+
+
+def test_missing_log_is_empty(tmp_path):
+    path = str(tmp_path / "none")
+    assert agent_eval.deal_statistics(path) == {}
+    assert agent_eval.product_statistics(path) == []
+    assert agent_eval.margin_histogram([0, 1], path) == [0]
+
+
+def test_run_logs_every_evaluated_offer(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+    monkeypatch.setattr(
+        amazon_api,
+        "get_recent_orders",
+        lambda: [{"name": "Lamp", "price": "€10.00"}, {"name": "Desk", "price": "€50.00"}],
+    )
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€30.00"})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: None)
+
+    log = DealLog(str(tmp_path / "deals"))
+    Orchestrator(Memory(str(tmp_path / "memory.json")), deal_log=log).run()
+    log.close()
+    products = {p.product: p for p in agent_eval.product_statistics(str(tmp_path / "deals"))}
+    lamp, desk = products[PriceCache.key_for("Lamp")], products[PriceCache.key_for("Desk")]
+    assert (lamp.listed, desk.listed) == (1, 0)
+    assert lamp.avg_margin_cents == 3450 - 1000 and lamp.last_competitor_cents == 3000
+
+    ui.main(["stats"])
+    out = capsys.readouterr().out
+    assert "Deal log:\noffers: 2\nlisted: 1\nhit_rate: 0.5\n" in out
+    db.close_all()
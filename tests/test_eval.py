@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import eval as agent_eval
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.initialize_db()
+    yield path
+    db.close_all()
+
+
+def _record(*offers):
+    now = datetime.datetime.now().isoformat()
+    db.insert_runs([(now, i, i % 3) for i in offers])
+
+
+def _statistics(db_path, **kwargs):
+    aggregator = agent_eval.MetricsAggregator(db_path, **kwargs)
+    aggregator.refresh()
+    return aggregator.summary()
+
+
+def test_statistics_match_full_scan(db_path):
+    _record(*range(50))
+    db.insert_metrics(7, 0.5)  # a legacy row, not a run
+    stats = _statistics(db_path)
+    assert stats["runs"] == 50
+    assert stats["avg_offers_evaluated"] == sum(range(50)) / 50
+    assert stats["avg_listings_created"] == sum(i % 3 for i in range(50)) / 50
+    assert stats["last_24h_runs"] == 50
+    assert stats["last_50_runs_avg_offers_evaluated"] == pytest.approx(24.5)
+    assert stats["p50_offers_evaluated"] == pytest.approx(24.5, rel=0.05)
+    assert stats["p99_offers_evaluated"] == pytest.approx(48.5, rel=0.05)
+
+
+def test_only_new_runs_are_read(db_path, monkeypatch):
+    _record(1)
+    _statistics(db_path)
+    last_id = agent_eval.MetricsAggregator(db_path).last_id
+
+    _record(3)
+    parsed = []
+    original_add = agent_eval.MetricsAggregator.add
+    monkeypatch.setattr(
+        agent_eval.MetricsAggregator, "add",
+        lambda self, row: (parsed.append(row), original_add(self, row)),
+    )
+    stats = _statistics(db_path)
+    assert len(parsed) == 1
+    assert stats["runs"] == 2
+    assert stats["avg_offers_evaluated"] == 2
+    assert agent_eval.MetricsAggregator(db_path).last_id > last_id
+    assert _statistics(db_path) == stats and len(parsed) == 1
+
+
+def test_rolling_windows(db_path):
+    aggregator = agent_eval.MetricsAggregator(db_path, window_runs=3)
+    now = datetime.datetime(2025, 1, 2, 12, 0)
+    for hours_ago, offers in [(30, 100), (2, 10), (1, 20), (0, 30)]:
+        ts = (now - datetime.timedelta(hours=hours_ago)).isoformat()
+        aggregator.add({"timestamp": ts, "offers_evaluated": offers, "listings_created": 0})
+    stats = aggregator.summary(now=now.timestamp())
+    assert stats["avg_offers_evaluated"] == 40
+    assert stats["last_3_runs_avg_offers_evaluated"] == 20
+    assert stats["last_24h_runs"] == 3
+    assert stats["last_24h_avg_offers_evaluated"] == 20
+
+
+def test_checkpoint_is_rebuilt_for_other_windows_and_lost_runs(db_path):
+    _record(*range(5))
+    assert _statistics(db_path)["last_5_runs_avg_offers_evaluated"] == 2
+    assert _statistics(db_path, window_runs=2)["last_2_runs_avg_offers_evaluated"] == 3.5
+
+    with db.get_manager().transaction() as conn:
+        conn.execute("DELETE FROM metrics")
+    assert _statistics(db_path) == {}
+    _record(7)
+    stats = _statistics(db_path)
+    assert stats["runs"] == 1
+    assert stats["avg_offers_evaluated"] == 7
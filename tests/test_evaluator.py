@@ -0,0 +1,56 @@
+import random
+from array import array
+
+import pytest
+
+from shopping_agent.evaluator import BatchEvaluator
+from shopping_agent.pipeline import Pipeline, Stage
+
+
+def test_matches_per_item_rule():
+    rng = random.Random(1)
+    purchase = array("q", (rng.randrange(100, 50_000) for _ in range(1000)))
+    competitor = array("q", (rng.randrange(100, 50_000) for _ in range(1000)))
+    result = BatchEvaluator(0.15).evaluate(purchase, competitor)
+    for i in range(1000):
+        target = (competitor[i] * 11_500 + 5_000) // 10_000
+        assert result.target_prices[i] == target
+        assert result.mask[i] == (target > purchase[i])
+    assert list(result.selected()) == [i for i in range(1000) if result.mask[i]]
+
+
+def test_category_margins_fees_and_shipping():
+    evaluator = BatchEvaluator(
+        0.10, category_margins={"consoles": 0.30}, fee_rate=0.10, shipping_cost=500
+    )
+    result = evaluator.evaluate([10_000] * 3, [10_000] * 3, ["consoles", "books", None])
+    assert list(result.target_prices) == [13_000, 11_000, 11_000]
+    # 130 * 0.9 - 5 = 112 ; 110 * 0.9 - 5 = 94
+    assert list(result.margins) == [1_200, -600, -600]
+    assert result.mask == b"\x01\x00\x00"
+
+
+def test_column_lengths_must_match():
+    with pytest.raises(ValueError):
+        BatchEvaluator().evaluate([100], [100, 200])
+
+
+def test_margins_are_exact_in_cents():
+    # 0.1 + 0.2 style drift: 19.99 * 1.15 = 22.9885 rounds to 22.99
+    result = BatchEvaluator(0.15).evaluate([2_299], [1_999])
+    assert result.target_prices[0] == 2_299
+    assert result.margins[0] == 0
+    assert result.mask == b"\x00"
+
+
+def test_batch_stage_receives_lists():
+    sizes = []
+
+    def batch_fn(batch):
+        sizes.append(len(batch))
+        return [x * 10 for x in batch]
+
+    out = list(Pipeline(range(100), [Stage("batch", batch_fn, batch_size=16)], queue_size=64))
+    assert sorted(out) == [x * 10 for x in range(100)]
+    assert max(sizes) <= 16
+    assert sum(sizes) == 100
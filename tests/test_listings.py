@@ -0,0 +1,229 @@
+import urllib.error
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.cache import PriceCache
+from shopping_agent.listings import ActiveListing, ListingIndex, listing_stats
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, client, ebay_api, email, idealo_api
+from shopping_agent.tools.ebay_server import StandInServer
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    client.reset()
+    client.configure("ebay", backoff_base=0.001)
+    with StandInServer() as server:
+        monkeypatch.setattr(ebay_api, "BASE_URL", server.url)
+        yield server
+    client.reset()
+
+
+def _stub_tools(monkeypatch, orders, prices, sent):
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: orders)
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(
+        idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": prices[name]}
+    )
+    monkeypatch.setattr(email, "send_email", lambda subject, body, **kwargs: sent.append(body))
+
+
+def test_bulk_calls_over_http_are_idempotent(server):
+    first = ebay_api.create_listings([
+        {"sku": "a", "item_name": "A", "purchase_price": "€1.00", "resale_price": "€2.00"},
+        {"sku": "b", "item_name": "B", "purchase_price": "€1.00", "resale_price": "€2.00"},
+    ])
+    assert [r["status"] for r in first] == ["created", "created"]
+    again = ebay_api.create_listings(
+        [{"sku": "a", "item_name": "A", "purchase_price": "€1.00", "resale_price": "€2.00"}]
+    )
+    assert again[0]["status"] == "exists" and again[0]["listing_id"] == first[0]["listing_id"]
+    assert len(server.listings) == 2
+
+    (updated,) = ebay_api.update_prices([{"listing_id": first[1]["listing_id"], "resale_price": "€3.00"}])
+    assert updated["status"] == "updated" and server.listings[updated["listing_id"]]["resale_price"] == "€3.00"
+    (missing,) = ebay_api.update_prices([{"listing_id": "nope", "resale_price": "€3.00"}])
+    assert missing["status"] == "error"
+
+    too_many = [{"sku": str(i)} for i in range(ebay_api.BULK_LIMIT + 1)]
+    with pytest.raises(urllib.error.HTTPError):
+        ebay_api.create_listings(too_many)
+
+
+def test_mock_bulk_create_is_idempotent_by_sku():
+    ebay_api.reset()
+    request = {"sku": "mock-a", "item_name": "A", "purchase_price": "€1.00", "resale_price": "€2.00"}
+    (first,) = ebay_api.create_listings([request])
+    ebay_api.update_prices([{"listing_id": first["listing_id"], "resale_price": "€3.00"}])
+    (again,) = ebay_api.create_listings([dict(request, resale_price="€4.00")])
+    assert (first["status"], again["status"]) == ("created", "exists")
+    assert again["listing_id"] == first["listing_id"] and again["resale_price"] == "€3.00"
+    ebay_api.reset()
+    assert ebay_api.create_listings([request])[0]["status"] == "created"
+    ebay_api.reset()
+
+
+def test_runs_list_in_bulk_and_reprice_only_changes(monkeypatch, tmp_path, db_path, server):
+    orders = [{"name": f"Item {i}", "price": "€10.00"} for i in range(30)]
+    prices = {order["name"]: "€30.00" for order in orders}
+    sent = []
+    _stub_tools(monkeypatch, orders, prices, sent)
+    mem = Memory(str(tmp_path / "memory.json"))
+    orchestrator = Orchestrator(mem, listings=ListingIndex(db_path))
+
+    orchestrator.run()
+    assert sorted(n for path, n in server.calls) == [5, 25]
+    assert len(server.listings) == 30
+    assert mem.recent_episodes(1)[0].listings_created == 30
+
+    # Unchanged prices: no eBay calls, no new listings.
+    server.calls.clear()
+    orchestrator.run()
+    assert server.calls == []
+    assert mem.recent_episodes(1)[0].offers_unchanged == 30
+    assert "30 items were unchanged" in sent[-1]
+
+    prices["Item 3"] = "€40.00"
+    orchestrator.run()
+    assert server.calls == [("/listings/bulk_update_price", 1)]
+    assert len(server.listings) == 30
+    episode = mem.recent_episodes(1)[0]
+    assert (episode.listings_updated, episode.offers_unchanged) == (1, 29)
+    assert "1 active listings were repriced." in sent[-1]
+    key = PriceCache.key_for("Item 3")
+    assert ListingIndex(db_path).fetch([key])[key].resale_cents == 4600
+    assert listing_stats(db_path) == {"active_listings": 30}
+
+
+def test_lost_index_does_not_duplicate_and_throttling_is_retried(monkeypatch, tmp_path, db_path, server):
+    orders = [{"name": "Lamp", "price": "€10.00"}]
+    sent = []
+    _stub_tools(monkeypatch, orders, {"Lamp": "€30.00"}, sent)
+    Orchestrator(Memory(str(tmp_path / "a.json")), listings=ListingIndex(db_path)).run()
+    (listing_id,) = server.listings
+
+    # A fresh index (e.g. a crash before recording) finds the listing by SKU.
+    server.throttle(2)
+    other = str(tmp_path / "other.db")
+    mem = Memory(str(tmp_path / "b.json"))
+    Orchestrator(mem, listings=ListingIndex(other)).run()
+    assert list(server.listings) == [listing_id]
+    assert "1 items were unchanged" in sent[-1]
+    assert mem.recent_episodes(1)[0].listings_created == 0
+    assert client.metrics()["ebay"]["throttled"] == 2
+    key = PriceCache.key_for("Lamp")
+    assert ListingIndex(other).fetch([key])[key].listing_id == listing_id
+
+
+def test_existing_listing_at_another_price_is_repriced(monkeypatch, tmp_path, db_path, server):
+    sent = []
+    _stub_tools(monkeypatch, [{"name": "Lamp", "price": "€10.00"}], {"Lamp": "€30.00"}, sent)
+    Orchestrator(Memory(str(tmp_path / "a.json")), listings=ListingIndex(db_path)).run()
+    (listing_id,) = server.listings
+
+    # The index is lost and the price has changed since the listing was made.
+    _stub_tools(monkeypatch, [{"name": "Lamp", "price": "€10.00"}], {"Lamp": "€40.00"}, sent)
+    other = str(tmp_path / "other.db")
+    mem = Memory(str(tmp_path / "b.json"))
+    server.calls.clear()
+    Orchestrator(mem, listings=ListingIndex(other)).run()
+    assert server.calls == [("/listings/bulk_create", 1), ("/listings/bulk_update_price", 1)]
+    episode = mem.recent_episodes(1)[0]
+    assert (episode.listings_created, episode.listings_updated) == (0, 1)
+    key = PriceCache.key_for("Lamp")
+    assert ListingIndex(other).fetch([key])[key][1:3] == (listing_id, 4600)
+    assert server.listings[listing_id]["resale_price"] == "€46.00"
+
+
+def test_failed_listings_are_skipped_and_not_recorded(monkeypatch, tmp_path, db_path):
+    orders = [{"name": "Lamp", "price": "€10.00"}, {"name": "Desk", "price": "€10.00"}]
+    sent = []
+    _stub_tools(monkeypatch, orders, {"Lamp": "€30.00", "Desk": "€30.00"}, sent)
+    monkeypatch.setattr(
+        ebay_api,
+        "create_listings",
+        lambda listings: [
+            {"sku": listing["sku"], "status": "error", "error": "policy"}
+            if listing["item_name"] == "Desk"
+            else {"sku": listing["sku"], "listing_id": "L1", "status": "created"}
+            for listing in listings
+        ],
+    )
+    mem = Memory(str(tmp_path / "memory.json"))
+    index = ListingIndex(db_path)
+    Orchestrator(mem, listings=index).run()
+
+    episode = mem.recent_episodes(1)[0]
+    assert (episode.listings_created, episode.offers_skipped) == (1, 1)
+    assert episode.notes == ["listing failed for Desk: policy"]
+    keys = [PriceCache.key_for("Lamp"), PriceCache.key_for("Desk")]
+    assert index.fetch(keys).keys() == {keys[0]}
+
+
+def test_ended_listings_are_relisted(monkeypatch, tmp_path, db_path, server):
+    orders = [{"name": "Lamp", "price": "€10.00"}, {"name": "Desk", "price": "€10.00"}]
+    prices = {"Lamp": "€30.00", "Desk": "€30.00"}
+    sent = []
+    _stub_tools(monkeypatch, orders, prices, sent)
+    mem = Memory(str(tmp_path / "memory.json"))
+    index = ListingIndex(db_path)
+    Orchestrator(mem, listings=index).run()
+    lamp = PriceCache.key_for("Lamp")
+    sold = index.fetch([lamp])[lamp].listing_id
+    server.end(sold)
+
+    prices["Lamp"] = prices["Desk"] = "€40.00"
+    server.calls.clear()
+    Orchestrator(mem, listings=index).run()
+    assert server.calls == [("/listings/bulk_update_price", 2), ("/listings/bulk_create", 1)]
+    episode = mem.recent_episodes(1)[0]
+    assert (episode.listings_created, episode.listings_updated, episode.offers_skipped) == (1, 1, 0)
+    relisted = index.fetch([lamp])[lamp]
+    assert relisted.listing_id != sold and relisted.listing_id in server.listings
+    assert relisted.resale_cents == 4600
+
+
+def test_short_bulk_responses_fail_the_batch(monkeypatch, tmp_path, db_path):
+    orders = [{"name": "Lamp", "price": "€10.00"}, {"name": "Desk", "price": "€10.00"}]
+    _stub_tools(monkeypatch, orders, {"Lamp": "€30.00", "Desk": "€30.00"}, [])
+    monkeypatch.setattr(
+        ebay_api,
+        "create_listings",
+        lambda listings: [{"sku": listings[0]["sku"], "listing_id": "L1", "status": "created"}],
+    )
+    mem = Memory(str(tmp_path / "memory.json"))
+    index = ListingIndex(db_path)
+    Orchestrator(mem, listings=index).run()
+
+    episode = mem.recent_episodes(1)[0]
+    assert (episode.listings_created, episode.offers_skipped) == (0, 2)
+    assert "1 responses to 2 requests" in episode.notes[0]
+    assert index.stats() == {"active_listings": 0}
+
+
+def test_index_record_fetch_remove(db_path):
+    index = ListingIndex(db_path)
+    index.record([ActiveListing("a", "L1", 100, 1.0), ActiveListing("b", "L2", 200, 1.0)])
+    index.record([ActiveListing("a", "L1", 150, 2.0)])
+    assert index.fetch(["a", "c"]) == {"a": ActiveListing("a", "L1", 150, 2.0)}
+    index.remove(["a"])
+    assert index.stats() == {"active_listings": 1}
+
+
+def test_ui_stats_reports_active_listings(monkeypatch, tmp_path, db_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    ListingIndex(db_path).record([ActiveListing("a", "L1", 100, 1.0)])
+    ui.main(["stats"])
+    assert "Active listings:\nactive_listings: 1" in capsys.readouterr().out
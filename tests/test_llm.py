@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import main
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.llm import CompletionCache, LLMClient, LocalBackend, stored_completions
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+def test_completions_are_cached_by_prompt_message_and_params(db_path):
+    backend = LocalBackend()
+    llm = LLMClient("system", backend, CompletionCache(db_path=db_path))
+    assert llm.complete("hi") == "[LLM Stub] You said: hi"
+    assert llm.complete("hi") == "[LLM Stub] You said: hi"
+    llm.complete("hi", temperature=0.7)
+    LLMClient("other system", backend).complete("hi")
+    assert backend.requests == [1, 1, 1]
+
+    stats = llm.stats()
+    assert (stats["calls"], stats["hits"], stats["misses"]) == (3, 1, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+    assert stats["avg_latency"] > 0 and stats["p95_latency"] > 0
+
+    # A new process reads the completions back from disk.
+    again = LLMClient("system", backend, CompletionCache(db_path=db_path))
+    assert again.complete("hi", temperature=0.7).endswith("hi")
+    assert again.stats()["disk_hits"] == 1 and backend.requests == [1, 1, 1]
+    assert stored_completions(db_path) == {"stored_completions": 2}
+
+
+def test_lru_eviction_in_memory_and_on_disk(db_path):
+    cache = CompletionCache(max_entries=2, db_path=db_path, max_stored=3)
+    cache.put_many([("a", "A"), ("b", "B"), ("c", "C")])
+    assert len(cache) == 2
+    assert cache.get("a") == ("A", True)  # reloaded from disk, now most recent
+    cache.put_many([("d", "D")])
+    assert cache.evictions == 1
+    assert stored_completions(db_path) == {"stored_completions": 3}
+    assert CompletionCache(db_path=db_path).get("b") == (None, False)
+
+
+def test_concurrent_calls_are_micro_batched():
+    backend = LocalBackend(latency=0.01)
+    llm = LLMClient("system", backend, max_batch=8, batch_window=0.2)
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def ask(i):
+        barrier.wait()
+        results[i] = llm.complete(f"item {i % 6}")
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: f"[LLM Stub] You said: item {i % 6}" for i in range(8)}
+    # Six distinct prompts in one request; the two repeats were coalesced
+    # (or, if they arrived after the batch, answered from the cache).
+    assert backend.requests == [6]
+    stats = llm.stats()
+    assert stats["coalesced"] + stats["hits"] == 2 and stats["batches"] == 1
+
+
+def test_complete_many_chunks_requests_and_skips_cached():
+    backend = LocalBackend()
+    llm = LLMClient("system", backend, max_batch=4)
+    llm.complete("m0")
+    answers = llm.complete_many([f"m{i}" for i in range(10)] + ["m1"])
+    assert answers[3] == "[LLM Stub] You said: m3" and answers[-1] == answers[1]
+    assert backend.requests == [1, 4, 4, 1]
+
+
+def test_stream_yields_chunks_and_caches_complete_streams():
+    backend = LocalBackend(chunk_size=4)
+    llm = LLMClient("system", backend)
+    chunks = list(llm.stream("hello"))
+    assert len(chunks) > 1 and "".join(chunks) == "[LLM Stub] You said: hello"
+    assert list(llm.stream("hello")) == ["[LLM Stub] You said: hello"]
+    assert "llm.first_chunk" in llm.telemetry.stats()
+
+    # An abandoned stream is not cached.
+    next(llm.stream("bye"))
+    assert llm.complete("bye") == "[LLM Stub] You said: bye"
+    assert backend.requests == [1, 1, 1]
+
+
+def test_backend_errors_reach_every_waiter():
+    class Failing:
+        def complete(self, system, messages, params):
+            raise ConnectionError("down")
+
+    llm = LLMClient("system", Failing())
+    with pytest.raises(ConnectionError):
+        llm.complete("hi")
+    with pytest.raises(ConnectionError):
+        llm.complete("hi")  # failures are not cached
+
+
+def test_main_llm_delegates_to_client(db_path, capsys, monkeypatch, tmp_path):
+    llm = main.LLM("system")
+    assert llm.call("What should I do today?") == "[LLM Stub] You said: What should I do today?"
+    assert llm.call_many(["a", "b"]) == ["[LLM Stub] You said: a", "[LLM Stub] You said: b"]
+    assert "".join(llm.stream("a")) == "[LLM Stub] You said: a"
+    assert llm.client.stats()["hits"] == 1
+
+    main.LLM("system", cache_path=db_path).call("cached")
+    monkeypatch.chdir(tmp_path)
+    ui.main(["stats"])
+    assert "LLM cache:\nstored_completions: 1" in capsys.readouterr().out
@@ -0,0 +1,72 @@
+import json
+import os
+
+from shopping_agent.memory import Episode, EpisodeLog, Memory
+
+
+def _run(mem, n, start=0):
+    for i in range(start, start + n):
+        ep = mem.start_episode(f"t{i}")
+        ep.offers_evaluated = i
+        mem.end_episode(ep)
+
+
+def test_episodes_append_and_reload(tmp_path):
+    path = str(tmp_path / "memory.json")
+    mem = Memory(path)
+    _run(mem, 3)
+    mem.close()
+    with open(tmp_path / "memory.jsonl") as f:
+        assert len(f.readlines()) == 3
+
+    reloaded = Memory(path)
+    assert reloaded._history is None  # nothing read until needed
+    assert [ep.offers_evaluated for ep in reloaded.recent_episodes(2)] == [1, 2]
+    assert [ep.timestamp for ep in reloaded.episodes] == ["t0", "t1", "t2"]
+
+
+def test_legacy_memory_json_is_migrated(tmp_path):
+    legacy = tmp_path / "memory.json"
+    legacy.write_text(json.dumps({"episodes": [
+        {"timestamp": "old", "offers_evaluated": 4, "listings_created": 1, "notes": []}
+    ]}))
+    mem = Memory(str(legacy))
+    assert not legacy.exists()
+    assert (tmp_path / "memory.json.migrated").exists()
+    _run(mem, 1)
+    assert [ep.timestamp for ep in Memory(str(legacy)).episodes] == ["old", "t0"]
+
+
+def test_partial_record_is_ignored_and_truncated(tmp_path):
+    path = tmp_path / "memory.jsonl"
+    mem = Memory(str(path))
+    _run(mem, 2)
+    mem.close()
+    with open(path, "ab") as f:
+        f.write(b'{"timestamp": "torn", "offers_ev')
+    mem = Memory(str(path))
+    assert [ep.timestamp for ep in mem.recent_episodes(5)] == ["t0", "t1"]
+    _run(mem, 1, start=2)
+    assert [ep.timestamp for ep in EpisodeLog(str(path)).read_all()] == ["t0", "t1", "t2"]
+
+
+def test_tail_reads_across_blocks(tmp_path, monkeypatch):
+    import shopping_agent.memory as memory_module
+
+    monkeypatch.setattr(memory_module, "_TAIL_BLOCK", 16)
+    log = EpisodeLog(str(tmp_path / "log.jsonl"), fsync=False)
+    for i in range(20):
+        log.append(Episode(timestamp=f"t{i}"))
+    assert [ep.timestamp for ep in log.tail(3)] == ["t17", "t18", "t19"]
+    assert len(log.tail(100)) == 20
+
+
+def test_background_compaction_keeps_latest(tmp_path):
+    path = str(tmp_path / "memory.jsonl")
+    mem = Memory(path, max_episodes=5, compact_every=10, fsync=False)
+    _run(mem, 10)
+    mem.log.close()  # waits for the compactor
+    _run(mem, 2, start=10)
+    timestamps = [ep.timestamp for ep in EpisodeLog(path).read_all()]
+    assert timestamps == ["t5", "t6", "t7", "t8", "t9", "t10", "t11"]
+    assert not os.path.exists(path + ".compact")
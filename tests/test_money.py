@@ -0,0 +1,42 @@
+import pytest
+
+from shopping_agent.money import format_eur, parse_cents, scale, to_cents
+
+
+@pytest.mark.parametrize(
+    "text, cents",
+    [
+        ("€25.00", 2500),
+        ("25,00 €", 2500),
+        ("1.299,00 €", 129900),
+        ("1,299.99", 129999),
+        ("EUR 25", 2500),
+        ("25 EUR", 2500),
+        ("1 299,95 €", 129995),
+        ("1.299", 129900),
+        ("1.234.567", 123456700),
+        ("50.0", 5000),
+        ("9,9", 990),
+        ("25.-", 2500),
+        ("25,-", 2500),
+        ("12.3456", 1235),
+        ("-€3.50", -350),
+    ],
+)
+def test_parse_cents(text, cents):
+    assert parse_cents(text) == cents
+
+
+@pytest.mark.parametrize("text", ["", "€", "n/a", "PlayStation 5"])
+def test_parse_cents_rejects_non_prices(text):
+    assert parse_cents(text) is None
+
+
+def test_conversions_and_formatting():
+    assert to_cents(499.0) == 49900
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents("€8.00") == 800
+    assert to_cents(None) is None
+    assert format_eur(2299) == "€22.99"
+    assert format_eur(-5) == "-€0.05"
+    assert scale(1999, 11_500) == 2299
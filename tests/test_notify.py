@@ -0,0 +1,243 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import notify, ui
+from shopping_agent.memory import Memory
+from shopping_agent.notify import (
+    MAX_ATTEMPTS,
+    RETRY_DELAY,
+    RETRY_MAX_DELAY,
+    Notifier,
+    SMTPTransport,
+    outbox_stats,
+)
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, idealo_api, email, ebay_api
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.wfile.write(b"220 localhost stand-in SMTP\r\n")
+        data, in_data = [], False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line == b".\r\n":
+                    with server.lock:
+                        server.messages.append(b"".join(data).decode())
+                    data, in_data = [], False
+                    self.wfile.write(b"250 queued\r\n")
+                    if server.drop_after_message:
+                        return
+                else:
+                    data.append(line[1:] if line.startswith(b"..") else line)
+                continue
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self.wfile.write(b"250-localhost\r\n250 8BITMIME\r\n")
+            elif verb in (b"HELO", b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self.wfile.write(b"250 OK\r\n")
+            elif verb == b"DATA":
+                in_data = True
+                self.wfile.write(b"354 go ahead\r\n")
+            elif verb == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"502 not implemented\r\n")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.messages = []
+    server.drop_after_message = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _Recorder:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.fail = fail
+
+    def send(self, recipients, subject, body):
+        if self.fail:
+            raise ConnectionRefusedError("mail server down")
+        self.sent.append((recipients, subject, body))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+def test_smtp_delivery_reuses_one_connection(smtp_server, db_path):
+    transport = SMTPTransport("127.0.0.1", smtp_server.server_address[1])
+    notifier = Notifier(db_path, transport)
+    for i in range(3):
+        notifier.enqueue(f"Report {i}", f"Body {i}\n.leading dot", ["user@example.com"], deals=1)
+    assert notifier.send_due() == 3
+    notifier.stop()
+
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 3
+    assert "Subject: Report 0" in smtp_server.messages[0]
+    assert "\n.leading dot" in smtp_server.messages[0]
+    stats = outbox_stats(db_path)
+    assert stats["sent"] == 3 and stats["pending"] == 0
+    assert stats["latency_p50_sec"] is not None
+    assert notifier.stats()["messages_per_sec"] > 0
+
+
+def test_smtp_reconnects_when_server_drops_connection(smtp_server, db_path):
+    smtp_server.drop_after_message = True
+    transport = SMTPTransport("127.0.0.1", smtp_server.server_address[1])
+    notifier = Notifier(db_path, transport)
+    notifier.enqueue("First", "a", ["user@example.com"])
+    notifier.enqueue("Second", "b", ["user@example.com"])
+    assert notifier.send_due() == 2
+    assert transport.connections_opened == 2
+    assert len(smtp_server.messages) == 2
+
+
+def test_digest_coalesces_reports_per_window(db_path):
+    now = [1000.0]
+    transport = _Recorder()
+    notifier = Notifier(db_path, transport, digest_window=60, clock=lambda: now[0])
+    for i, deals in enumerate((2, 0, 3)):
+        now[0] = 1000.0 + i * 10
+        notifier.enqueue(f"Run {i}", f"deals: {deals}", ["user@example.com"], deals=deals)
+    now[0] = 1030.0
+    assert notifier.send_due() == 0
+    now[0] = 1061.0
+    assert notifier.send_due() == 1
+    (recipients, subject, body), = transport.sent
+    assert recipients == ["user@example.com"]
+    assert subject == "Shopping Agent digest: 5 deals from 3 runs"
+    assert body.index("Run 0") < body.index("Run 1") < body.index("Run 2")
+    assert notifier.send_due() == 0
+    stats = notifier.stats()
+    assert stats["notifications_sent"] == 3
+    # Latencies are 61s, 51s and 41s from enqueue to delivery.
+    assert stats["latency_p50_sec"] == pytest.approx(51.0, rel=0.02)
+
+
+def test_outbox_survives_restart_and_failures(db_path):
+    Notifier(db_path, _Recorder(fail=True)).enqueue("Report", "body", ["user@example.com"])
+    failing = Notifier(db_path, _Recorder(fail=True))
+    assert failing.send_due() == 0
+    assert outbox_stats(db_path)["pending"] == 1
+
+    transport = _Recorder()
+    later = time.time() + RETRY_DELAY
+    assert Notifier(db_path, transport).send_due() == 0  # still backing off
+    assert Notifier(db_path, transport, clock=lambda: later).send_due() == 1
+    assert transport.sent[0][1] == "Report"
+
+    Notifier(db_path, _Recorder()).enqueue("Doomed", "body", ["user@example.com"])
+    now = [time.time()]
+    failing = Notifier(db_path, _Recorder(fail=True), clock=lambda: now[0])
+    for _ in range(MAX_ATTEMPTS + 1):
+        failing.send_due()
+        now[0] += RETRY_MAX_DELAY
+    assert failing.failures == MAX_ATTEMPTS
+    stats = outbox_stats(db_path)
+    assert stats["dead"] == 1 and stats["pending"] == 0
+
+
+def test_run_does_not_wait_for_delivery(monkeypatch, tmp_path, db_path):
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "Item", "price": "€10.00"}])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€30.00"})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    sync_calls = []
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: sync_calls.append(args))
+
+    release = threading.Event()
+    delivered = []
+
+    class Blocking(_Recorder):
+        def send(self, recipients, subject, body):
+            release.wait(5)
+            delivered.append(subject)
+
+    notifier = Notifier(db_path, Blocking(), poll_interval=0.01)
+    notifier.start()
+    Orchestrator(Memory(str(tmp_path / "memory.json")), notifier=notifier).run()
+    # The run has returned while the sender is still blocked on delivery.
+    assert delivered == [] and sync_calls == []
+    release.set()
+    deadline = time.monotonic() + 5
+    while not delivered and time.monotonic() < deadline:
+        time.sleep(0.01)
+    notifier.stop()
+    assert delivered == ["Shopping Agent Report: Deals Available"]
+    assert notifier.stats()["latency_p50_sec"] is not None
+
+
+def test_failed_deliveries_back_off_exponentially(db_path):
+    now = [1000.0]
+    transport = _Recorder(fail=True)
+    notifier = Notifier(db_path, transport, clock=lambda: now[0])
+    notifier.enqueue("Report", "body", ["user@example.com"])
+    attempts = []
+    for _ in range(int(4 * RETRY_DELAY)):
+        if notifier.send_due() == 0 and notifier.failures > len(attempts):
+            attempts.append(now[0] - 1000.0)
+        now[0] += 1.0
+    # Tried at once, then after 30s and after a further 60s.
+    assert attempts == [0.0, RETRY_DELAY, 3 * RETRY_DELAY]
+
+    transport.fail = False
+    now[0] = 1000.0 + 7 * RETRY_DELAY
+    assert notifier.send_due() == 1
+
+
+def test_throughput_is_measured_over_wall_time(db_path):
+    notifier = Notifier(db_path, _Recorder())
+    notifier.enqueue("First", "a", ["user@example.com"])
+    notifier.send_due()
+    time.sleep(0.2)
+    notifier.enqueue("Second", "b", ["user@example.com"])
+    notifier.send_due()
+    assert 0 < notifier.stats()["messages_per_sec"] <= 2 / 0.2
+
+
+def test_ui_run_delivers_from_the_sender_thread(monkeypatch, tmp_path, db_path):
+    monkeypatch.chdir(tmp_path)
+    started = []
+    start = Notifier.start
+    monkeypatch.setattr(notify.Notifier, "start", lambda self: started.append(self) or start(self))
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: None)
+
+    ui.main(["run", "--no-cache"])
+    assert len(started) == 1 and started[0]._thread is None
+    assert outbox_stats(db_path)["sent"] == 1
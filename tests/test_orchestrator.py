@@ -0,0 +1,268 @@
+import threading
+import time
+
+from shopping_agent.tools import amazon_api, idealo_api, email, ebay_api
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+
+
+def _stub_tools(monkeypatch, orders, lookup):
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: orders)
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda title, purchase_price, resale_price: {
+        "listing_id": f"id-{title}",
+        "title": title,
+        "purchase_price": purchase_price,
+        "resale_price": resale_price,
+        "status": "listed",
+    })
+    monkeypatch.setattr(email, "send_email", lambda subject, body, recipients=None: None)
+
+
+def test_concurrent_lookups_match_sequential(monkeypatch, tmp_path):
+    orders = [{"name": f"Item {i}", "price": 10.0 + i} for i in range(40)]
+    _stub_tools(monkeypatch, orders, lambda name: {"vendor": "V", "price": "€30.00"})
+
+    results = []
+    for concurrency in (1, 8):
+        mem = Memory(str(tmp_path / f"memory-{concurrency}.json"))
+        Orchestrator(mem, max_concurrency=concurrency).run()
+        ep = mem.episodes[-1]
+        results.append((ep.offers_evaluated, ep.listings_created, ep.offers_skipped))
+    # 34.50 target beats purchase prices 10.00..34.00
+    assert results[0] == results[1] == (40, 25, 0)
+
+
+def test_lookups_run_in_parallel_and_bounded(monkeypatch, tmp_path):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def lookup(name):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return {"vendor": "V", "price": "€5.00"}
+
+    orders = [{"name": f"Item {i}", "price": 1.0} for i in range(32)]
+    _stub_tools(monkeypatch, orders, lookup)
+    mem = Memory(str(tmp_path / "memory.json"))
+    start = time.monotonic()
+    Orchestrator(mem, max_concurrency=4).run()
+    elapsed = time.monotonic() - start
+    assert peak == 4
+    assert elapsed < 32 * 0.02
+    assert mem.episodes[-1].offers_evaluated == 32
+
+
+def test_slow_and_failing_lookups_are_skipped(monkeypatch, tmp_path):
+    release = threading.Event()
+
+    def lookup(name):
+        if name == "hangs":
+            release.wait(5)
+        if name == "fails":
+            raise ConnectionError("idealo unavailable")
+        return {"vendor": "V", "price": "€50.00"}
+
+    orders = [{"name": n, "price": 10.0} for n in ("ok-1", "hangs", "fails", "ok-2")]
+    _stub_tools(monkeypatch, orders, lookup)
+    mem = Memory(str(tmp_path / "memory.json"))
+    start = time.monotonic()
+    Orchestrator(mem, max_concurrency=2, lookup_timeout=0.2).run()
+    release.set()
+    assert time.monotonic() - start < 2
+    ep = mem.episodes[-1]
+    assert ep.offers_evaluated == 2
+    assert ep.listings_created == 2
+    assert ep.offers_skipped == 2
+
+
+def test_one_hung_lookup_costs_one_item(monkeypatch, tmp_path):
+    release = threading.Event()
+
+    def lookup(name):
+        if name == "hangs":
+            release.wait(5)
+        return {"vendor": "V", "price": "€50.00"}
+
+    orders = [{"name": n, "price": 10.0} for n in ("ok-1", "hangs", "ok-2", "ok-3")]
+    _stub_tools(monkeypatch, orders, lookup)
+    mem = Memory(str(tmp_path / "memory.json"))
+    start = time.monotonic()
+    # A single worker: the lookups after the hung one must not wait on it.
+    Orchestrator(mem, max_concurrency=1, lookup_timeout=0.2).run()
+    release.set()
+    assert time.monotonic() - start < 1
+    ep = mem.episodes[-1]
+    assert (ep.offers_evaluated, ep.offers_skipped) == (3, 1)
+
+
+def test_hung_lookups_are_capped(monkeypatch, tmp_path):
+    from shopping_agent import orchestrator
+
+    release = threading.Event()
+    calls = []
+
+    def lookup(name):
+        calls.append(name)
+        if name.startswith("hangs"):
+            release.wait(5)
+        return {"vendor": "V", "price": "€50.00"}
+
+    monkeypatch.setattr(orchestrator, "MAX_ABANDONED_LOOKUPS", 1)
+    orders = [{"name": n, "price": 10.0} for n in ("hangs-1", "hangs-2", "ok")]
+    _stub_tools(monkeypatch, orders, lookup)
+    mem = Memory(str(tmp_path / "memory.json"))
+    # One worker plus one abandoned call: the second hang fills the pool.
+    Orchestrator(mem, max_concurrency=1, lookup_timeout=0.1).run()
+    release.set()
+    assert calls == ["hangs-1", "hangs-2"]
+    assert mem.episodes[-1].offers_skipped == 3
+
+
+def test_wishlist_items_are_skipped_without_a_lookup(monkeypatch, tmp_path):
+    calls = []
+
+    def lookup(name):
+        calls.append(name)
+        return {"vendor": "V", "price": "€50.00"}
+
+    _stub_tools(monkeypatch, [{"name": "Lamp", "price": 10.0}], lookup)
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: ["Fitness Tracker"])
+    mem = Memory(str(tmp_path / "memory.json"))
+    Orchestrator(mem).run()
+    assert calls == ["Lamp"]
+    assert mem.episodes[-1].notes == ["no purchase price for Fitness Tracker"]
+
+
+def test_price_cache_dedupes_repeated_products(monkeypatch, tmp_path):
+    from shopping_agent.cache import PriceCache
+
+    calls = []
+
+    def lookup(name):
+        calls.append(name)
+        return {"vendor": "V", "price": "€50.00"}
+
+    orders = [{"name": "PlayStation 5", "price": 10.0}, {"name": "playstation  5", "price": 10.0}]
+    _stub_tools(monkeypatch, orders, lookup)
+    cache = PriceCache()
+    mem = Memory(str(tmp_path / "memory.json"))
+    Orchestrator(mem, price_cache=cache).run()
+    assert calls == ["PlayStation 5"]
+    assert mem.episodes[-1].listings_created == 2
+
+
+def test_purchases_of_one_product_share_a_lookup_per_run(monkeypatch, tmp_path):
+    calls = []
+
+    def lookup(name):
+        calls.append(name)
+        time.sleep(0.02)
+        return {"vendor": "V", "price": "€50.00"}
+
+    orders = [{"name": "PlayStation 5", "price": 10.0}, {"name": "playstation  5", "price": 80.0}]
+    _stub_tools(monkeypatch, orders, lookup)
+    mem = Memory(str(tmp_path / "memory.json"))
+    orchestrator = Orchestrator(mem, max_concurrency=4)
+    orchestrator.run()
+    assert calls == ["PlayStation 5"]
+    assert (mem.episodes[-1].offers_evaluated, mem.episodes[-1].listings_created) == (2, 1)
+    orchestrator.run()
+    assert len(calls) == 2
+
+
+def test_listing_starts_before_fetching_finishes(monkeypatch, tmp_path):
+    events = []
+
+    def orders():
+        for i in range(2000):
+            if i == 1999:
+                events.append("fetch-done")
+            yield {"name": f"Item {i}", "price": 1.0}
+
+    monkeypatch.setattr(amazon_api, "get_recent_orders", orders)
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€5.00"})
+
+    def create_listing(title, purchase_price, resale_price):
+        events.append("listed")
+        return {"listing_id": title}
+
+    monkeypatch.setattr(ebay_api, "create_listing", create_listing)
+    sent = []
+    monkeypatch.setattr(email, "send_email", lambda subject, body, recipients=None: sent.append(body))
+    mem = Memory(str(tmp_path / "memory.json"))
+    Orchestrator(mem, queue_size=8).run()
+    assert events.index("listed") < events.index("fetch-done")
+    assert mem.episodes[-1].listings_created == 2000
+    assert mem.recall("items_fetched") == 2000
+    assert "and 1900 more listings" in sent[0]
+
+
+def test_category_margins_and_fees_drive_listing(monkeypatch, tmp_path):
+    orders = [
+        {"name": "Console", "price": 100.0, "category": "consoles"},
+        {"name": "Book", "price": 100.0, "category": "books"},
+    ]
+    _stub_tools(monkeypatch, orders, lambda name: {"vendor": "V", "price": "€100.00"})
+    mem = Memory(str(tmp_path / "memory.json"))
+    Orchestrator(
+        mem, profit_margin=0.05, category_margins={"consoles": 0.30}, fee_rate=0.1
+    ).run()
+    ep = mem.episodes[-1]
+    assert (ep.offers_evaluated, ep.listings_created) == (2, 1)
+
+
+def test_change_detection_skips_unchanged_items(monkeypatch, tmp_path):
+    import shopping_agent.database as db
+
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+    lookups = []
+    listings = []
+
+    def lookup(name):
+        lookups.append(name)
+        return {"vendor": "V", "price": "€50.00"}
+
+    orders = [{"name": "Grinder", "price": 10.0}, {"name": "Kettle", "price": 90.0}]
+    _stub_tools(monkeypatch, orders, lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda title, purchase_price, resale_price: (
+        listings.append(title) or {"listing_id": f"id-{title}"}
+    ))
+    mem = Memory(str(tmp_path / "memory.json"))
+
+    def run(**kwargs):
+        lookups.clear()
+        listings.clear()
+        Orchestrator(mem, change_detection=True, **kwargs).run()
+        return mem.episodes[-1]
+
+    first = run()
+    assert (first.offers_evaluated, first.listings_created, first.offers_unchanged) == (2, 1, 0)
+    assert sorted(lookups) == ["Grinder", "Kettle"] and listings == ["Grinder"]
+
+    # Nothing changed and prices are fresh: no lookups, no relisting
+    second = run()
+    assert (second.offers_evaluated, second.offers_unchanged) == (0, 2)
+    assert lookups == [] and listings == []
+    assert db.fetch_fingerprints(["grinder"])["grinder"].listing_id == "id-Grinder"
+
+    # Stale competitor price is re-fetched, but identical inputs keep the decision
+    third = run(price_ttl=0)
+    assert sorted(lookups) == ["Grinder", "Kettle"] and listings == []
+    assert third.offers_unchanged == 2
+
+    # A changed purchase price is evaluated again
+    orders[1]["price"] = 20.0
+    fourth = run()
+    assert lookups == ["Kettle"] and listings == ["Kettle"]
+    assert (fourth.offers_evaluated, fourth.offers_unchanged) == (1, 1)
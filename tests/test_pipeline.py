@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+from shopping_agent.pipeline import DROP, Pipeline, PipelineError, Stage
+
+
+def test_stages_transform_and_drop():
+    pipeline = Pipeline(
+        range(10),
+        [Stage("double", lambda x: x * 2), Stage("odd", lambda x: DROP if x % 4 else x)],
+    )
+    assert list(pipeline) == [0, 4, 8, 12, 16]
+
+
+def test_parallel_stage_processes_everything():
+    pipeline = Pipeline(range(200), [Stage("slow", lambda x: (time.sleep(0.001), x)[1], concurrency=8)])
+    assert sorted(pipeline) == list(range(200))
+
+
+def test_backpressure_bounds_buffered_items():
+    produced = 0
+
+    def source():
+        nonlocal produced
+        for i in range(10_000):
+            produced += 1
+            yield i
+
+    stream = iter(Pipeline(source(), [Stage("id", lambda x: x)], queue_size=4))
+    next(stream)
+    time.sleep(0.2)
+    # source queue + stage queue + one item held by each thread
+    assert produced <= 4 * 2 + 3
+    stream.close()
+
+
+def test_stage_errors_surface_to_consumer():
+    def boom(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    with pytest.raises(PipelineError) as info:
+        list(Pipeline(range(100), [Stage("boom", boom, concurrency=2)], queue_size=2))
+    assert info.value.stage == "boom"
+    assert isinstance(info.value.error, ValueError)
+    assert not [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
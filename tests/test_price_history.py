@@ -0,0 +1,100 @@
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.cache import PriceCache
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.price_history import DAILY, HOURLY, RAW, PriceHistory, Trend, history_stats
+from shopping_agent.tools import amazon_api, ebay_api, email, idealo_api
+
+
+NOW = 1_700_006_400  # a whole day in epoch seconds
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+@pytest.fixture
+def clock():
+    now = [float(NOW)]
+    return now
+
+
+def test_range_latest_and_trends(db_path, clock):
+    history = PriceHistory(db_path, clock=lambda: clock[0])
+    history.record_many([("a", 1000, NOW - 3 * DAILY), ("a", 900, NOW - 60), ("b", 500, NOW - 8 * DAILY)])
+    history.record("a", 1100)
+
+    assert [p.last_cents for p in history.range("a", NOW - 2 * DAILY, NOW + 1)] == [900, 1100]
+    assert history.latest_many(["a", "b", "c"]) == {"a": (NOW, 1100), "b": (NOW - 8 * DAILY, 500)}
+    # "b" has no price inside the 7-day window.
+    assert history.trends(["a", "b"]) == {"a": Trend(900, 1000, 3)}
+
+
+def test_samples_in_the_same_second_are_merged(db_path, clock):
+    history = PriceHistory(db_path, clock=lambda: clock[0])
+    history.record_many([("a", 1000, NOW), ("a", 800, NOW)])
+    (point,) = history.range("a", NOW, NOW + 1)
+    assert (point.min_cents, point.max_cents, point.avg_cents, point.count) == (800, 1000, 900, 2)
+    assert point.last_cents == 800
+
+
+def test_downsampling_rolls_up_and_expires(db_path, clock):
+    history = PriceHistory(db_path, clock=lambda: clock[0])
+    start = NOW - 40 * DAILY
+    # One sample every 10 minutes for 40 days.
+    history.record_many(("a", 1000 + i % 6, start + 600 * i) for i in range(40 * 144))
+    assert history.stats()["raw_samples"] == 40 * 144
+
+    history.downsample(NOW)
+    assert history.stats() == {"raw_samples": 2 * 144, "hourly_buckets": 28 * 24, "daily_buckets": 10}
+    day = history.range("a", start, start + DAILY)
+    assert [(p.resolution, p.min_cents, p.max_cents, p.last_cents, p.count) for p in day] == [
+        (DAILY, 1000, 1005, 1005, 144)
+    ]
+    hour = history.range("a", NOW - 3 * DAILY, NOW - 3 * DAILY + HOURLY, resolution=HOURLY)
+    assert [(p.avg_cents, p.count) for p in hour] == [(1002, 6)]
+    # Nothing is lost by rolling up: the 7-day trend still sees every sample.
+    assert history.trends(["a"])["a"] == Trend(1000, 1002, 7 * 144)
+
+    clock[0] = NOW + 400 * DAILY
+    history.record("a", 1200)  # recording downsamples when due
+    assert history.stats() == {"raw_samples": 1, "hourly_buckets": 0, "daily_buckets": 0}
+    assert history_stats(db_path)["raw_samples"] == 1
+
+
+def test_run_records_prices_and_reports_trend(monkeypatch, tmp_path, db_path, clock):
+    prices = iter(["€30.00", "€20.00"])
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "Lamp", "price": "€10.00"}])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": next(prices)})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    sent = []
+    monkeypatch.setattr(email, "send_email", lambda subject, body, **kwargs: sent.append(body))
+
+    history = PriceHistory(db_path, clock=lambda: clock[0])
+    orchestrator = Orchestrator(Memory(str(tmp_path / "memory.json")), history=history)
+    orchestrator.run()
+    assert "7-day" not in sent[-1]
+    clock[0] += 60
+    orchestrator.run()
+
+    assert "7-day competitor low €30.00, average €30.00" in sent[-1]
+    key = PriceCache.key_for("Lamp")
+    assert [p.last_cents for p in history.range(key, NOW, NOW + DAILY, resolution=RAW)] == [3000, 2000]
+    assert "history.trends" in orchestrator.telemetry.stats()
+
+
+def test_ui_stats_reports_history(monkeypatch, tmp_path, db_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    PriceHistory(db_path).record_many([("a", 100, None), ("b", 200, None)])
+    ui.main(["stats"])
+    out = capsys.readouterr().out
+    assert "Price history:\nraw_samples: 2\nhourly_buckets: 0\ndaily_buckets: 0" in out
@@ -0,0 +1,51 @@
+from benchmarks.bench_startup import import_profile, loaded_modules
+
+import main
+
+
+# Cumulative import time allowed for the CLI module, in milliseconds.  The
+# lazy CLI imports in ~30ms here; eager imports plus pkg_resources took
+# several times that.
+UI_IMPORT_BUDGET_MS = 100
+
+HEAVY_MODULES = (
+    "shopping_agent.orchestrator",
+    "shopping_agent.database",
+    "shopping_agent.cache",
+    "shopping_agent.eval",
+    "shopping_agent.tools.idealo_api",
+    "concurrent.futures",
+    "sqlite3",
+    "pkg_resources",
+)
+
+
+def test_ui_import_within_budget():
+    # Best of three to ride out a noisy machine.
+    best = min(import_profile("shopping_agent.ui")["shopping_agent.ui"] for _ in range(3))
+    assert best / 1000 < UI_IMPORT_BUDGET_MS
+
+
+def test_ui_usage_does_not_load_heavy_modules():
+    modules = set(loaded_modules("import shopping_agent.ui as ui\nui.main([])"))
+    assert "shopping_agent.ui" in modules
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_tools_are_loaded_on_first_access():
+    modules = loaded_modules(
+        "import shopping_agent.tools as tools\n"
+        "import sys\n"
+        "assert 'shopping_agent.tools.ebay_api' not in sys.modules\n"
+        "tools.ebay_api.create_listing"
+    )
+    assert "shopping_agent.tools.ebay_api" in modules
+    assert "shopping_agent.tools.idealo_api" not in modules
+
+
+def test_system_prompt_is_cached_without_pkg_resources():
+    assert "pkg_resources" not in loaded_modules("import main\nmain.load_system_prompt()")
+    main.load_system_prompt.cache_clear()
+    prompt = main.load_system_prompt()
+    assert prompt.startswith("You are a shopping agent")
+    assert main.load_system_prompt() is prompt
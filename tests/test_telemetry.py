@@ -0,0 +1,101 @@
+import threading
+
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.telemetry import Telemetry, merge_rows
+from shopping_agent.tools import amazon_api, idealo_api, email, ebay_api
+
+
+def _stub_tools(monkeypatch):
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [
+        {"name": f"Item {i}", "price": "€10.00"} for i in range(5)
+    ])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€30.00"})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda subject, body, recipients=None: None)
+
+
+def test_span_statistics():
+    telemetry = Telemetry()
+    for ms in range(1, 101):
+        telemetry.record("work", ms / 1000)
+    with telemetry.span("block"):
+        pass
+    threads = [threading.Thread(target=telemetry.timed("threaded", lambda: None)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    summary = telemetry.summary()
+    work = summary["work"]
+    assert work["count"] == 100
+    assert abs(work["total"] - 5.05) < 1e-9
+    assert work["max"] == 0.1
+    assert abs(work["p50"] - 0.050) < 0.002
+    assert abs(work["p95"] - 0.095) < 0.003
+    assert abs(work["p99"] - 0.099) < 0.003
+    assert summary["block"]["count"] == 1
+    assert summary["threaded"]["count"] == 8
+
+
+def test_orchestrator_records_stage_and_tool_spans(monkeypatch, tmp_path):
+    _stub_tools(monkeypatch)
+    orchestrator = Orchestrator(Memory(str(tmp_path / "memory.json")))
+    orchestrator.run()
+    summary = orchestrator.telemetry.summary()
+    assert summary["run"]["count"] == 1
+    assert summary["tool.amazon.get_recent_orders"]["count"] == 1
+    assert summary["tool.idealo.get_lowest_price"]["count"] == 5
+    assert summary["tool.ebay.create_listing"]["count"] == 5
+    assert summary["tool.email.send_email"]["count"] == 1
+    assert summary["stage.price"]["count"] == 5
+    assert {"stage.decide", "stage.list", "stage.notify"} <= set(summary)
+    # A second run starts from a clean slate.
+    orchestrator.run()
+    assert orchestrator.telemetry.summary()["tool.idealo.get_lowest_price"]["count"] == 5
+
+
+def test_spans_round_trip_and_merge(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "spans.db"))
+    db.initialize_db()
+    for run in ("2025-01-01T00:00:00", "2025-01-02T00:00:00", "2025-01-03T00:00:00"):
+        telemetry = Telemetry()
+        telemetry.record("stage.price", 0.010)
+        telemetry.record("stage.price", 0.030)
+        db.insert_spans(run, telemetry.rows())
+
+    runs, rows = db.fetch_spans(last_runs=2)
+    assert runs == ["2025-01-02T00:00:00", "2025-01-03T00:00:00"]
+    merged = merge_rows(rows)["stage.price"].summary()
+    assert merged["count"] == 4
+    assert abs(merged["total"] - 0.08) < 1e-9
+    assert merged["max"] == 0.030
+    db.close_all()
+
+
+def test_ui_profile(monkeypatch, tmp_path, capsys):
+    _stub_tools(monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+
+    ui.main(["profile"])
+    assert "No timing data available yet." in capsys.readouterr().out
+
+    ui.main(["run", "--no-cache"])
+    ui.main(["profile", "--cprofile", "--top", "5", "--no-cache", "--cprofile-out", str(tmp_path / "run.prof")])
+    out = capsys.readouterr().out
+    assert "Timing breakdown of this run:" in out
+    assert "tool.idealo.get_lowest_price" in out
+    assert "Hottest 5 functions" in out and "cumulative" in out
+    assert (tmp_path / "run.prof").exists()
+
+    ui.main(["profile", "--runs", "5"])
+    out = capsys.readouterr().out
+    assert "Timing breakdown of the last 2 runs" in out
+    assert "stage.price" in out
+    db.close_all()
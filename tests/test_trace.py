@@ -0,0 +1,152 @@
+import collections
+import json
+import os
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import ui
+from shopping_agent.listings import listing_stats
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, client, ebay_api, email, idealo_api, trace
+from shopping_agent.tools.trace import Recorder, Replayer, TraceMismatch, load
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "agent.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    yield path
+    db.close_all()
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    client.reset()
+    ebay_api.reset()
+    client.configure("idealo", backoff_base=0.001)
+    yield
+    client.reset()
+
+
+def _orders(monkeypatch):
+    monkeypatch.setattr(
+        amazon_api,
+        "get_recent_orders",
+        lambda: [{"name": "Lamp", "price": "€10.00"}, {"name": "Desk", "price": "€50.00"}],
+    )
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+
+
+def test_recorded_run_replays_identically(monkeypatch, tmp_path, capsys):
+    _orders(monkeypatch)  # Idealo, eBay and email are the real (random) stubs
+    trace = str(tmp_path / "run.trace.gz")
+    with Recorder(trace) as recorder:
+        Orchestrator(Memory(str(tmp_path / "a.json"))).run()
+    recorded = capsys.readouterr().out
+    records = list(load(trace))
+    assert recorder.records == len(records) >= 3 + 2 + 1  # amazon, idealo, (ebay), email
+    assert {"amazon", "idealo", "email"} <= {r["s"] for r in records}
+    assert all(r["d"] >= 0 and r["t"] > 0 for r in records)
+
+    # Replayed with the email stub never called: the report is in the trace.
+    with Replayer(trace) as replayer:
+        for _ in range(2):
+            Orchestrator(Memory(str(tmp_path / "b.json"))).run()
+    assert capsys.readouterr().out == ""
+    assert replayer.replayed == 2 * len(records)
+    assert amazon_api.get_cart_items() == []  # originals restored
+    email_body = next(r for r in records if r["s"] == "email")["a"][1]
+    assert email_body in recorded
+
+
+def test_replay_pacing_errors_and_mismatches(monkeypatch, tmp_path):
+    _orders(monkeypatch)
+    prices = iter([ConnectionError("reset"), {"vendor": "V", "price": "€30.00"}])
+
+    def lookup(name):
+        result = next(prices, {"vendor": "V", "price": "€90.00"})
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(email, "send_email", lambda *args, **kwargs: None)
+    trace = str(tmp_path / "run.trace")
+    with Recorder(trace):
+        Orchestrator(Memory(str(tmp_path / "a.json"))).run()
+    errors = [r for r in load(trace) if "e" in r]
+    assert errors[0]["e"] == ["ConnectionError", "reset"]
+
+    slept = []
+    with Replayer(trace, speed=10, sleep=slept.append):
+        # The recorded failure is replayed, then retried by the client.
+        with pytest.raises(ConnectionError):
+            idealo_api.get_lowest_price("Lamp")
+        assert idealo_api.get_lowest_price("Lamp")["price"] == "€30.00"
+        with pytest.raises(TraceMismatch):
+            idealo_api.get_lowest_price("Chair")
+    failed = next(r for r in load(trace) if r["s"] == "idealo")
+    assert slept[0] == pytest.approx(failed["d"] / 10)
+
+
+def test_trace_tolerates_a_torn_last_line(tmp_path):
+    trace = tmp_path / "run.trace"
+    record = {"s": "idealo", "c": "get_lowest_price", "a": ["Lamp"], "r": {"price": "€1.00"}, "t": 1, "d": 0}
+    trace.write_text(json.dumps(record) + "\n" + '{"s": "ide')
+    with Replayer(str(trace)):
+        assert idealo_api.get_lowest_price("Lamp") == {"price": "€1.00"}
+
+
+def test_ui_run_records_and_replays(monkeypatch, tmp_path, db_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    _orders(monkeypatch)
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€90.00"})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    ui.main(["run", "--record", "run.trace"])
+    recorded = capsys.readouterr().out
+    before = os.listdir(tmp_path)
+    replayers = []
+
+    class Tracked(Replayer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            replayers.append(self)
+
+    monkeypatch.setattr(trace, "Replayer", Tracked)
+    # Replayed in the warm state of the recorded run.
+    ui.main(["run", "--replay", "run.trace", "--replay-speed", "100"])
+    replayed = capsys.readouterr().out
+    assert "Shopping Agent Report" in recorded and "Shopping Agent Report" not in replayed
+    records = list(load(str(tmp_path / "run.trace")))
+    # Micro-batching may split the two listings over one or two bulk calls.
+    calls = collections.Counter(r["c"] for r in records if r["c"] != "create_listings")
+    assert calls == {"get_recent_orders": 1, "get_cart_items": 1, "get_wishlist_items": 1,
+                     "get_lowest_price": 2, "send_email": 1}
+    assert sum(len(r["a"][0]) for r in records if r["c"] == "create_listings") == 2
+    # Every recorded call was replayed: no cache, fingerprint or listing
+    # of the recorded run short-cut the replay...
+    (replayer,) = replayers
+    assert replayer.replayed >= 3 + 2 + 1 + 1
+    # ...and the replay left the real state alone.
+    assert listing_stats(db_path) == {"active_listings": 2}
+    assert len(Memory(str(tmp_path / "memory.json")).episodes) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted(before)
+
+
+def test_bulk_calls_replay_per_listing(tmp_path):
+    trace = str(tmp_path / "run.trace")
+    listings = [
+        {"sku": sku, "item_name": sku, "purchase_price": "€1.00", "resale_price": "€2.00"}
+        for sku in ("a", "b", "c")
+    ]
+    with Recorder(trace):
+        created = ebay_api.create_listings(listings)
+    with Replayer(trace) as replayer:
+        assert ebay_api.create_listings(listings[2:]) == created[2:]
+        assert ebay_api.create_listings(listings[:2][::-1]) == created[:2][::-1]
+        with pytest.raises(TraceMismatch):
+            ebay_api.create_listings([dict(listings[0], sku="d")])
+    assert replayer.replayed == 2
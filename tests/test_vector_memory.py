@@ -0,0 +1,167 @@
+import os
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import ui, vector_memory
+from shopping_agent.memory import Memory
+from shopping_agent.orchestrator import Orchestrator
+from shopping_agent.tools import amazon_api, ebay_api, email, idealo_api
+from shopping_agent.vector_memory import Decision, DecisionMemory, embed
+
+
+NAMES = [f"{brand} {kind} {n}" for brand in ("Sony", "Bosch", "Anker") for kind in (
+    "Headphones", "Blender", "Charger") for n in range(30)]
+
+
+def _decisions(names):
+    return [Decision(name, name, i % 3 == 0, margin_cents=i) for i, name in enumerate(names)]
+
+
+def test_embedding_is_unit_length_and_spelling_tolerant():
+    a, b, c = embed("PS5"), embed("PlayStation 5 Console"), embed("Yoga Mat")
+    assert sum(x * x for x in a) == pytest.approx(1.0, abs=1e-5)
+    assert sum(x * y for x, y in zip(a, b)) == pytest.approx(1.0, abs=1e-5)
+    assert sum(x * y for x, y in zip(a, c)) < 0.3
+
+
+@pytest.mark.parametrize("mode", ["exact", "lsh"])
+def test_nearest_finds_similar_names(mode):
+    mem = DecisionMemory(mode=mode)
+    mem.add_many(_decisions(NAMES))
+    (score, best), *rest = mem.nearest("Bosch Blendr 7", k=3)
+    assert best.name == "Bosch Blender 7"
+    assert len(rest) == 2 and all(s <= score for s, _ in rest)
+    assert [hits[0][1].name for hits in mem.nearest_many(["Anker Charger 12", "Sony Headphone 3"], 1)] == [
+        "Anker Charger 12",
+        "Sony Headphones 3",
+    ]
+
+
+def test_lsh_falls_back_to_full_scan_and_indexes_new_items():
+    mem = DecisionMemory(mode="lsh")
+    assert mem.nearest("anything") == []
+    mem.add_many(_decisions(NAMES))
+    # Far more neighbours than any bucket holds: the scan answers.
+    assert len(mem.nearest("Sony", k=len(NAMES))) == len(NAMES)
+    mem.add(Decision("Espresso Machine", "e", True))
+    assert mem.nearest("espresso machine", 1)[0][1].key == "e"
+
+
+def test_persisted_and_reopened(tmp_path):
+    path = str(tmp_path / "decisions")
+    mem = DecisionMemory(path)
+    mem.add_many(_decisions(NAMES))
+    mem.set_sold(4)
+    mem.close()
+
+    reopened = DecisionMemory(path, mode="lsh")
+    assert len(reopened) == len(NAMES)
+    assert reopened.decisions[4].sold is True
+    assert reopened.nearest("Sony Headphones 4", 1)[0][1] == reopened.decisions[4]
+    reopened.add(Decision("Yoga Mat", "y", False))
+    reopened.close()
+    assert len(DecisionMemory(path)) == len(NAMES) + 1
+    with pytest.raises(ValueError):
+        DecisionMemory(path, dim=64)
+
+
+def test_decisions_are_upserted_by_key(tmp_path):
+    path = str(tmp_path / "decisions")
+    mem = DecisionMemory(path)
+    mem.add_many(_decisions(NAMES[:3]))
+    again = [Decision(NAMES[1], NAMES[1], True, margin_cents=5), Decision("Yoga Mat", "y", False)]
+    assert mem.add_many(again + [Decision("Yoga Mat", "y", True)]) == [1, 3, 3]
+    mem.close()
+    assert os.path.getsize(os.path.join(path, "vectors.f32")) == 4 * 256 * 4
+
+    reopened = DecisionMemory(path)
+    assert [(d.key, d.listed) for d in reopened.decisions] == [
+        (NAMES[0], True), (NAMES[1], True), (NAMES[2], False), ("y", True)
+    ]
+    assert reopened.decisions[1].margin_cents == 5
+    reopened.add(Decision(NAMES[0], NAMES[0], False))
+    assert len(reopened) == 4 and reopened.decisions[0].listed is False
+    reopened.close()
+
+
+def test_torn_files_are_truncated_to_agreeing_records(tmp_path):
+    path = str(tmp_path / "decisions")
+    mem = DecisionMemory(path)
+    mem.add_many(_decisions(NAMES[:5]))
+    mem.close()
+    # A crash after the vector was written but before its decision.
+    with open(os.path.join(path, "vectors.f32"), "ab") as f:
+        f.write(embed("Lost").tobytes()[:100])
+    with open(os.path.join(path, "decisions.jsonl"), "a") as f:
+        f.write('{"name": "Lo')
+
+    mem = DecisionMemory(path)
+    assert [d.name for d in mem.decisions] == NAMES[:5]
+    mem.add(Decision("Yoga Mat", "y", False))
+    mem.close()
+    assert [d.name for d in DecisionMemory(path).decisions] == NAMES[:5] + ["Yoga Mat"]
+
+
+def test_numpy_and_fallback_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    with_numpy = DecisionMemory()
+    with_numpy.add_many(_decisions(NAMES))
+    expected = [(round(s, 4), d.name) for s, d in with_numpy.nearest("Bosch Charger 9", 5)]
+    monkeypatch.setattr(vector_memory, "np", None)
+    fallback = DecisionMemory()
+    fallback.add_many(_decisions(NAMES))
+    assert [(round(s, 4), d.name) for s, d in fallback.nearest("Bosch Charger 9", 5)] == expected
+
+
+
+@pytest.mark.parametrize("numpy", [False, True])
+def test_ties_go_to_the_earlier_decision(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(vector_memory, "np", None)
+    mem = DecisionMemory()
+    mem.add_many([Decision("Bosch Charger", f"k{i}", False) for i in range(6)])
+    assert [d.key for _, d in mem.nearest("Bosch Charger", 3)] == ["k0", "k1", "k2"]
+
+
+def test_run_reports_similar_past_decisions(monkeypatch, tmp_path):
+    orders = [{"name": "Sony Headphones 1", "price": "€10.00"}]
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: orders)
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lambda name: {"vendor": "V", "price": "€30.00"})
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    sent = []
+    monkeypatch.setattr(email, "send_email", lambda subject, body, **kwargs: sent.append(body))
+
+    decisions = DecisionMemory(str(tmp_path / "decisions"))
+    orchestrator = Orchestrator(Memory(str(tmp_path / "memory.json")), decisions=decisions, recall_k=3)
+    orchestrator.run()
+    assert "similar past items" not in sent[-1]
+    orders[0] = {"name": "Sony Headphone 1", "price": "€10.00"}
+    orchestrator.run()
+
+    assert "1 of 1 similar past items were listed" in sent[-1]
+    assert [d.margin_cents for d in decisions.decisions] == [2450, 2450]
+    orchestrator.run()
+
+    # A rerun replaces the product's decision and is not its own precedent.
+    assert "1 of 1 similar past items were listed" in sent[-1]
+    assert len(decisions) == 2
+    assert "decisions.recall" in orchestrator.telemetry.stats()
+
+
+def test_ui_recall_option(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+    args = ui._build_parser().parse_args(["run", "--recall", "3"])
+    orchestrator = ui._make_orchestrator(args, Memory(str(tmp_path / "memory.json")))
+    assert orchestrator.recall_k == 3
+    assert isinstance(orchestrator.decisions, DecisionMemory)
+    ui._close_orchestrator(orchestrator)
+    assert ui._make_orchestrator(
+        ui._build_parser().parse_args(["run", "--no-cache"]), Memory(str(tmp_path / "m.json"))
+    ).decisions is None
+    db.close_all()
@@ -0,0 +1,109 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+import shopping_agent.database as db
+from shopping_agent import analytics
+from shopping_agent import ui
+from shopping_agent.tools import amazon_api, idealo_api, email, ebay_api
+from shopping_agent.watch import QUEUE, SKIP, CronSchedule, IntervalSchedule, Watcher
+
+
+def test_cron_next_after():
+    start = datetime.datetime(2025, 1, 1, 10, 7, 30)
+    assert CronSchedule("*/5 * * * *").next_after(start) == datetime.datetime(2025, 1, 1, 10, 10)
+    assert CronSchedule("0 9-17 * * *").next_after(start) == datetime.datetime(2025, 1, 1, 11, 0)
+    assert CronSchedule("30 2 1 * *").next_after(start) == datetime.datetime(2025, 2, 1, 2, 30)
+    # 2025-01-01 is a Wednesday; the next Monday is the 6th
+    assert CronSchedule("0 8 * * 1").next_after(start) == datetime.datetime(2025, 1, 6, 8, 0)
+    # Both day fields restricted: either one matches
+    assert CronSchedule("0 0 15 * 0").next_after(start) == datetime.datetime(2025, 1, 5, 0, 0)
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *"])
+def test_cron_rejects_invalid(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_watcher_runs_on_interval():
+    runs = []
+    lines = []
+    watcher = Watcher(lambda: runs.append(1), IntervalSchedule(0.01), log=lines.append)
+    watcher.serve(max_iterations=3)
+    assert len(runs) == 3
+    assert len(watcher.latencies) == 3
+    assert all(line.startswith("watch: run ") and " ok in " in line for line in lines)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+@pytest.mark.parametrize("overlap, expected_runs", [(SKIP, 1), (QUEUE, 2)])
+def test_watcher_overlap_policy(overlap, expected_runs):
+    release = threading.Event()
+    started = []
+
+    def run():
+        started.append(1)
+        release.wait(5)
+
+    watcher = Watcher(run, IntervalSchedule(0.01), overlap=overlap, log=lambda _: None)
+    server = threading.Thread(target=watcher.serve)
+    server.start()
+    # Several ticks arrive while the first run is blocked.
+    _wait_for(lambda: watcher.skipped >= 3)
+    if overlap == SKIP:
+        watcher.stop()
+    release.set()
+    _wait_for(lambda: len(started) >= expected_runs)
+    watcher.stop()
+    server.join(5)
+    assert not server.is_alive()
+    if overlap == SKIP:
+        assert started == [1]
+
+
+def test_watcher_survives_failing_run():
+    calls = []
+    lines = []
+
+    def run():
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    Watcher(run, IntervalSchedule(0.01), log=lines.append).serve(max_iterations=2)
+    assert len(calls) == 2
+    assert "failed: RuntimeError('boom')" in lines[0]
+
+
+def test_ui_watch_reuses_warm_state(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "agent.db"))
+    lookups = []
+
+    def lookup(name):
+        lookups.append(name)
+        return {"vendor": "V", "price": "€30.00"}
+
+    monkeypatch.setattr(amazon_api, "get_recent_orders", lambda: [{"name": "Item", "price": "€10.00"}])
+    monkeypatch.setattr(amazon_api, "get_cart_items", lambda: [])
+    monkeypatch.setattr(amazon_api, "get_wishlist_items", lambda: [])
+    monkeypatch.setattr(idealo_api, "get_lowest_price", lookup)
+    monkeypatch.setattr(ebay_api, "create_listing", lambda *args: {"listing_id": "x"})
+    monkeypatch.setattr(email, "send_email", lambda subject, body, recipients=None: None)
+
+    ui.main(["watch", "--interval", "0.01", "--max-runs", "3"])
+
+    out = capsys.readouterr().out
+    assert out.count("watch: run ") == 3
+    # The price cache survives between iterations: one lookup for three runs.
+    assert lookups == ["Item"]
+    assert analytics.run_statistics()["runs"] == 3
+    db.close_all()